@@ -1,16 +1,23 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 
-from ..database import SessionLocal
+from ..database import SessionLocal, ReadSessionLocal, AsyncSessionLocal, AsyncReadSessionLocal
 from ..config import settings
 from ..schemas.user import TokenData
 from ..models.user import User
+from ..services import principal_cache, read_routing
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+# トークンが無くても401にしないスキーム（任意認証用）
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl=f"{settings.API_V1_STR}/auth/login", auto_error=False
+)
 
 def get_db() -> Generator:
     """データベースセッションを取得するための依存関数"""
@@ -20,12 +27,52 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+def _token_user_id(token: Optional[str]) -> Optional[int]:
+    """トークンからユーザーIDのみを取り出す（無効な場合はNone）"""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        return int(payload["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+
+def get_read_db(
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> Generator:
+    """
+    読み取り専用のデータベースセッション（レプリカ）を取得するための依存関数
+    直前に書き込みを行ったユーザーは自分の書き込みが見えるようプライマリを使用する
+    """
+    if read_routing.should_read_primary(_token_user_id(token)):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> AsyncGenerator[AsyncSession, None]:
+    """読み取り専用の非同期データベースセッションを取得するための依存関数"""
+    # 共有キャッシュへの問い合わせでイベントループを止めないようスレッドで判定する
+    user_id = _token_user_id(token) if read_routing.is_enabled() else None
+    if user_id is not None and await run_in_threadpool(read_routing.should_read_primary, user_id):
+        session_factory = AsyncSessionLocal
+    else:
+        session_factory = AsyncReadSessionLocal
+    async with session_factory() as db:
+        yield db
+
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ) -> User:
     """
     JWTトークンからユーザーを取得する依存関数
+    キャッシュ済み（またはトークンに情報が埋め込まれている）場合はDBを参照しない
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,9 +91,16 @@ def get_current_user(
     except (JWTError, ValidationError):
         raise credentials_exception
     
+    user = principal_cache.get_principal(token_data.user_id)
+    if user is None and settings.JWT_EMBED_USER_CLAIMS:
+        user = principal_cache.principal_from_claims(token_data.user_id, payload)
+    if user is not None:
+        return user
+    
     user = db.query(User).filter(User.id == token_data.user_id).first()
     if user is None:
         raise credentials_exception
+    principal_cache.cache_principal(user)
     
     return user
 
@@ -58,12 +112,28 @@ def get_current_user_id(
 
 def get_optional_current_user(
     db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
+    token: Optional[str] = Depends(optional_oauth2_scheme)
 ) -> Optional[User]:
     """
     JWTトークンからユーザーを取得するが、認証に失敗しても例外を発生させない
     """
+    if not token:
+        return None
     try:
         return get_current_user(db, token)
     except HTTPException:
         return None
+
+def get_current_admin_user(
+    current_user: User = Depends(get_current_user)
+) -> User:
+    """
+    管理者ユーザーのみを許可する依存関数
+    """
+    if current_user.email not in settings.ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理者権限が必要です",
+        )
+    
+    return current_user
@@ -5,23 +5,23 @@ from typing import Generator, Optional, Dict, Any
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from supabase import Client
 
-from ..database_supabase import get_db, get_supabase
+from ..database_supabase import get_db
 from ..services.auth_service import validate_token
 
 # HTTPベアラートークン認証スキーム
 security = HTTPBearer()
+# トークンが無くても403にしないスキーム（任意認証用）
+optional_security = HTTPBearer(auto_error=False)
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_supabase)
 ) -> Dict[str, Any]:
     """
     Supabase認証トークンからユーザー情報を取得
     """
     token = credentials.credentials
-    user_data = await validate_token(token, supabase)
+    user_data = await validate_token(token)
     
     if not user_data:
         raise HTTPException(
@@ -41,8 +41,7 @@ async def get_current_user_id(
     return current_user["user_id"]
 
 async def get_optional_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    supabase: Client = Depends(get_supabase)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
 ) -> Optional[Dict[str, Any]]:
     """
     トークンが提供された場合はユーザー情報を取得、なければNoneを返す
@@ -52,7 +51,7 @@ async def get_optional_current_user(
     
     try:
         token = credentials.credentials
-        user_data = await validate_token(token, supabase)
+        user_data = await validate_token(token)
         return user_data
     except Exception:
         return None
@@ -1,106 +1,150 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import json
 import logging
 
 from ...database import get_db
 from ...models.user import User
-from ...schemas.activity import Activity, ActivityCreate, ActivityUpdate, ActivityFilter
+from ...schemas.activity import (
+    Activity, ActivityCreate, ActivityUpdate, ActivityFilter, ActivityList, ActivityRecommendation
+)
 from ...crud import activity as crud_activity
 from ...crud import feedback as crud_feedback
-from ...api.deps import get_current_user, get_current_user_id, get_optional_current_user
-from ...services import ai_service
+from ...crud import user as crud_user
+from ...api.deps import (
+    get_current_user, get_current_user_id, get_optional_current_user,
+    get_read_db, get_async_read_db
+)
+from ...services import ai_service, catalog_cache, catalog_snapshot, personalization_cache, ranker
+from ...responses import dumps, json_bytes_response
+from ...config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/", response_model=List[Activity])
 def read_activities(
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db)
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(settings.CATALOG_PAGE_SIZE, ge=1, le=settings.CATALOG_MAX_LIMIT),
+    db: Session = Depends(get_read_db)
 ):
     """
     全ての活動を取得
+    シリアライズ済み・圧縮済みのJSONをカタログの版ごとにキャッシュして返す
     """
-    activities = crud_activity.get_activities(db, skip=skip, limit=limit)
+    return catalog_cache.get_catalog_response(db, skip, limit, request.headers.get("accept-encoding"))
+
+async def _candidate_activities(
+    db: AsyncSession, fatigue_level: int, location: str, duration: int, limit: int
+) -> list:
+    # 基本的なフィルタリング
+    snapshot = catalog_snapshot.get_snapshot()
+    if snapshot is not None:
+        # 共有メモリのスナップショットから絞り込む（DBを参照しない）
+        return snapshot.activities(snapshot.filter(fatigue_level, location, duration, limit))
+    activities = await crud_activity.get_filtered_activities_async(
+        db, fatigue_level=fatigue_level, location=location, duration=duration, limit=limit
+    )
     
-    # JSONフィールドをパースして返す
+    # JSONフィールドのパース
     for activity in activities:
-        activity.locations = json.loads(activity.locations) 
+        activity.locations = json.loads(activity.locations)
         activity.steps = json.loads(activity.steps) if activity.steps else []
         activity.benefits = json.loads(activity.benefits) if activity.benefits else []
-    
     return activities
 
+async def _personalization_context(db: AsyncSession, user_id: int) -> Optional[Tuple[str, List[Dict]]]:
+    # (文章形式のプロファイル, 過去のフィードバック)  プロファイルが無ければNone
+    profile = await crud_user.get_user_profile_async(db, user_id)
+    
+    if not profile or not profile.textual_profile:
+        return None
+    
+    # 過去のフィードバックを取得（対象の活動はまとめて取得する）
+    feedbacks = await crud_feedback.get_user_feedbacks_async(db, user_id, limit=10)
+    feedback_activities = {
+        activity.id: activity
+        for activity in await crud_activity.get_activities_by_ids_async(db, [fb.activity_id for fb in feedbacks])
+    }
+    feedback_data = []
+    
+    for fb in feedbacks:
+        activity_data = feedback_activities.get(fb.activity_id)
+        if activity_data:
+            feedback_data.append({
+                "activity_id": fb.activity_id,
+                "activity_title": activity_data.title,
+                "activity_category": activity_data.category,
+                "rating": fb.rating,
+                "fatigue_level": fb.fatigue_level,
+                "completion_status": fb.completion_status
+            })
+    return profile.textual_profile, feedback_data
+
+def _sort_by_categories(activities: list, preferred_categories: List[str]) -> None:
+    # 推奨カテゴリに応じてアクティビティを並べ替え
+    def get_category_priority(activity):
+        try:
+            category = activity.category
+            if category in preferred_categories:
+                return preferred_categories.index(category)
+            return len(preferred_categories)
+        except:
+            return len(preferred_categories) + 1
+    
+    activities.sort(key=get_category_priority)
+
 @router.get("/recommended", response_model=List[Activity])
 async def get_recommended_activities(
     fatigue_level: int = Query(..., ge=1, le=10),
     location: str = Query(...),
     duration: int = Query(..., ge=15, le=60),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: Optional[User] = Depends(get_optional_current_user)
 ):
     """
     ユーザーの状態に応じて推奨活動を取得
     ログインしていればパーソナライズされた結果を返す
     """
-    # 基本的なフィルタリング
-    activities = crud_activity.get_filtered_activities(
-        db, fatigue_level=fatigue_level, location=location, duration=duration
-    )
+    ordering = settings.RECOMMENDATION_ORDERING
+    use_bandit = ordering in ranker.BANDIT_METHODS
     
-    # JSONフィールドのパース
-    for activity in activities:
-        activity.locations = json.loads(activity.locations)
-        activity.steps = json.loads(activity.steps) if activity.steps else []
-        activity.benefits = json.loads(activity.benefits) if activity.benefits else []
+    # バンディットの場合は多めに候補を取得して並べ替える
+    limit = settings.RANKER_CANDIDATE_LIMIT if use_bandit else 10
+    activities = await _candidate_activities(db, fatigue_level, location, duration, limit)
+    
+    # バンディットによる並べ替え（ログイン有無に関わらず適用）
+    if use_bandit:
+        return ranker.rank_activities(activities, fatigue_level, location, ordering)[:10]
     
-    # ログインしていない場合は基本的なフィルタリング結果を返す
-    if not current_user:
+    # ログインしていない場合、またはLLMによる並べ替えが無効な場合は基本的なフィルタリング結果を返す
+    if not current_user or ordering != "llm":
         return activities
     
     try:
         # ユーザープロファイルに基づいてパーソナライズ
-        from ...crud.user import get_user_profile
-        profile = get_user_profile(db, current_user.id)
+        context = await _personalization_context(db, current_user.id)
         
-        if not profile or not profile.textual_profile:
+        if context is None:
             return activities
         
-        # 過去のフィードバックを取得
-        feedbacks = crud_feedback.get_user_feedbacks(db, current_user.id, limit=10)
-        feedback_data = []
-        
-        for fb in feedbacks:
-            activity_data = db.query(crud_activity.Activity).filter_by(id=fb.activity_id).first()
-            if activity_data:
-                feedback_data.append({
-                    "activity_id": fb.activity_id,
-                    "activity_title": activity_data.title,
-                    "activity_category": activity_data.category,
-                    "rating": fb.rating,
-                    "fatigue_level": fb.fatigue_level,
-                    "completion_status": fb.completion_status
-                })
-        
-        # Gemini 2.0 Flashを使用してパーソナライズ
-        preferred_categories = await ai_service.personalize_activities(
-            profile.textual_profile, fatigue_level, feedback_data
-        )
-        
-        # 推奨カテゴリに応じてアクティビティを並べ替え
-        def get_category_priority(activity):
-            try:
-                category = activity.category
-                if category in preferred_categories:
-                    return preferred_categories.index(category)
-                return len(preferred_categories)
-            except:
-                return len(preferred_categories) + 1
-        
-        activities.sort(key=get_category_priority)
+        # 同じ入力の結果があれば再利用し、無ければGemini 2.0 Flashを使用してパーソナライズ
+        key = personalization_cache.personalization_key(current_user.id, fatigue_level, *context)
+        cached = await run_in_threadpool(personalization_cache.get_personalization, key)
+        if cached is not None:
+            preferred_categories = cached["categories"]
+        else:
+            preferred_categories = await ai_service.personalize_activities(context[0], fatigue_level, context[1])
+            if preferred_categories != ai_service.PERSONALIZATION_FALLBACK:
+                await run_in_threadpool(
+                    personalization_cache.set_personalization, current_user.id, key, preferred_categories
+                )
+        _sort_by_categories(activities, preferred_categories)
         
     except Exception as e:
         logger.error(f"パーソナライズ中にエラーが発生しました: {str(e)}")
@@ -108,6 +152,97 @@ async def get_recommended_activities(
     
     return activities
 
+def _sse_event(event: str, data: Any) -> bytes:
+    # Server-Sent Eventsの1イベント（dataはJSON。改行を含まないため1行で送る）
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+@router.get("/recommended/stream")
+async def stream_recommended_activities(
+    fatigue_level: int = Query(..., ge=1, le=10),
+    location: str = Query(...),
+    duration: int = Query(..., ge=15, le=60),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    """
+    推奨活動をServer-Sent Eventsで返す
+    フィルタリング結果（candidates）をすぐに送り、LLMによるパーソナライズが有効な場合は
+    並べ替え後の一覧（ranking）と推奨理由の差分（reasoning）を生成され次第送る
+    最後に最終的な結果をActivityRecommendationの形式で送る（done）
+    パーソナライズに失敗した場合はerrorを送り、フィルタリング結果のままdoneで終える
+    """
+    ordering = settings.RECOMMENDATION_ORDERING
+    use_bandit = ordering in ranker.BANDIT_METHODS
+    limit = settings.RANKER_CANDIDATE_LIMIT if use_bandit else 10
+    activities = await _candidate_activities(db, fatigue_level, location, duration, limit)
+    if use_bandit:
+        activities = ranker.rank_activities(activities, fatigue_level, location, ordering)[:10]
+    
+    # DBの参照はストリームの開始前に済ませる（セッションはレスポンスの送信中に閉じられるため）
+    context = None
+    cached = None
+    if current_user and ordering == "llm":
+        try:
+            context = await _personalization_context(db, current_user.id)
+            if context is not None:
+                key = personalization_cache.personalization_key(current_user.id, fatigue_level, *context)
+                cached = await run_in_threadpool(personalization_cache.get_personalization, key)
+        except Exception as e:
+            logger.error(f"パーソナライズ中にエラーが発生しました: {str(e)}")
+            context = None
+    candidates = ActivityList.validate_python(activities, from_attributes=True)
+    
+    def ranking_event(categories: List[str]) -> Tuple[list, bytes]:
+        ranked = list(candidates)
+        _sort_by_categories(ranked, categories)
+        return ranked, _sse_event("ranking", {
+            "categories": categories,
+            "activities": ActivityList.dump_python(ranked, mode="json"),
+        })
+    
+    async def events():
+        ranked = candidates
+        reasoning = None
+        yield _sse_event("candidates", ActivityList.dump_python(candidates, mode="json"))
+        if cached is not None and cached.get("reasoning"):
+            # 推奨理由まで保存済みの場合はLLMを呼び出さずに返す
+            ranked, event = ranking_event(cached["categories"])
+            yield event
+            reasoning = cached["reasoning"]
+            yield _sse_event("reasoning", {"text": reasoning})
+        elif context is not None:
+            parts = []
+            categories = None
+            try:
+                async for kind, value in ai_service.stream_personalization(context[0], fatigue_level, context[1]):
+                    if kind == "categories":
+                        categories = value
+                        ranked, event = ranking_event(value)
+                        yield event
+                    else:
+                        parts.append(value)
+                        yield _sse_event("reasoning", {"text": value})
+            except Exception as e:
+                logger.error(f"パーソナライズ中にエラーが発生しました: {str(e)}")
+                ranked = candidates
+                parts = []
+                categories = None
+                yield _sse_event("error", {"detail": "パーソナライズに失敗しました"})
+            reasoning = "".join(parts).strip() or None
+            if categories:
+                await run_in_threadpool(
+                    personalization_cache.set_personalization, current_user.id, key, categories, reasoning
+                )
+        result = ActivityRecommendation(activities=ranked, reasoning=reasoning)
+        yield _sse_event("done", result.model_dump(mode="json"))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # プロキシによるバッファリングを無効にし、イベントをすぐに届ける
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/", response_model=Activity)
 def create_activity(
     activity: ActivityCreate,
@@ -131,11 +266,18 @@ def create_activity(
 @router.get("/{activity_id}", response_model=Activity)
 def read_activity(
     activity_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     指定されたIDの活動を取得
+    スナップショットにあればシリアライズ済みのJSONをそのまま返す
     """
+    snapshot = catalog_snapshot.get_snapshot()
+    if snapshot is not None:
+        index = snapshot.index_of(activity_id)
+        if index is not None:
+            return json_bytes_response(snapshot.record(index))
+    
     db_activity = crud_activity.get_activity(db, activity_id)
     if db_activity is None:
         raise HTTPException(status_code=404, detail="Activity not found")
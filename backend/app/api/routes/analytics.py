@@ -0,0 +1,50 @@
+from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from ...database import replica_engine
+from ...models.user import User
+from ...api.deps import get_current_admin_user
+from ...services import analytics
+
+router = APIRouter()
+
+@router.get("/crosstab", response_model=Dict[str, Any])
+def get_feedback_crosstab(
+    dims: str = Query("fatigue_level,location,category", description="カンマ区切りの集計次元"),
+    min_count: int = Query(1, ge=1),
+    refresh: bool = False,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    全ユーザーのフィードバックを次元の組み合わせごとに集計（管理者のみ）
+    """
+    dimensions = [dim.strip() for dim in dims.split(",") if dim.strip()]
+    unknown = [dim for dim in dimensions if dim not in analytics.CROSSTAB_DIMENSIONS]
+    if not dimensions or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"集計次元が不正です。使用可能: {', '.join(analytics.CROSSTAB_DIMENSIONS)}"
+        )
+    
+    columns = analytics.get_feedback_columns(replica_engine, refresh=refresh)
+    
+    return {
+        "dimensions": dimensions,
+        "total_feedbacks": len(columns),
+        "snapshot_max_feedback_id": columns.max_feedback_id,
+        "cells": analytics.crosstab(columns, dimensions, min_count=min_count)
+    }
+
+@router.get("/histogram/{field}", response_model=Dict[str, int])
+def get_feedback_histogram(
+    field: str,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    評価・疲労度・時間の分布を取得（管理者のみ）
+    """
+    if field not in analytics.HISTOGRAM_FIELDS:
+        raise HTTPException(status_code=404, detail="集計対象のフィールドが見つかりません")
+    
+    columns = analytics.get_feedback_columns(replica_engine)
+    return analytics.histogram(columns, field)
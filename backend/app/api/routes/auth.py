@@ -1,18 +1,34 @@
 from datetime import datetime, timedelta
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import jwt
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from ...database import get_db
 from ...crud import user as crud_user
 from ...schemas.user import Token, UserCreate
 from ...config import settings
+from ...services.password_hasher import password_hasher
+from ...services import principal_cache
+from ...services.rate_limiter import enforce_auth_rate_limit
 
 router = APIRouter()
 
+def create_user_access_token(user) -> str:
+    """
+    ユーザー用のアクセストークンを作成（設定に応じてユーザー情報を埋め込む）
+    """
+    data = {"sub": str(user.id)}
+    if settings.JWT_EMBED_USER_CLAIMS:
+        data.update(principal_cache.token_claims(user))
+    
+    return create_access_token(
+        data=data, expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     """
     JWTアクセストークンを作成
@@ -33,28 +49,40 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     return encoded_jwt
 
 @router.post("/login", response_model=Token)
-def login_access_token(
+async def login_access_token(
+    request: Request,
     db: Session = Depends(get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2互換のトークンログインを取得
+    パスワード検証は専用のハッシュ用Executorで行う
     """
-    user = crud_user.authenticate_user(
-        db, email=form_data.username, password=form_data.password
-    )
+    # 試行回数の制限（ハッシュ処理より前に判定する）
+    await enforce_auth_rate_limit(request, form_data.username)
+    
+    user = await run_in_threadpool(crud_user.get_user_by_email, db, form_data.username)
     
-    if not user:
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await password_hasher.verify_and_update(
+            form_data.password, user.password_hash
+        )
+    
+    if not user or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="メールアドレスまたはパスワードが正しくありません",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
+    # ハッシュのコストが変わっていれば透過的に再ハッシュする
+    if new_hash:
+        await run_in_threadpool(crud_user.update_password_hash, db, user, new_hash)
+    
+    # 直後のAPI呼び出しでDBを参照しないようキャッシュしておく
+    principal_cache.cache_principal(user)
+    access_token = create_user_access_token(user)
     
     return {
         "access_token": access_token,
@@ -62,29 +90,31 @@ def login_access_token(
     }
 
 @router.post("/signup", response_model=Token)
-def signup(
+async def signup(
+    request: Request,
     user_in: UserCreate,
     db: Session = Depends(get_db)
 ) -> Any:
     """
     新規ユーザー登録して、アクセストークンを発行
     """
+    await enforce_auth_rate_limit(request, user_in.email)
+    
     # メールアドレスの重複チェック
-    user = crud_user.get_user_by_email(db, email=user_in.email)
+    user = await run_in_threadpool(crud_user.get_user_by_email, db, user_in.email)
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このメールアドレスは既に使用されています",
         )
     
-    # ユーザー作成
-    user = crud_user.create_user(db, user_in)
+    # ユーザー作成（ハッシュ化は専用Executorで行う）
+    hashed_password = await password_hasher.hash(user_in.password)
+    user = await run_in_threadpool(crud_user.create_user, db, user_in, hashed_password)
     
     # アクセストークン作成
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
+    principal_cache.cache_principal(user)
+    access_token = create_user_access_token(user)
     
     return {
         "access_token": access_token,
@@ -2,20 +2,23 @@
 Supabase認証を使用するためのAPIエンドポイント
 """
 from typing import Any, Dict
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from ...schemas.user import UserCreate, Token
 from ...services.auth_service import signup_user, login_user, logout_user
+from ...services.rate_limiter import enforce_auth_rate_limit
 
 router = APIRouter()
 security = HTTPBearer()
 
 @router.post("/signup", response_model=Dict[str, Any])
-async def signup(user_in: UserCreate) -> Any:
+async def signup(request: Request, user_in: UserCreate) -> Any:
     """
     新規ユーザー登録
     """
+    await enforce_auth_rate_limit(request, user_in.email)
+    
     user_data = await signup_user(
         email=user_in.email,
         password=user_in.password,
@@ -33,10 +36,12 @@ async def signup(user_in: UserCreate) -> Any:
     }
 
 @router.post("/login", response_model=Dict[str, Any]) 
-async def login(email: str, password: str) -> Any:
+async def login(request: Request, email: str, password: str) -> Any:
     """
     ユーザーログイン
     """
+    await enforce_auth_rate_limit(request, email)
+    
     user_data = await login_user(email=email, password=password)
     
     return {
@@ -1,45 +1,106 @@
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from ...database import get_db
 from ...models.user import User
-from ...schemas.feedback import Feedback, FeedbackCreate, FeedbackSummary, FeedbackWithActivity
+from ...schemas.feedback import (
+    Feedback, FeedbackCreate, FeedbackSummary, FeedbackWithActivity,
+    FeedbackBatchCreate, FeedbackBatchResult, FeedbackTrends, TrendGranularity, FeedbackList
+)
 from ...crud import feedback as crud_feedback
-from ...api.deps import get_current_user, get_current_user_id
+from ...crud import rollup as crud_rollup
+from ...api.deps import get_current_user, get_current_user_id, get_read_db
+from ...services.feedback_writer import get_feedback_writer
+from ...services.read_routing import mark_user_write
+from ...services.cache import get_cache, invalidate_user, user_tag
+from ...config import settings
+from ...responses import json_bytes_response
 
 router = APIRouter()
 
+# トレンド集計期間の単位（日数換算）
+RANGE_UNIT_DAYS = {"d": 1, "w": 7, "m": 30, "y": 365}
+MAX_TREND_RANGE_DAYS = 365 * 3
+
+# ユーザーごとのフィードバックサマリー（書き込み時にuser:{id}タグで破棄）
+_summary_cache = get_cache("feedback_summary", ttl=settings.FEEDBACK_SUMMARY_CACHE_SECONDS)
+
+def _after_user_write(user_id: int) -> None:
+    """
+    書き込み後の処理
+    直後の読み取りで書き込みが見えるよう一定時間はプライマリから読ませ、ユーザー由来のキャッシュを破棄する
+    """
+    mark_user_write(user_id)
+    invalidate_user(user_id)
+
 @router.post("/", response_model=Feedback)
-def create_feedback(
+async def create_feedback(
     feedback: FeedbackCreate,
     db: Session = Depends(get_db),
     current_user_id: int = Depends(get_current_user_id)
 ):
     """
     フィードバックを作成
+    write-behindが有効な場合はグループコミットの完了を待って返す
     """
-    return crud_feedback.create_feedback(db, feedback, current_user_id)
+    writer = get_feedback_writer()
+    if writer is not None:
+        created = await writer.submit(feedback, current_user_id)
+    else:
+        created = await run_in_threadpool(crud_feedback.create_feedback, db, feedback, current_user_id)
+    
+    await run_in_threadpool(_after_user_write, current_user_id)
+    return created
+
+@router.post("/batch", response_model=FeedbackBatchResult)
+def create_feedbacks_batch(
+    batch: FeedbackBatchCreate,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    オフライン中に蓄積されたフィードバックを一括作成
+    client_keyが同じ項目の再送は重複登録されない
+    """
+    activity_ids = {item.activity_id for item in batch.items}
+    missing_ids = activity_ids - crud_feedback.get_existing_activity_ids(db, activity_ids)
+    if missing_ids:
+        raise HTTPException(
+            status_code=404,
+            detail=f"活動が見つかりません: {sorted(missing_ids)}"
+        )
+    
+    feedbacks, created = crud_feedback.create_feedbacks_batch(db, batch.items, current_user_id)
+    _after_user_write(current_user_id)
+    
+    return {
+        "created": len(created),
+        "duplicates": len(feedbacks) - len(created),
+        "feedbacks": feedbacks
+    }
 
 @router.get("/me", response_model=List[Feedback])
 def read_user_feedbacks(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user_id: int = Depends(get_current_user_id)
 ):
     """
     現在のユーザーのフィードバックを取得
     """
-    feedbacks = crud_feedback.get_user_feedbacks(db, current_user_id, skip=skip, limit=limit)
-    return feedbacks
+    rows = crud_feedback.get_user_feedback_rows(db, current_user_id, skip=skip, limit=limit)
+    return json_bytes_response(FeedbackList.dump_json(FeedbackList.validate_python(rows)))
 
 @router.get("/activity/{activity_id}", response_model=List[Feedback])
 def read_activity_feedbacks(
     activity_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -52,12 +113,16 @@ def read_activity_feedbacks(
 
 @router.get("/summary", response_model=Dict[str, Any])
 def get_user_feedback_summary(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user_id: int = Depends(get_current_user_id)
 ):
     """
     ユーザーのフィードバックサマリーを取得
     """
+    cached = _summary_cache.get(current_user_id)
+    if cached is not None:
+        return cached
+    
     summary = crud_feedback.get_user_feedback_summary(db, current_user_id)
     
     # カテゴリの割合を計算（もし必要なら）
@@ -65,13 +130,15 @@ def get_user_feedback_summary(
         # 簡単のため、とりあえず仮の割合を設定
         summary["most_used_category_percentage"] = 40
     
-    return {
+    result = {
         "summary": summary
     }
+    _summary_cache.set(current_user_id, result, tags=[user_tag(current_user_id)])
+    return result
 
 @router.get("/preferences", response_model=List[Dict[str, Any]])
 def get_user_activity_preferences(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user_id: int = Depends(get_current_user_id)
 ):
     """
@@ -80,10 +147,35 @@ def get_user_activity_preferences(
     preferences = crud_feedback.get_user_activity_preferences(db, current_user_id)
     return preferences
 
+@router.get("/trends", response_model=FeedbackTrends)
+def get_feedback_trends(
+    granularity: TrendGranularity = TrendGranularity.week,
+    range_: str = Query("90d", alias="range", pattern=r"^[1-9][0-9]{0,3}[dwmy]$", description="集計期間（例: 30d, 12w, 6m, 1y）"),
+    category: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    日・週・月単位のフィードバック傾向を取得
+    日次ロールアップのみを読むため、期間が長くても生データは走査しない
+    """
+    days = min(int(range_[:-1]) * RANGE_UNIT_DAYS[range_[-1]], MAX_TREND_RANGE_DAYS)
+    range_start = datetime.utcnow().date() - timedelta(days=days - 1)
+    
+    points = crud_rollup.get_feedback_trends(
+        db, current_user_id, granularity.value, range_start, category
+    )
+    
+    return {
+        "granularity": granularity,
+        "range_start": range_start,
+        "points": points
+    }
+
 @router.get("/{feedback_id}", response_model=Feedback)
 def read_feedback(
     feedback_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -0,0 +1,17 @@
+"""
+Prometheus用のメトリクスエンドポイント
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ...services.metrics import render_metrics
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """
+    Prometheusのテキスト形式でメトリクスを返す
+    （スレッドプールの状態を読むためイベントループ上で実行する）
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,10 +1,11 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import json
 import logging
 
-from ...database import get_db
+from ...database import get_db, get_async_db
 from ...models.user import User, UserProfile
 from ...schemas.user import User as UserSchema
 from ...schemas.user import UserCreate, UserProfileCreate, UserProfileUpdate, UserProfile as UserProfileSchema
@@ -26,13 +27,13 @@ def read_user_me(
 
 @router.get("/profile", response_model=UserProfileSchema)
 async def read_user_profile(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     現在のログインユーザーのプロファイルを取得
     """
-    profile = crud_user.get_user_profile(db, current_user.id)
+    profile = await crud_user.get_user_profile_async(db, current_user.id)
     
     if not profile:
         raise HTTPException(status_code=404, detail="プロファイルが見つかりません")
@@ -46,18 +47,18 @@ async def read_user_profile(
 @router.post("/profile", response_model=UserProfileSchema)
 async def create_or_update_profile(
     profile: UserProfileUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     ユーザープロファイルを作成または更新
     """
     # 既存のプロファイルを確認
-    existing_profile = crud_user.get_user_profile(db, current_user.id)
+    existing_profile = await crud_user.get_user_profile_async(db, current_user.id)
     
     if existing_profile:
         # プロファイルの更新
-        updated_profile = crud_user.update_user_profile(db, existing_profile, profile)
+        updated_profile = await crud_user.update_user_profile_async(db, existing_profile, profile)
         
         # Gemini 2.0 Flashを使用してAIプロファイルを生成
         try:
@@ -70,7 +71,7 @@ async def create_or_update_profile(
             textual_profile = await ai_service.generate_textual_profile(preferences)
             
             # 生成されたテキストプロファイルを保存
-            updated_profile = crud_user.update_user_profile_text(db, updated_profile, textual_profile)
+            updated_profile = await crud_user.update_user_profile_text_async(db, updated_profile, textual_profile)
         except Exception as e:
             logger.error(f"AIプロファイル生成中にエラーが発生しました: {str(e)}")
             # AIプロファイル生成に失敗しても処理は続行
@@ -88,7 +89,7 @@ async def create_or_update_profile(
             rest_preferences=profile.rest_preferences
         )
         
-        created_profile = crud_user.create_user_profile(db, new_profile, current_user.id)
+        created_profile = await crud_user.create_user_profile_async(db, new_profile, current_user.id)
         
         # Gemini 2.0 Flashを使用してAIプロファイルを生成
         try:
@@ -101,7 +102,7 @@ async def create_or_update_profile(
             textual_profile = await ai_service.generate_textual_profile(preferences)
             
             # 生成されたテキストプロファイルを保存
-            created_profile = crud_user.update_user_profile_text(db, created_profile, textual_profile)
+            created_profile = await crud_user.update_user_profile_text_async(db, created_profile, textual_profile)
         except Exception as e:
             logger.error(f"AIプロファイル生成中にエラーが発生しました: {str(e)}")
             # AIプロファイル生成に失敗しても処理は続行
@@ -1,4 +1,5 @@
 import os
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,11 +8,158 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "top-secret-key")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 day
+    ADMIN_EMAILS: List[str] = []  # 管理者用エンドポイントにアクセスできるユーザー
+    
+    # 認証済みユーザーのキャッシュ
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    # トークンにemail・nameなどを埋め込み、キャッシュが無くてもDBを参照しない
+    # （有効期限内はユーザー情報の変更がトークンに反映されない）
+    JWT_EMBED_USER_CLAIMS: bool = False
+    
+    # Supabase認証トークンのローカル検証
+    SUPABASE_URL: Optional[str] = None
+    SUPABASE_JWT_SECRET: Optional[str] = None  # HS256署名の検証用（プロジェクトのJWTシークレット）
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    SUPABASE_JWKS_CACHE_SECONDS: int = 600  # 非対称鍵（JWKS）のキャッシュ時間
+    SUPABASE_JWKS_MIN_REFRESH_SECONDS: int = 30  # 未知のkidによる再取得の最短間隔
+    SUPABASE_TOKEN_CACHE_SECONDS: int = 60  # リモート検証結果（成功）のキャッシュ時間
+    SUPABASE_NEGATIVE_TOKEN_CACHE_SECONDS: int = 10  # リモート検証結果（失敗）のキャッシュ時間
+    
+    # Supabase HTTPクライアント（共有コネクションプール）
+    SUPABASE_KEY: Optional[str] = None
+    SUPABASE_CLIENT: str = "http"  # "http" または "stub"（インメモリ、ローカル開発・テスト用）
+    SUPABASE_HTTP_TIMEOUT_SECONDS: float = 5.0
+    SUPABASE_HTTP_MAX_CONNECTIONS: int = 100
+    SUPABASE_HTTP_MAX_KEEPALIVE: int = 20
+    
+    # パスワードハッシュ（bcrypt）
+    BCRYPT_ROUNDS: int = 12  # 変更するとログイン成功時に自動で再ハッシュされる
+    PASSWORD_HASH_EXECUTOR: str = "process"  # "process" または "thread"
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32  # 実行中+待機中の上限。超えた要求は503
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 1
+    
+    # ログイン・サインアップのレート制限（トークンバケット）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory"（ワーカーごと）または "redis"（全ワーカーで共有）
+    RATE_LIMIT_REDIS_URL: Optional[str] = None  # RATE_LIMIT_BACKEND=redis の場合は必須
+    RATE_LIMIT_REDIS_TIMEOUT_SECONDS: float = 0.25
+    RATE_LIMIT_FAILURE_MODE: str = "open"  # 共有バックエンドの障害時に "open"（許可）または "closed"（拒否）
+    RATE_LIMIT_MEMORY_MAX_KEYS: int = 100000
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # プロキシの背後ではX-Forwarded-ForのIPを使う
+    AUTH_RATE_LIMIT_IP_CAPACITY: int = 20  # IPアドレスごとの連続試行回数
+    AUTH_RATE_LIMIT_IP_PER_MINUTE: float = 10
+    AUTH_RATE_LIMIT_EMAIL_CAPACITY: int = 5  # メールアドレスごとの連続試行回数
+    AUTH_RATE_LIMIT_EMAIL_PER_MINUTE: float = 2
+    
+    # データベースエンジン（プロファイル: "auto", "sqlite", "postgres", "pgbouncer"）
+    DB_ENGINE_PROFILE: str = "auto"  # autoは接続URLから判定
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456  # 256MB
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # サーバー・プロキシ側のアイドル切断より短くする
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15000  # 0で無効
+    # プライマリ（app.database。PostgreSQLで運用する場合は接続文字列を指定する）
+    DATABASE_URL: str = "sqlite:///./timeboost.db"
+    # 読み取り専用レプリカ（未設定の場合は読み取りもプライマリ。プライマリがSQLiteの場合は指定できない）
+    DB_REPLICA_URL: Optional[str] = None
+    READ_YOUR_WRITES_SECONDS: int = 5  # 書き込み後この秒数はそのユーザーの読み取りをプライマリに向ける
+    
+    # リクエストごとのSQL計測
+    SQL_STATS_ENABLED: bool = True
+    SERVER_TIMING_HEADER: bool = True
+    SQL_STATS_WARN_QUERY_COUNT: int = 20  # これを超えるリクエストをログに出す
+    SQL_STATS_WARN_DB_MS: float = 200
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5  # 同じ形の文がこの回数以上あればN+1の疑い
+    SQL_STATS_STRICT: bool = False  # テスト・CI用: N+1や上限超過を例外にする
+    
+    # メトリクス（/metrics）
+    METRICS_ENABLED: bool = True
+    EVENT_LOOP_MONITOR_INTERVAL_SECONDS: float = 0.5
+    
+    # リクエスト単位のサンプリングプロファイル（無効時はミドルウェア自体を登録しない）
+    PROFILING_ENABLED: bool = False
+    PROFILE_SAMPLE_RATE: float = 0.0  # 無作為にプロファイルするリクエストの割合（0〜1）
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_OUTPUT_DIR: str = "./profiles"
+    
+    # 共有キャッシュ（"memory": ワーカーごとのLRU, "redis": Redis互換サーバーで全ワーカーが共有）
+    CACHE_BACKEND: str = "memory"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_REDIS_TIMEOUT_SECONDS: float = 0.25
+    CACHE_KEY_PREFIX: str = "timeboost:"
+    CACHE_MEMORY_MAX_ENTRIES: int = 100000
+    CACHE_TAG_TTL_SECONDS: int = 86400  # タグの索引の保持期間（エントリのTTLより長くする）
+    
+    # レスポンス圧縮（gzip / brotli）
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # これより小さい本文は圧縮しない（バイト）
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4  # リクエストごとの圧縮用（事前圧縮は最高品質）
+    
+    # 活動一覧のシリアライズ済みレスポンスのキャッシュ（カタログの版ごと）
+    CATALOG_CACHE_SECONDS: int = 300
+    CATALOG_PAGE_SIZE: int = 100  # キャッシュ・事前圧縮するページの件数（limitの既定値）
+    CATALOG_CACHE_MAX_PAGES: int = 256  # キャッシュするページ数の上限（先頭から）
+    CATALOG_MAX_LIMIT: int = 500  # 一覧で一度に取得できる件数の上限
+    FEEDBACK_SUMMARY_CACHE_SECONDS: int = 60
+    PERSONALIZATION_CACHE_SECONDS: int = 600  # LLMによるパーソナライズ結果のキャッシュ時間
+    
+    # 活動カタログの共有メモリスナップショット（空の場合は無効）
+    # scripts/catalog_snapshot_writer.py が作成し、各ワーカーは読み取り専用でmmapする
+    CATALOG_SNAPSHOT_PATH: str = ""
+    CATALOG_SNAPSHOT_CHECK_SECONDS: float = 1.0  # ファイルの差し替えを確認する間隔
+    CATALOG_SNAPSHOT_WRITER_INTERVAL_SECONDS: float = 5.0  # 書き込みプロセスがカタログの版を確認する間隔
+    
+    # 起動時のウォームアップ（完了するまで/readyは503を返す）
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT_SECONDS: float = 30.0  # これを超えたら残りはバックグラウンドで続ける
+    WARMUP_DB_CONNECTIONS: int = 2  # エンジンごとに事前に確立する接続数
+    WARMUP_RETRY_SECONDS: float = 10.0  # 失敗した必須コンポーネントをやり直す間隔
+    WARMUP_LLM_CANARY: bool = False  # 起動時にLLMを1回呼び出して接続・認証を確立する
+    WARMUP_LLM_CANARY_TIMEOUT_SECONDS: float = 10.0
     
     # Google Cloud / Vertex AI
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     GCP_PROJECT_ID: str = os.getenv("GCP_PROJECT_ID")
     
+    # フィードバック書き込みのグループコミット（write-behind）
+    FEEDBACK_WRITE_BEHIND: bool = False
+    FEEDBACK_FLUSH_INTERVAL_MS: int = 20  # この間隔ごとにまとめてコミット
+    FEEDBACK_FLUSH_MAX_ROWS: int = 200  # この件数に達したら間隔を待たずにコミット
+    
+    # 定期ジョブのスケジューラ（DB上のロックを取得したワーカーのみが各ジョブを実行する）
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_POLL_SECONDS: float = 30.0  # 実行時刻を確認する間隔（ワーカーごとに±50%ずらす）
+    SCHEDULER_JITTER_RATIO: float = 0.1  # 次回実行時刻に加えるランダムな遅れ（間隔に対する割合の上限）
+    SCHEDULER_LOCK_SECONDS: int = 3600  # ロックの有効期限（ワーカーが異常終了した場合に解放されるまでの時間）
+    JOB_RUN_RETENTION_DAYS: int = 30
+    
+    # 日次ロールアップのコンパクション（ジョブの間隔。0で定期実行しない）
+    ROLLUP_COMPACTION_INTERVAL_SECONDS: int = 3600
+    ROLLUP_COMPACTION_DAYS: int = 2  # 直近この日数分を生データから再計算
+    
+    # 文章形式のプロファイルの再生成（ジョブの間隔。0で定期実行しない）
+    PROFILE_REGENERATION_INTERVAL_SECONDS: int = 3600
+    PROFILE_REGENERATION_BATCH_SIZE: int = 50  # 1回の定期実行で作成し直す上限
+    
+    # 管理者向け分析（列スナップショット）
+    ANALYTICS_SNAPSHOT_PATH: str = "./analytics_snapshot.npz"
+    ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS: int = 900
+    ANALYTICS_CHUNK_SIZE: int = 50000
+    ANALYTICS_REFRESH_INTERVAL_SECONDS: int = 600  # スナップショットを作成し直すジョブの間隔（0で定期実行しない）
+    
+    # 推奨活動の並べ替え方法: "llm"（Gemini）, "thompson", "ucb"（バンディット）, "none"
+    RECOMMENDATION_ORDERING: str = "llm"
+    RANKER_CANDIDATE_LIMIT: int = 50  # バンディットで並べ替える候補数
+    RANKER_UCB_EXPLORATION: float = 1.0
+    RANKER_SNAPSHOT_PATH: str = "./ranker_snapshot.npz"
+    RANKER_SNAPSHOT_INTERVAL_SECONDS: int = 300
+    
     class Config:
         env_file = ".env"
 
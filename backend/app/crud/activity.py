@@ -1,8 +1,10 @@
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import json
 
-from ..models.activity import Activity
+from ..models.activity import Activity, CatalogRevision
 from ..schemas.activity import ActivityCreate, ActivityUpdate, ActivityFilter
 
 def get_activity(db: Session, activity_id: int) -> Optional[Activity]:
@@ -19,6 +21,36 @@ def get_activities(
     """
     return db.query(Activity).offset(skip).limit(limit).all()
 
+def get_activity_rows(db: Session, skip: int = 0, limit: int = 100) -> List[Any]:
+    """
+    全活動を行（タプル）として取得（ORMオブジェクトを生成しない一覧用）
+    """
+    return db.execute(
+        select(Activity.__table__).order_by(Activity.id).offset(skip).limit(limit)
+    ).all()
+
+def activity_row_to_dict(row) -> Dict[str, Any]:
+    """
+    活動の行をレスポンスの形（JSON列の展開・疲労度範囲）に変換
+    """
+    data = dict(row._mapping)
+    data["locations"] = json.loads(data["locations"])
+    data["steps"] = json.loads(data["steps"]) if data["steps"] else []
+    data["benefits"] = json.loads(data["benefits"]) if data["benefits"] else []
+    data["fatigue_range"] = {"min": data.pop("fatigue_min"), "max": data.pop("fatigue_max")}
+    return data
+
+def get_catalog_version(db: Session) -> Tuple[int, int, Any]:
+    """
+    カタログの版（改訂番号・件数・最終更新時刻）
+    改訂番号はORM経由の追加・更新・削除ごとに増え、件数と更新時刻はORMを経由しない一括投入も反映する
+    """
+    revision = select(CatalogRevision.revision).where(CatalogRevision.id == 1).scalar_subquery()
+    revision_value, count, updated_at = db.execute(
+        select(revision, func.count(Activity.id), func.max(Activity.updated_at))
+    ).one()
+    return revision_value or 0, count, updated_at
+
 def get_filtered_activities(
     db: Session, 
     fatigue_level: int,
@@ -46,7 +78,14 @@ def get_filtered_activities(
     # ロケーションのフィルタリング
     # JSONフィールドをフィルタリングするには、各レコードを取得して
     # Pythonでフィルタリングするか、データベースの拡張機能を使用する必要がある
-    activities = query.all()
+    return _filter_by_location(query.all(), location, category, limit)
+
+def _filter_by_location(
+    activities: Iterable[Activity], location: str, category: Optional[str], limit: int
+) -> List[Activity]:
+    """
+    ロケーション（JSON配列）とカテゴリーで絞り込み、上限数に制限
+    """
     filtered_activities = []
     
     for activity in activities:
@@ -57,9 +96,10 @@ def get_filtered_activities(
                 continue
             
             filtered_activities.append(activity)
+            if len(filtered_activities) >= limit:
+                break
     
-    # 指定された上限数に制限
-    return filtered_activities[:limit]
+    return filtered_activities
 
 def create_activity(db: Session, activity: ActivityCreate) -> Activity:
     """
@@ -120,3 +160,49 @@ def delete_activity(db: Session, db_activity: Activity) -> None:
     """
     db.delete(db_activity)
     db.commit()
+
+# 非同期版（AsyncSession用）
+
+async def get_activity_async(db: AsyncSession, activity_id: int) -> Optional[Activity]:
+    """
+    IDで活動を取得
+    """
+    return await db.get(Activity, activity_id)
+
+async def get_activities_async(
+    db: AsyncSession, skip: int = 0, limit: int = 100
+) -> List[Activity]:
+    """
+    全活動を取得
+    """
+    result = await db.scalars(select(Activity).offset(skip).limit(limit))
+    return list(result)
+
+async def get_activities_by_ids_async(db: AsyncSession, activity_ids: Iterable[int]) -> List[Activity]:
+    """
+    複数IDの活動をまとめて取得
+    """
+    activity_ids = set(activity_ids)
+    if not activity_ids:
+        return []
+    result = await db.scalars(select(Activity).where(Activity.id.in_(activity_ids)))
+    return list(result)
+
+async def get_filtered_activities_async(
+    db: AsyncSession,
+    fatigue_level: int,
+    location: str,
+    duration: int,
+    category: Optional[str] = None,
+    limit: int = 10
+) -> List[Activity]:
+    """
+    フィルター条件に合致する活動を取得
+    """
+    query = select(Activity).where(
+        Activity.fatigue_min <= fatigue_level,
+        Activity.fatigue_max >= fatigue_level,
+        Activity.duration <= duration * 1.25
+    )
+    result = await db.scalars(query)
+    return _filter_by_location(result, location, category, limit)
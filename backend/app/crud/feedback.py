@@ -1,32 +1,152 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Set, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from sqlalchemy import func, desc, and_, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models.feedback import Feedback
 from ..models.activity import Activity
 from ..schemas.feedback import FeedbackCreate
+from .rollup import apply_feedbacks_to_rollups
+from ..services.ranker import observe_feedbacks
+
+def _feedback_row(feedback: FeedbackCreate, user_id: int) -> Dict[str, Any]:
+    """
+    フィードバックスキーマを挿入用の辞書に変換
+    """
+    return {
+        "user_id": user_id,
+        "activity_id": feedback.activity_id,
+        "rating": feedback.rating,
+        "fatigue_level": feedback.fatigue_level,
+        "location": feedback.location,
+        "duration": feedback.duration,
+        "completion_status": feedback.completion_status,
+        "comments": feedback.comments,
+        "client_key": feedback.client_key,
+    }
+
+def get_feedback_by_client_key(db: Session, user_id: int, client_key: str) -> Optional[Feedback]:
+    """
+    冪等キーでフィードバックを取得
+    """
+    return db.query(Feedback).filter(
+        Feedback.user_id == user_id,
+        Feedback.client_key == client_key
+    ).first()
 
 def create_feedback(db: Session, feedback: FeedbackCreate, user_id: int) -> Feedback:
     """
     フィードバックを作成
     """
-    db_feedback = Feedback(
-        user_id=user_id,
-        activity_id=feedback.activity_id,
-        rating=feedback.rating,
-        fatigue_level=feedback.fatigue_level,
-        location=feedback.location,
-        duration=feedback.duration,
-        completion_status=feedback.completion_status,
-        comments=feedback.comments
-    )
-    
-    db.add(db_feedback)
-    db.commit()
-    db.refresh(db_feedback)
+    # 再送されたリクエストは既存の行をそのまま返す
+    if feedback.client_key:
+        existing = get_feedback_by_client_key(db, user_id, feedback.client_key)
+        if existing:
+            return existing
+
+    # RETURNINGで作成行を受け取り、refreshの往復を省く
+    try:
+        db_feedback = insert_feedback_rows(db, [_feedback_row(feedback, user_id)])[0]
+    except IntegrityError:
+        # 同じ冪等キーの並行リクエストが先に書き込んだ場合
+        db.rollback()
+        existing = get_feedback_by_client_key(db, user_id, feedback.client_key) if feedback.client_key else None
+        if existing is None:
+            raise
+        return existing
+    apply_feedbacks_to_rollups(db, [db_feedback])
+    _commit_without_expiring(db)
+    observe_feedbacks([db_feedback])
     
     return db_feedback
 
+def _commit_without_expiring(db: Session) -> None:
+    """
+    RETURNINGで取得済みの値をコミット後もそのまま使えるよう、このコミットに限り失効させない
+    （リクエスト内の以降の処理に影響しないよう、セッションの設定は元に戻す）
+    """
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire_on_commit
+
+def get_existing_activity_ids(db: Session, activity_ids: Iterable[int]) -> Set[int]:
+    """
+    指定された活動IDのうち存在するものを1クエリで取得
+    """
+    activity_ids = set(activity_ids)
+    if not activity_ids:
+        return set()
+    rows = db.query(Activity.id).filter(Activity.id.in_(activity_ids)).all()
+    return {row[0] for row in rows}
+
+def insert_feedback_rows(db: Session, rows: List[Dict[str, Any]]) -> List[Feedback]:
+    """
+    複数行INSERTでフィードバックを挿入し、RETURNINGで作成行を取得する
+    コミットは呼び出し側で行う
+    """
+    if not rows:
+        return []
+    stmt = insert(Feedback).returning(Feedback, sort_by_parameter_order=True)
+    return list(db.scalars(stmt, rows).all())
+
+def create_feedbacks_batch(
+    db: Session, feedbacks: List[FeedbackCreate], user_id: int, commit: bool = True, retry: bool = True
+) -> Tuple[List[Feedback], List[Feedback]]:
+    """
+    フィードバックを一括作成
+    登録済みの冪等キーを持つ項目は挿入せず既存の行を返す
+    戻り値は (リクエスト順のフィードバック, 新規作成した行)
+    commit=Falseの場合はコミットとランカーへの反映を呼び出し側に任せる
+    （同じ冪等キーの並行リクエストと衝突した場合のIntegrityErrorも呼び出し側で扱う）
+    """
+    keys = {fb.client_key for fb in feedbacks if fb.client_key}
+    by_key: Dict[str, Feedback] = {}
+    if keys:
+        existing = db.query(Feedback).filter(
+            Feedback.user_id == user_id,
+            Feedback.client_key.in_(keys)
+        ).all()
+        by_key = {fb.client_key: fb for fb in existing}
+
+    # 既存キーとバッチ内で重複したキーを除いた行だけを挿入する
+    rows = []
+    pending_keys = set(by_key)
+    for fb in feedbacks:
+        if fb.client_key:
+            if fb.client_key in pending_keys:
+                continue
+            pending_keys.add(fb.client_key)
+        rows.append(_feedback_row(fb, user_id))
+
+    try:
+        created = insert_feedback_rows(db, rows)
+        # ロールアップはバッチ単位で1回だけ更新する
+        apply_feedbacks_to_rollups(db, created)
+        if commit:
+            _commit_without_expiring(db)
+    except IntegrityError:
+        if not commit or not retry:
+            raise
+        # 同じ冪等キーの並行リクエスト（再送など）が先に書き込んだ場合は、
+        # 衝突したキーを既存の行として取得し直して一度だけやり直す
+        db.rollback()
+        return create_feedbacks_batch(db, feedbacks, user_id, commit=commit, retry=False)
+
+    if commit:
+        observe_feedbacks(created)
+
+    results = []
+    unkeyed = iter(fb for fb in created if not fb.client_key)
+    by_key.update({fb.client_key: fb for fb in created if fb.client_key})
+    for fb in feedbacks:
+        results.append(by_key[fb.client_key] if fb.client_key else next(unkeyed))
+
+    return results, created
+
 def get_user_feedbacks(
     db: Session, user_id: int, skip: int = 0, limit: int = 100
 ) -> List[Feedback]:
@@ -39,6 +159,21 @@ def get_user_feedbacks(
         desc(Feedback.created_at)
     ).offset(skip).limit(limit).all()
 
+def get_user_feedback_rows(
+    db: Session, user_id: int, skip: int = 0, limit: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    ユーザーのフィードバックを辞書として取得（ORMオブジェクトを生成しない一覧用）
+    """
+    rows = db.execute(
+        select(Feedback.__table__).where(
+            Feedback.user_id == user_id
+        ).order_by(
+            desc(Feedback.created_at)
+        ).offset(skip).limit(limit)
+    ).all()
+    return [dict(row._mapping) for row in rows]
+
 def get_activity_feedbacks(
     db: Session, activity_id: int, skip: int = 0, limit: int = 100
 ) -> List[Feedback]:
@@ -167,3 +302,26 @@ def get_user_activity_preferences(db: Session, user_id: int, limit: int = 10) ->
         }
         for category, avg_rating, count in high_rated_categories
     ]
+
+# 非同期版（AsyncSession用）
+
+async def get_user_feedbacks_async(
+    db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100
+) -> List[Feedback]:
+    """
+    ユーザーのフィードバックを取得
+    """
+    result = await db.scalars(
+        select(Feedback).where(
+            Feedback.user_id == user_id
+        ).order_by(
+            desc(Feedback.created_at)
+        ).offset(skip).limit(limit)
+    )
+    return list(result)
+
+async def get_feedback_async(db: AsyncSession, feedback_id: int) -> Optional[Feedback]:
+    """
+    IDでフィードバックを取得
+    """
+    return await db.get(Feedback, feedback_id)
@@ -0,0 +1,131 @@
+from typing import Iterable, List, Optional
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..models.job import JobRun, ScheduledJob
+
+def ensure_jobs(db: Session, names: Iterable[str]) -> None:
+    """
+    登録済みジョブの行を作成（既にあれば何もしない。複数ワーカーが同時に作成しても重複しない）
+    """
+    existing = set(db.scalars(select(ScheduledJob.name)))
+    for name in names:
+        if name in existing:
+            continue
+        db.add(ScheduledJob(name=name))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+
+def get_scheduled_jobs(db: Session) -> List[ScheduledJob]:
+    """
+    全ジョブの次回実行時刻とロック状態を取得
+    """
+    return list(db.scalars(select(ScheduledJob).order_by(ScheduledJob.name)))
+
+def get_due_job_names(db: Session, now: datetime) -> List[str]:
+    """
+    実行時刻を過ぎ、ロックされていないジョブ名を取得
+    """
+    return list(db.scalars(
+        select(ScheduledJob.name).where(
+            ScheduledJob.next_run_at <= now,
+            or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now),
+        )
+    ))
+
+def set_next_run(db: Session, name: str, next_run_at: Optional[datetime], only_if_unset: bool = False) -> None:
+    """
+    次回実行時刻を設定（only_if_unsetの場合は未設定のときのみ）
+    """
+    statement = update(ScheduledJob).where(ScheduledJob.name == name)
+    if only_if_unset:
+        statement = statement.where(ScheduledJob.next_run_at.is_(None))
+    db.execute(statement.values(next_run_at=next_run_at))
+    db.commit()
+
+def claim_job(db: Session, name: str, owner: str, now: datetime, lease_seconds: float, due_only: bool = True) -> bool:
+    """
+    ジョブのロックを取得（条件付きUPDATEの更新件数で判定するため、取得できるのは1ワーカーのみ）
+    due_onlyの場合は実行時刻を過ぎている場合に限る
+    """
+    statement = update(ScheduledJob).where(
+        ScheduledJob.name == name,
+        or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now),
+    )
+    if due_only:
+        statement = statement.where(ScheduledJob.next_run_at <= now)
+    result = db.execute(
+        statement.values(locked_by=owner, locked_until=now + timedelta(seconds=lease_seconds))
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def release_job(db: Session, name: str, owner: str, next_run_at: Optional[datetime]) -> None:
+    """
+    ロックを解放し、次回実行時刻を設定（自分が保持しているロックのみ）
+    """
+    db.execute(
+        update(ScheduledJob)
+        .where(ScheduledJob.name == name, ScheduledJob.locked_by == owner)
+        .values(locked_by=None, locked_until=None, next_run_at=next_run_at)
+    )
+    db.commit()
+
+def get_cursor(db: Session, name: str) -> Optional[str]:
+    """
+    ジョブの再開位置を取得（未設定の場合はNone）
+    """
+    return db.scalar(select(ScheduledJob.cursor).where(ScheduledJob.name == name))
+
+def set_cursor(db: Session, name: str, cursor: Optional[str]) -> None:
+    """
+    ジョブの再開位置を保存
+    """
+    db.execute(update(ScheduledJob).where(ScheduledJob.name == name).values(cursor=cursor))
+    db.commit()
+
+def start_run(db: Session, name: str, trigger: str, worker: str, started_at: datetime) -> JobRun:
+    """
+    実行履歴を作成
+    """
+    run = JobRun(job_name=name, trigger=trigger, status="running", worker=worker, started_at=started_at)
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    return run
+
+def finish_run(
+    db: Session, run: JobRun, status: str, finished_at: datetime,
+    result: Optional[str] = None, error: Optional[str] = None
+) -> JobRun:
+    """
+    実行履歴に結果を記録
+    """
+    run.status = status
+    run.finished_at = finished_at
+    run.duration_ms = (finished_at - run.started_at).total_seconds() * 1000
+    run.result = result
+    run.error = error
+    db.commit()
+    return run
+
+def get_job_runs(db: Session, name: Optional[str] = None, limit: int = 20) -> List[JobRun]:
+    """
+    実行履歴を新しい順に取得
+    """
+    query = select(JobRun).order_by(JobRun.started_at.desc(), JobRun.id.desc()).limit(limit)
+    if name:
+        query = query.where(JobRun.job_name == name)
+    return list(db.scalars(query))
+
+def prune_job_runs(db: Session, before: datetime) -> int:
+    """
+    指定時刻より前に開始した実行履歴を削除し、削除件数を返す
+    """
+    result = db.execute(delete(JobRun).where(JobRun.started_at < before))
+    db.commit()
+    return result.rowcount
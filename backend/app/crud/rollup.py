@@ -0,0 +1,178 @@
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import date, timedelta
+from collections import defaultdict
+from sqlalchemy.orm import Session
+from sqlalchemy import func, cast, case, select, delete, Date
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ..models.feedback import Feedback, FeedbackDailyRollup
+from ..models.activity import Activity
+
+RollupKey = Tuple[int, str, date]
+
+def _upsert_statement(db: Session):
+    """
+    実行中のDBに合わせたINSERT ... ON CONFLICT文を取得
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(FeedbackDailyRollup)
+    return sqlite.insert(FeedbackDailyRollup)
+
+def _day_expression(db: Session):
+    """
+    created_atから日付を取り出すSQL式（SQLiteはCASTでDATEにできないためdate()を使う）
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(Feedback.created_at)
+    return cast(Feedback.created_at, Date)
+
+def apply_feedbacks_to_rollups(db: Session, feedbacks: List[Feedback]) -> None:
+    """
+    作成したフィードバックを日次ロールアップに加算
+    コミットは呼び出し側のトランザクションで行う
+    """
+    if not feedbacks:
+        return
+
+    activity_ids = {fb.activity_id for fb in feedbacks}
+    categories = dict(
+        db.query(Activity.id, Activity.category).filter(Activity.id.in_(activity_ids)).all()
+    )
+
+    # バッチ内で (ユーザー, カテゴリ, 日) ごとに集計してから1回だけUPSERTする
+    totals: Dict[RollupKey, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+    for fb in feedbacks:
+        category = categories.get(fb.activity_id)
+        if category is None:
+            continue
+        total = totals[(fb.user_id, category, fb.created_at.date())]
+        total[0] += 1
+        total[1] += fb.rating
+        total[2] += 1 if fb.completion_status == "completed" else 0
+        total[3] += fb.fatigue_level
+
+    if not totals:
+        return
+
+    stmt = _upsert_statement(db)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "category", "day"],
+        set_={
+            "feedback_count": FeedbackDailyRollup.feedback_count + stmt.excluded.feedback_count,
+            "rating_sum": FeedbackDailyRollup.rating_sum + stmt.excluded.rating_sum,
+            "completed_count": FeedbackDailyRollup.completed_count + stmt.excluded.completed_count,
+            "fatigue_sum": FeedbackDailyRollup.fatigue_sum + stmt.excluded.fatigue_sum,
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt, [
+        {
+            "user_id": user_id,
+            "category": category,
+            "day": day,
+            "feedback_count": count,
+            "rating_sum": rating_sum,
+            "completed_count": completed,
+            "fatigue_sum": fatigue_sum,
+        }
+        for (user_id, category, day), (count, rating_sum, completed, fatigue_sum) in totals.items()
+    ])
+
+def rebuild_rollups(db: Session, since: date) -> int:
+    """
+    指定日以降のロールアップを生データから再計算（コンパクション）
+    書き込み失敗や削除によるずれを解消し、件数0の行を取り除く
+    """
+    day = _day_expression(db)
+    aggregated = select(
+        Feedback.user_id,
+        Activity.category,
+        day.label("day"),
+        func.count(Feedback.id),
+        func.sum(Feedback.rating),
+        func.sum(case((Feedback.completion_status == "completed", 1), else_=0)),
+        func.sum(Feedback.fatigue_level),
+    ).join(
+        Activity, Feedback.activity_id == Activity.id
+    ).where(
+        Feedback.created_at >= since
+    ).group_by(
+        Feedback.user_id, Activity.category, day
+    )
+
+    db.execute(delete(FeedbackDailyRollup).where(FeedbackDailyRollup.day >= since))
+    result = db.execute(
+        FeedbackDailyRollup.__table__.insert().from_select(
+            ["user_id", "category", "day", "feedback_count", "rating_sum", "completed_count", "fatigue_sum"],
+            aggregated,
+        )
+    )
+    db.commit()
+
+    return result.rowcount
+
+def get_rollups(
+    db: Session, user_id: int, since: date, category: Optional[str] = None
+) -> List[FeedbackDailyRollup]:
+    """
+    ユーザーの日次ロールアップを取得
+    """
+    query = db.query(FeedbackDailyRollup).filter(
+        FeedbackDailyRollup.user_id == user_id,
+        FeedbackDailyRollup.day >= since
+    )
+    if category:
+        query = query.filter(FeedbackDailyRollup.category == category)
+
+    return query.order_by(FeedbackDailyRollup.day).all()
+
+def _bucket_start(day: date, granularity: str) -> date:
+    """
+    日付を集計単位の先頭日に丸める
+    """
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def get_feedback_trends(
+    db: Session,
+    user_id: int,
+    granularity: str,
+    since: date,
+    category: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    日次ロールアップのみを読み、日・週・月単位のトレンドを計算
+    """
+    buckets: Dict[date, Dict[str, Any]] = {}
+    for rollup in get_rollups(db, user_id, since, category):
+        start = _bucket_start(rollup.day, granularity)
+        bucket = buckets.setdefault(start, {
+            "count": 0, "rating_sum": 0, "completed": 0, "fatigue_sum": 0, "categories": {}
+        })
+        bucket["count"] += rollup.feedback_count
+        bucket["rating_sum"] += rollup.rating_sum
+        bucket["completed"] += rollup.completed_count
+        bucket["fatigue_sum"] += rollup.fatigue_sum
+        bucket["categories"][rollup.category] = (
+            bucket["categories"].get(rollup.category, 0) + rollup.feedback_count
+        )
+
+    points = []
+    for start in sorted(buckets):
+        bucket = buckets[start]
+        count = bucket["count"]
+        if count == 0:
+            continue
+        points.append({
+            "period_start": start,
+            "total_feedbacks": count,
+            "average_rating": round(bucket["rating_sum"] / count, 1),
+            "completion_rate": round(bucket["completed"] / count * 100, 1),
+            "average_fatigue": round(bucket["fatigue_sum"] / count, 1),
+            "categories": bucket["categories"],
+        })
+
+    return points
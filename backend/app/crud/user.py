@@ -1,13 +1,15 @@
 from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import json
-from passlib.context import CryptContext
 
 from ..models.user import User, UserProfile
 from ..schemas.user import UserCreate, UserProfileCreate, UserProfileUpdate
+from ..services.password_hasher import get_crypt_context
 
-# パスワードハッシュのためのパスワードコンテキスト
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# パスワードハッシュのためのパスワードコンテキスト（コストは設定値）
+pwd_context = get_crypt_context()
 
 def get_user(db: Session, user_id: int) -> Optional[User]:
     """
@@ -27,12 +29,14 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     """
     return db.query(User).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: UserCreate) -> User:
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None) -> User:
     """
     新しいユーザーを作成
+    ハッシュ済みのパスワードが渡された場合はそれを使用する
     """
     # パスワードをハッシュ化
-    hashed_password = pwd_context.hash(user.password)
+    if hashed_password is None:
+        hashed_password = pwd_context.hash(user.password)
     
     db_user = User(
         email=user.email,
@@ -51,6 +55,17 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+def update_password_hash(db: Session, db_user: User, hashed_password: str) -> User:
+    """
+    パスワードハッシュを更新（コスト変更時の再ハッシュ用）
+    """
+    db_user.password_hash = hashed_password
+    
+    db.commit()
+    db.refresh(db_user)
+    
+    return db_user
+
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """
     ユーザーを認証
@@ -58,8 +73,11 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    verified, new_hash = pwd_context.verify_and_update(password, user.password_hash)
+    if not verified:
         return None
+    if new_hash:
+        update_password_hash(db, user, new_hash)
     
     return user
 
@@ -86,11 +104,9 @@ def create_user_profile(db: Session, profile: UserProfileCreate, user_id: int) -
     
     return db_profile
 
-def update_user_profile(
-    db: Session, db_profile: UserProfile, profile_update: UserProfileUpdate
-) -> UserProfile:
+def _apply_profile_update(db_profile: UserProfile, profile_update: UserProfileUpdate) -> None:
     """
-    ユーザープロファイルを更新
+    更新内容をプロファイルのモデルに反映
     """
     # 更新するデータを準備
     update_data = profile_update.dict(exclude_unset=True)
@@ -105,6 +121,14 @@ def update_user_profile(
     # モデルの更新
     for key, value in update_data.items():
         setattr(db_profile, key, value)
+
+def update_user_profile(
+    db: Session, db_profile: UserProfile, profile_update: UserProfileUpdate
+) -> UserProfile:
+    """
+    ユーザープロファイルを更新
+    """
+    _apply_profile_update(db_profile, profile_update)
     
     db.commit()
     db.refresh(db_profile)
@@ -123,3 +147,66 @@ def update_user_profile_text(
     db.refresh(db_profile)
     
     return db_profile
+
+# 非同期版（AsyncSession用）
+
+async def get_user_async(db: AsyncSession, user_id: int) -> Optional[User]:
+    """
+    IDでユーザーを取得
+    """
+    return await db.get(User, user_id)
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[User]:
+    """
+    メールアドレスでユーザーを取得
+    """
+    return await db.scalar(select(User).where(User.email == email))
+
+async def get_user_profile_async(db: AsyncSession, user_id: int) -> Optional[UserProfile]:
+    """
+    ユーザープロファイルを取得
+    """
+    return await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
+
+async def create_user_profile_async(db: AsyncSession, profile: UserProfileCreate, user_id: int) -> UserProfile:
+    """
+    ユーザープロファイルを作成
+    """
+    db_profile = UserProfile(
+        user_id=user_id,
+        interests=json.dumps(profile.interests),
+        work_style=profile.work_style,
+        rest_preferences=json.dumps(profile.rest_preferences)
+    )
+    
+    db.add(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
+    
+    return db_profile
+
+async def update_user_profile_async(
+    db: AsyncSession, db_profile: UserProfile, profile_update: UserProfileUpdate
+) -> UserProfile:
+    """
+    ユーザープロファイルを更新
+    """
+    _apply_profile_update(db_profile, profile_update)
+    
+    await db.commit()
+    await db.refresh(db_profile)
+    
+    return db_profile
+
+async def update_user_profile_text_async(
+    db: AsyncSession, db_profile: UserProfile, textual_profile: str
+) -> UserProfile:
+    """
+    AI生成されたテキストプロファイルを更新
+    """
+    db_profile.textual_profile = textual_profile
+    
+    await db.commit()
+    await db.refresh(db_profile)
+    
+    return db_profile
@@ -1,14 +1,32 @@
-from sqlalchemy import create_engine
+from typing import AsyncGenerator
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./timeboost.db"
+from .config import settings
+from .db_engine import create_db_engine, create_async_db_engine, create_replica_engines
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+# WAL・PRAGMAなどはdb_engineのsqliteプロファイルで設定
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 非同期ルート用（SQLiteは同じDBファイルをaiosqliteで、PostgreSQLはasyncpgで開く）
+async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
+# コミット後に属性を再読み込みしない（非同期では暗黙の遅延ロードができないため）
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# 読み取り専用レプリカ（未設定の場合はプライマリと同じエンジン）
+replica_engine, async_replica_engine = create_replica_engines(SQLALCHEMY_DATABASE_URL, engine, async_engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 # Dependency to get DB session
@@ -18,3 +36,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get async DB session
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
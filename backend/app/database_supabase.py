@@ -3,13 +3,15 @@ Supabaseを使用したデータベース接続の設定
 開発環境と本番環境の両方でSupabaseを使用する場合はこのファイルを使用します
 """
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator, Optional
 from supabase import create_client, Client
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
+from .db_engine import create_db_engine, create_async_db_engine, create_replica_engines
+
 load_dotenv()
 
 # Supabase接続情報
@@ -17,13 +19,27 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")  # PostgreSQL接続文字列
 
-# SQLAlchemy設定
-engine = create_engine(SUPABASE_DB_URL)
+# SQLAlchemy設定（プール設定・タイムアウトはdb_engineのプロファイルで設定）
+# SupabaseのトランザクションプーラーはDB_ENGINE_PROFILE=pgbouncerで使用する
+engine = create_db_engine(SUPABASE_DB_URL, name="supabase")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# 非同期ルート用（asyncpgドライバ）
+async_engine = create_async_db_engine(SUPABASE_DB_URL, name="supabase_async")
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# 読み取り専用レプリカ（SupabaseのリードレプリカをDB_REPLICA_URLで指定。未設定の場合はプライマリ）
+replica_engine, async_replica_engine = create_replica_engines(SUPABASE_DB_URL, engine, async_engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
-# Supabaseクライアント
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Supabaseクライアント（同期版。認証系はservices.supabase_httpの非同期クライアントを使用）
+_supabase: Optional[Client] = None
 
 def get_db() -> Generator:
     """データベースセッションの依存性関数"""
@@ -33,6 +49,27 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """非同期データベースセッションの依存性関数"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_read_db() -> Generator:
+    """読み取り専用データベースセッション（レプリカ）の依存性関数"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """読み取り専用の非同期データベースセッションの依存性関数"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
 def get_supabase() -> Client:
-    """Supabaseクライアントの依存性関数"""
-    return supabase
+    """Supabaseクライアントの依存性関数（初回呼び出し時に作成）"""
+    global _supabase
+    if _supabase is None:
+        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
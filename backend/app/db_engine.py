@@ -0,0 +1,151 @@
+"""
+SQLAlchemyエンジンの生成（接続先ごとのプロファイル）
+- sqlite: WALモードと読み書きの並行性を上げるPRAGMAを設定
+- postgres: コネクションプールの設定とステートメントタイムアウト
+- pgbouncer: postgresに加え、トランザクションプーリング下で壊れるプリペアドステートメントのキャッシュを無効化
+"""
+import logging
+import uuid
+from typing import Any, Dict, Optional, Tuple, Union
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from .config import settings
+from .services.metrics import instrument_pool
+
+logger = logging.getLogger(__name__)
+
+ENGINE_PROFILES = ("sqlite", "postgres", "pgbouncer")
+
+# 非同期ドライバへの対応（PostgreSQLはasyncpg、SQLiteはaiosqlite）
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_url(url: Union[str, URL]) -> URL:
+    """同期用の接続URLを非同期ドライバのURLに変換"""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def resolve_profile(url: Union[str, URL], profile: Optional[str] = None) -> str:
+    """使用するプロファイルを決定（"auto"の場合は接続先から判定）"""
+    profile = profile or settings.DB_ENGINE_PROFILE
+    if profile in ENGINE_PROFILES:
+        return profile
+    if make_url(url).get_backend_name() == "sqlite":
+        return "sqlite"
+    return "postgres"
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """接続ごとにSQLiteのPRAGMAを設定"""
+    cursor = dbapi_connection.cursor()
+    # WAL: 書き込み中も読み込みをブロックしない
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # WALではNORMALでもクラッシュ時の整合性は保たれる（電源断時は直近のコミットのみ失われうる）
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _pool_options() -> Dict[str, Any]:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _engine_options(url: URL, profile: str, is_async: bool) -> Dict[str, Any]:
+    """プロファイルに応じたcreate_engineの引数"""
+    if profile == "sqlite":
+        connect_args = {} if is_async else {"check_same_thread": False}
+        return {"connect_args": connect_args}
+
+    options = _pool_options()
+    connect_args: Dict[str, Any] = {}
+    timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS
+
+    if profile == "pgbouncer":
+        # トランザクションプーリングでは接続時のパラメータやプリペアドステートメントが
+        # 別のサーバー接続に引き継がれないため、キャッシュを無効化し名前を一意にする
+        if is_async:
+            connect_args.update({
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            })
+    elif timeout_ms:
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": str(timeout_ms)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+
+    options["connect_args"] = connect_args
+    return options
+
+
+def _install_listeners(sync_engine: Engine, profile: str) -> None:
+    if profile == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    elif profile == "pgbouncer" and settings.DB_STATEMENT_TIMEOUT_MS:
+        # 接続単位の設定が使えないため、トランザクションごとにタイムアウトを設定する
+        timeout_ms = int(settings.DB_STATEMENT_TIMEOUT_MS)
+
+        @event.listens_for(sync_engine, "begin")
+        def _set_local_timeout(connection) -> None:
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+def create_db_engine(
+    url: Union[str, URL], profile: Optional[str] = None, name: str = "primary", **kwargs
+) -> Engine:
+    """プロファイルを適用した同期エンジンを作成（nameはメトリクスのラベル）"""
+    url = make_url(url)
+    profile = resolve_profile(url, profile)
+    engine = create_engine(url, **{**_engine_options(url, profile, is_async=False), **kwargs})
+    _install_listeners(engine, profile)
+    instrument_pool(engine.pool, name)
+    logger.info(f"Created database engine ({profile}): {url.render_as_string(hide_password=True)}")
+    return engine
+
+
+def create_async_db_engine(
+    url: Union[str, URL], profile: Optional[str] = None, name: str = "primary_async", **kwargs
+) -> AsyncEngine:
+    """プロファイルを適用した非同期エンジンを作成（同期用URLを渡した場合はドライバを変換）"""
+    url = async_url(url)
+    profile = resolve_profile(url, profile)
+    engine = create_async_engine(url, **{**_engine_options(url, profile, is_async=True), **kwargs})
+    _install_listeners(engine.sync_engine, profile)
+    instrument_pool(engine.sync_engine.pool, name)
+    return engine
+
+
+def create_replica_engines(
+    primary_url: Union[str, URL], primary: Engine, async_primary: AsyncEngine
+) -> Tuple[Engine, AsyncEngine]:
+    """
+    読み取り用の同期・非同期エンジンを作成（DB_REPLICA_URLが未設定の場合はプライマリのエンジンを返す）
+    レプリカはプライマリから複製されるサーバーDBに限る（ローカルのSQLiteファイルには複製先が存在しないため、
+    別のDBへ読み取りを向けると書き込みが見えなくなる）
+    """
+    if not settings.DB_REPLICA_URL:
+        return primary, async_primary
+    if make_url(primary_url).get_backend_name() == "sqlite":
+        raise ValueError("DB_REPLICA_URL cannot be used with a SQLite primary database")
+    return (
+        create_db_engine(settings.DB_REPLICA_URL, name="replica"),
+        create_async_db_engine(settings.DB_REPLICA_URL, name="replica_async"),
+    )
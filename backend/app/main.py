@@ -5,10 +5,22 @@ import logging
 from . import models
 from .database import engine
 from .config import settings
+from .responses import FastJSONResponse
 from .services import ai_service
+from .services.feedback_writer import start_feedback_writer, stop_feedback_writer
+from .services.scheduler import start_scheduler, stop_scheduler
+from .services.ranker import start_ranker_snapshots, stop_ranker_snapshots
+from .services.password_hasher import password_hasher
+from .middleware.compression import CompressionMiddleware
+from .middleware.request_stats import RequestStatsMiddleware
+from .middleware.metrics import MetricsMiddleware
+from .middleware.profiling import ProfilingMiddleware
+from .services.metrics import start_loop_monitor, stop_loop_monitor
+from .services.cache import close_cache
+from .services.warmup import readiness, start_warmup, stop_warmup
 
 # APIルーターのインポート
-from .api.routes import activities, users, feedback, auth
+from .api.routes import activities, users, feedback, auth, analytics, metrics
 
 # ロギングの設定
 logging.basicConfig(
@@ -27,6 +39,7 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     description="疲れた状態でも最適な活動を提案するAIアシスタント",
     version="0.1.0",
+    default_response_class=FastJSONResponse,
 )
 
 # CORSミドルウェアの設定
@@ -43,6 +56,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# レスポンス圧縮（gzip / brotli。SSEと小さな本文は対象外）
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# リクエストごとのSQL計測（Server-Timingヘッダー・N+1検出）
+if settings.SQL_STATS_ENABLED:
+    app.add_middleware(RequestStatsMiddleware)
+
+# ルートごとのリクエスト数・レイテンシ（/metrics）
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# リクエスト単位のサンプリングプロファイル（管理者のX-Profileヘッダーまたは無作為抽出）
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # スタートアップイベント
 @app.on_event("startup")
 async def startup_event():
@@ -53,12 +82,41 @@ async def startup_event():
         logger.info("Vertex AI initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize Vertex AI: {str(e)}")
+    
+    # フィードバックのグループコミット（設定で有効な場合のみ）
+    await start_feedback_writer()
+    
+    # 定期ジョブ（ロールアップのコンパクション・分析スナップショットなど）
+    await start_scheduler()
+    
+    # バンディット事後分布の読み込みと定期スナップショット
+    await start_ranker_snapshots()
+    
+    # イベントループの遅延計測（/metrics）
+    await start_loop_monitor()
+    
+    # DB接続・カタログ・キャッシュのウォームアップ（完了まで/readyは503）
+    await start_warmup()
+
+# シャットダウンイベント
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_warmup()
+    # 未書き込みのフィードバックをフラッシュ
+    await stop_feedback_writer()
+    await stop_scheduler()
+    await stop_ranker_snapshots()
+    await stop_loop_monitor()
+    close_cache()
+    password_hasher.shutdown()
 
 # APIルートの登録
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
 app.include_router(activities.router, prefix=f"{settings.API_V1_STR}/activities", tags=["activities"])
 app.include_router(feedback.router, prefix=f"{settings.API_V1_STR}/feedback", tags=["feedback"])
+app.include_router(analytics.router, prefix=f"{settings.API_V1_STR}/analytics", tags=["analytics"])
+app.include_router(metrics.router, tags=["monitoring"])
 
 @app.get("/")
 async def root():
@@ -68,5 +126,14 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """ウォームアップの状態（必須のコンポーネントがすべて準備できるまで503）"""
+    ready, components = readiness()
+    return FastJSONResponse(
+        {"status": "ready" if ready else "warming", "components": components},
+        status_code=200 if ready else 503,
+    )
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,60 @@
+"""
+ルートごとのリクエスト数・レイテンシを記録するミドルウェア
+"""
+import time
+from typing import Dict
+
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..services.metrics import http_request_duration_seconds, http_requests_total
+
+# ルートに一致しなかったリクエストはラベルの種類が増えないよう一つにまとめる
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ラベルには実際のパスではなくルートのテンプレート（例: /api/v1/activities/{activity_id}）を使う
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths: Dict[object, str] = {}
+
+    def _route_path(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            for route in routes:
+                if isinstance(route, BaseRoute) and getattr(route, "endpoint", None) is endpoint:
+                    path = getattr(route, "path", UNMATCHED_ROUTE)
+                    break
+            path = path or UNMATCHED_ROUTE
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self._route_path(scope)
+            method = scope["method"]
+            http_request_duration_seconds.labels(method, route).observe(time.perf_counter() - started)
+            http_requests_total.labels(method, route, str(status_code)).inc()
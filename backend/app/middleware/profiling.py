@@ -0,0 +1,107 @@
+"""
+リクエスト単位のサンプリングプロファイル
+PROFILING_ENABLEDが無効な場合はミドルウェア自体を登録しないため、オーバーヘッドはない
+- 管理者が X-Profile: file（または inline）ヘッダーを付けたリクエスト
+- PROFILE_SAMPLE_RATE の割合で無作為に選ばれたリクエスト
+を対象とし、collapsed stackをPROFILE_OUTPUT_DIRに書き出す（inlineの場合はレスポンスとして返す）
+"""
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+from ..services import profiler
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_MODES = ("file", "inline")
+
+
+def _is_admin_token(token: str) -> bool:
+    """トークンの持ち主が管理者か（ヘッダー指定時のみ呼ばれる）"""
+    from fastapi import HTTPException
+    from ..api.deps import get_current_user
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        user = get_current_user(db, token)
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+    return user.email in settings.ADMIN_EMAILS
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        os.makedirs(settings.PROFILE_OUTPUT_DIR, exist_ok=True)
+
+    async def _requested_mode(self, scope: Scope) -> Optional[str]:
+        headers = Headers(scope=scope)
+        mode = headers.get(PROFILE_HEADER)
+        if mode:
+            authorization = headers.get("authorization", "")
+            if mode in PROFILE_MODES and authorization.lower().startswith("bearer "):
+                if await run_in_threadpool(_is_admin_token, authorization[7:]):
+                    return mode
+            return None
+        if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "file"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = await self._requested_mode(scope)
+        if mode is None or not profiler.try_acquire():
+            await self.app(scope, receive, send)
+            return
+
+        sampler = profiler.SamplingProfiler(interval=settings.PROFILE_INTERVAL_MS / 1000)
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(settings.PROFILE_OUTPUT_DIR, f"{profile_id}.collapsed")
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            if mode != "inline":
+                await send(message)
+
+        # このリクエストから呼び出したスレッドプールの処理のみを採取対象にする
+        token = profiler.current_profiler.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            profiler.current_profiler.reset(token)
+            profiler.release()
+
+        collapsed = sampler.collapsed()
+        await run_in_threadpool(self._write, path, collapsed)
+        logger.info(
+            f"Profiled {scope['method']} {scope['path']}: {sampler.sample_count} samples "
+            f"in {sampler.duration * 1000:.1f}ms -> {path}"
+        )
+        if mode == "inline":
+            # 元のレスポンスは破棄し、collapsed stackを返す
+            response = PlainTextResponse(collapsed, headers={"X-Profile-Id": profile_id})
+            await response(scope, receive, send)
+
+    @staticmethod
+    def _write(path: str, collapsed: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(collapsed)
@@ -0,0 +1,65 @@
+"""
+リクエストごとのSQL計測ミドルウェア
+発行数・実行時間をServer-Timingヘッダーで返し、閾値を超えたリクエストやN+1の疑いをログに出す
+"""
+import logging
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+from ..services.sql_stats import begin_stats, check_budget, end_stats, install_sql_stats
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStatsMiddleware:
+    """
+    ASGIミドルウェア（BaseHTTPMiddlewareと違いレスポンスをバッファしない）
+    SQL_STATS_STRICTが有効な場合、N+1や発行数の上限超過はレスポンス送信後に例外とする（CI用）
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        install_sql_stats()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stats, token = begin_stats()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and settings.SERVER_TIMING_HEADER:
+                headers = MutableHeaders(scope=message)
+                app_ms = (time.perf_counter() - started) * 1000
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries", app;dur={app_ms:.1f}',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_stats(token)
+
+        self._report(scope, stats, (time.perf_counter() - started) * 1000)
+
+    def _report(self, scope: Scope, stats, elapsed_ms: float) -> None:
+        path = f'{scope["method"]} {scope["path"]}'
+        if (
+            stats.count > settings.SQL_STATS_WARN_QUERY_COUNT
+            or stats.total_ms > settings.SQL_STATS_WARN_DB_MS
+        ):
+            logger.warning(
+                f"Heavy DB usage: {path} {stats.count} queries, db {stats.total_ms:.1f}ms, total {elapsed_ms:.1f}ms"
+            )
+        repeated = stats.repeated_shapes()
+        for shape, n in repeated:
+            logger.warning(f"Probable N+1 in {path}: {n}x {shape[:200]}")
+        if settings.SQL_STATS_STRICT:
+            check_budget(stats, settings.SQL_STATS_WARN_QUERY_COUNT)
@@ -1,4 +1,5 @@
 from ..database import Base
 from .user import User, UserProfile
-from .activity import Activity
-from .feedback import Feedback
+from .activity import Activity, CatalogRevision
+from .feedback import Feedback, FeedbackDailyRollup
+from .job import ScheduledJob, JobRun
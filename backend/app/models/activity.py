@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, event, func, insert, update
 from ..database import Base
 
 class Activity(Base):
@@ -18,3 +18,41 @@ class Activity(Base):
     scientific_basis = Column(String)  # 科学的根拠（論文参照など）
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    @property
+    def fatigue_range(self) -> dict:
+        """レスポンススキーマ用の疲労度範囲"""
+        return {"min": self.fatigue_min, "max": self.fatigue_max}
+
+class CatalogRevision(Base):
+    """
+    活動カタログの改訂番号（1行のみ）
+    活動の追加・更新・削除と同じトランザクションで1ずつ増やす
+    （更新時刻は秒単位のDBもあり、同じ秒の変更を区別できないため）
+    """
+    __tablename__ = "catalog_revision"
+
+    id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False, default=0)
+
+
+def bump_catalog_revision(connection) -> None:
+    """改訂番号を1増やす（行が無ければ作成）"""
+    table = CatalogRevision.__table__
+    result = connection.execute(
+        update(table).where(table.c.id == 1).values(revision=table.c.revision + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(id=1, revision=1))
+
+
+@event.listens_for(CatalogRevision.__table__, "after_create")
+def _create_revision_row(target, connection, **kw) -> None:
+    connection.execute(insert(target).values(id=1, revision=0))
+
+
+@event.listens_for(Activity, "after_insert")
+@event.listens_for(Activity, "after_update")
+@event.listens_for(Activity, "after_delete")
+def _bump_on_change(mapper, connection, target: Activity) -> None:
+    bump_catalog_revision(connection)
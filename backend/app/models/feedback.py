@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, func, ForeignKey, UniqueConstraint
 from ..database import Base
 
 class Feedback(Base):
     __tablename__ = "feedbacks"
+    __table_args__ = (
+        UniqueConstraint("user_id", "client_key", name="uq_feedbacks_user_client_key"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -13,4 +16,23 @@ class Feedback(Base):
     duration = Column(Integer, nullable=False)  # 選択した時間（分）
     completion_status = Column(String, nullable=False)  # 'completed', 'partial', 'abandoned'
     comments = Column(String)
+    client_key = Column(String)  # クライアント側の冪等キー（再送時の重複防止）
     created_at = Column(DateTime, default=func.now())
+
+
+class FeedbackDailyRollup(Base):
+    """ユーザー×カテゴリ×日ごとのフィードバック集計（トレンド分析用）"""
+    __tablename__ = "feedback_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "category", "day", name="uq_feedback_rollups_user_category_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    category = Column(String, nullable=False)
+    day = Column(Date, nullable=False)  # UTC日付
+    feedback_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    fatigue_sum = Column(Integer, nullable=False, default=0)  # 平均疲労度 = fatigue_sum / feedback_count
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index
+from ..database import Base
+
+class ScheduledJob(Base):
+    """定期ジョブの次回実行時刻とロック（全ワーカーで共有）"""
+    __tablename__ = "scheduled_jobs"
+
+    name = Column(String, primary_key=True)
+    next_run_at = Column(DateTime)  # UTC。Noneは定期実行なし（手動実行のみ）
+    locked_by = Column(String)  # 実行中のワーカー（ホスト名:PID）
+    locked_until = Column(DateTime)  # UTC。これを過ぎたロックは無効（ワーカーの異常終了時）
+    cursor = Column(String)  # 件数を区切って処理するジョブの再開位置（ジョブごとの形式）
+
+
+class JobRun(Base):
+    """ジョブの実行履歴"""
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        Index("ix_job_runs_job_started", "job_name", "started_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, nullable=False)
+    trigger = Column(String, nullable=False)  # 'schedule', 'manual'
+    status = Column(String, nullable=False)  # 'running', 'succeeded', 'failed', 'cancelled'
+    worker = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False)  # UTC
+    finished_at = Column(DateTime)
+    duration_ms = Column(Float)
+    result = Column(String)  # ジョブが返した概要
+    error = Column(String)
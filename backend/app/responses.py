@@ -0,0 +1,35 @@
+"""
+高速なJSONレスポンス
+orjsonが利用可能な場合はそちらでエンコードする（未導入の場合は標準のjsonにフォールバック）
+"""
+import json
+from typing import Any
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjsonは任意の依存関係
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSONのバイト列にエンコード"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """アプリ全体の既定のレスポンスクラス"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_bytes_response(body: bytes, **kwargs) -> Response:
+    """シリアライズ済みのJSONをそのまま返す（response_modelによる再検証・再エンコードを省略）"""
+    return Response(content=body, media_type="application/json", **kwargs)
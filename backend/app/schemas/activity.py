@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional
 from datetime import datetime
 from enum import Enum
@@ -60,6 +60,10 @@ class Activity(ActivityBase):
         from_attributes = True
 
 
+# 一覧レスポンスをまとめて検証・シリアライズする
+ActivityList = TypeAdapter(List[Activity])
+
+
 class ActivityFilter(BaseModel):
     fatigue_level: int = Field(..., ge=1, le=10)
     location: Location
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Dict, List, Optional
+from datetime import date, datetime
 from enum import Enum
 
 from .activity import Location
@@ -12,6 +12,12 @@ class CompletionStatus(str, Enum):
     abandoned = "abandoned"
 
 
+class TrendGranularity(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
 class FeedbackBase(BaseModel):
     activity_id: int
     rating: int = Field(..., ge=1, le=10)
@@ -20,6 +26,7 @@ class FeedbackBase(BaseModel):
     duration: int = Field(..., ge=15, le=60)
     completion_status: CompletionStatus
     comments: Optional[str] = None
+    client_key: Optional[str] = Field(None, max_length=64, description="クライアント側の冪等キー")
 
 
 class FeedbackCreate(FeedbackBase):
@@ -35,6 +42,20 @@ class Feedback(FeedbackBase):
         from_attributes = True
 
 
+# 一覧レスポンスをまとめて検証・シリアライズする
+FeedbackList = TypeAdapter(List[Feedback])
+
+
+class FeedbackBatchCreate(BaseModel):
+    items: List[FeedbackCreate] = Field(..., min_items=1, max_items=200)
+
+
+class FeedbackBatchResult(BaseModel):
+    created: int  # 新規に挿入された件数
+    duplicates: int  # 冪等キーにより既存行を返した件数
+    feedbacks: List[Feedback]
+
+
 class FeedbackSummary(BaseModel):
     average_rating: float
     total_feedbacks: int
@@ -46,3 +67,18 @@ class FeedbackSummary(BaseModel):
 class FeedbackWithActivity(Feedback):
     activity_title: str
     activity_category: str
+
+
+class FeedbackTrendPoint(BaseModel):
+    period_start: date
+    total_feedbacks: int
+    average_rating: float
+    completion_rate: float  # 完全完了率
+    average_fatigue: float
+    categories: Dict[str, int]  # カテゴリごとのフィードバック数
+
+
+class FeedbackTrends(BaseModel):
+    granularity: TrendGranularity
+    range_start: date
+    points: List[FeedbackTrendPoint]
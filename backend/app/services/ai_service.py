@@ -1,12 +1,21 @@
 from google.cloud import aiplatform
 from vertexai.preview.generative_models import GenerativeModel
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Tuple, Any
 import json
 import logging
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from ..config import settings
+from ..schemas.activity import ActivityCategory
+from .metrics import instrument_ai_call, instrument_ai_stream, set_ai_outcome
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "gemini-1.5-flash"
+# プロファイル生成に失敗した場合に返す文（定期ジョブで作成し直す対象の判定にも使う）
+PROFILE_ERROR_MESSAGE = "プロファイル生成中にエラーが発生しました。しばらく経ってからお試しください。"
+# パーソナライズに失敗した場合に返すカテゴリ（呼び出し側はキャッシュしない）
+PERSONALIZATION_FALLBACK = ["relaxation", "light_exercise"]
+
 def init_vertex_ai():
     """Vertex AIの初期化"""
     try:
@@ -16,6 +25,21 @@ def init_vertex_ai():
         logger.error(f"Error initializing Vertex AI: {str(e)}")
         raise
 
+_model = None
+
+def get_model() -> GenerativeModel:
+    """モデルのハンドルを取得（初回のみ作成し、以降のリクエストで共有する）"""
+    global _model
+    if _model is None:
+        _model = GenerativeModel(MODEL_NAME)
+    return _model
+
+def canary() -> str:
+    """1トークンだけ生成させ、認証・接続を確立する（起動時のウォームアップ用。同期呼び出し）"""
+    response = get_model().generate_content("OK", generation_config={"max_output_tokens": 1})
+    return response.text
+
+@instrument_ai_call
 async def generate_textual_profile(preferences: Dict) -> str:
     """
     ユーザーの好みに基づいて文章形式のプロファイルを生成
@@ -27,7 +51,7 @@ async def generate_textual_profile(preferences: Dict) -> str:
         rest_preferences = ", ".join(preferences.get("rest_preferences", []))
         
         # Gemini 2.0 Flash モデルのセットアップ
-        model = GenerativeModel("gemini-1.5-flash")
+        model = get_model()
         
         # プロンプト作成
         prompt = f"""あなたはユーザープロファイルを分析し、その人に合った活動提案をするAIです。
@@ -45,8 +69,10 @@ async def generate_textual_profile(preferences: Dict) -> str:
         return response.text
     except Exception as e:
         logger.error(f"Error generating profile: {str(e)}")
-        return "プロファイル生成中にエラーが発生しました。しばらく経ってからお試しください。"
+        set_ai_outcome("error")
+        return PROFILE_ERROR_MESSAGE
 
+@instrument_ai_call
 async def get_recommended_categories(
     textual_profile: str,
     fatigue_level: int,
@@ -57,7 +83,7 @@ async def get_recommended_categories(
     """
     try:
         # Gemini 2.0 Flash モデルのセットアップ
-        model = GenerativeModel("gemini-1.5-flash")
+        model = get_model()
         
         # プロンプト作成
         prompt = f"""あなたは活動提案カテゴリを生成するAIです。
@@ -87,22 +113,28 @@ async def get_recommended_categories(
         return [cat for cat in categories if cat in valid_categories]
     except Exception as e:
         logger.error(f"Error generating categories: {str(e)}")
+        set_ai_outcome("error")
         # エラー時はデフォルトカテゴリを返す
         return ['relaxation', 'light_exercise', 'desk_work']
 
+def _format_feedbacks(previous_feedbacks: List[Dict]) -> str:
+    """過去のフィードバック（最新5件まで）をプロンプト用の文字列にする"""
+    feedbacks_str = ""
+    for i, fb in enumerate(previous_feedbacks[:5]):
+        feedbacks_str += f"活動{i+1}: {fb['activity_title']} - 評価: {fb['rating']}/10, 疲労度: {fb['fatigue_level']}/10\n"
+    return feedbacks_str
+
+@instrument_ai_call
 async def personalize_activities(user_profile: str, fatigue_level: int, previous_feedbacks: List[Dict]) -> List[str]:
     """
     ユーザーの過去のフィードバックを考慮して活動をパーソナライズ
     """
     try:
         # Gemini 2.0 Flash モデルのセットアップ
-        model = GenerativeModel("gemini-1.5-flash")
+        model = get_model()
         
         # 過去のフィードバックを文字列化
-        feedbacks_str = ""
-        if previous_feedbacks:
-            for i, fb in enumerate(previous_feedbacks[:5]):  # 最新5件まで
-                feedbacks_str += f"活動{i+1}: {fb['activity_title']} - 評価: {fb['rating']}/10, 疲労度: {fb['fatigue_level']}/10\n"
+        feedbacks_str = _format_feedbacks(previous_feedbacks)
         
         # プロンプト作成
         prompt = f"""あなたは個別化された活動提案を行うAIアシスタントです。
@@ -138,11 +170,74 @@ async def personalize_activities(user_profile: str, fatigue_level: int, previous
                 json_str = json_str.split("```")[1].split("```")[0].strip()
             
             result = json.loads(json_str)
-            return result.get("recommended_activity_types", ["relaxation", "light_exercise"])
+            return result.get("recommended_activity_types", list(PERSONALIZATION_FALLBACK))
         except Exception as json_err:
             logger.error(f"Error parsing JSON from model response: {str(json_err)}")
-            return ["relaxation", "light_exercise"]
+            set_ai_outcome("invalid_response")
+            return list(PERSONALIZATION_FALLBACK)
             
     except Exception as e:
         logger.error(f"Error personalizing activities: {str(e)}")
-        return ["relaxation", "light_exercise"]
+        set_ai_outcome("error")
+        return list(PERSONALIZATION_FALLBACK)
+
+def _parse_categories(line: str) -> List[str]:
+    """「relaxation, desk_work」のような行から有効なカテゴリのみを取り出す"""
+    valid_categories = [category.value for category in ActivityCategory]
+    candidates = line.split(":", 1)[-1].replace("、", ",").split(",")
+    categories = [cat.strip().strip("`*[]\"' ") for cat in candidates]
+    return [cat for cat in categories if cat in valid_categories]
+
+@instrument_ai_stream
+async def stream_personalization(
+    user_profile: str, fatigue_level: int, previous_feedbacks: List[Dict]
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    パーソナライズをストリーミングで生成
+    1行目（推奨カテゴリ）がそろった時点で ("categories", [...]) を返し、
+    以降は推奨理由の差分を ("reasoning", テキスト) として届いた順に返す
+    エラーは呼び出し側に送出する（既に送った内容を取り消せないため、フォールバックは呼び出し側で行う）
+    """
+    feedbacks_str = _format_feedbacks(previous_feedbacks)
+    prompt = f"""あなたは個別化された活動提案を行うAIアシスタントです。
+    
+    以下のユーザープロファイルと過去のフィードバック、現在の疲労度に基づいて、
+    このユーザーに最適な活動カテゴリを分析してください。回答は次の形式のプレーンテキストで返してください:
+    
+    1行目: 推奨するカテゴリ名を優先度の高い順に3つ、カンマ区切りで（カテゴリ名のみ）
+    2行目以降: 推奨理由の簡潔な説明（100字程度）
+    
+    選択可能なカテゴリ:
+    - relaxation（リラックス系）
+    - light_exercise（軽い運動系）
+    - desk_work（デスクワーク特化型活動）
+    - short_focus（短時間集中型の生産活動）
+    - location_specific（場所固有の活動）
+    
+    ユーザープロファイル: {user_profile}
+    
+    過去のフィードバック:
+    {feedbacks_str if feedbacks_str else "まだフィードバックはありません"}
+    
+    現在の疲労度: {fatigue_level}/10
+    """
+    
+    # リクエストの送信とチャンクの受信はブロックするため、スレッドプールで行う
+    responses = await run_in_threadpool(get_model().generate_content, prompt, stream=True)
+    buffer = ""
+    categories = None
+    async for response in iterate_in_threadpool(iter(responses)):
+        text = response.text
+        if categories is None:
+            buffer += text
+            if "\n" not in buffer.lstrip():
+                continue
+            first_line, text = buffer.lstrip().split("\n", 1)
+            categories = _parse_categories(first_line)
+            yield "categories", categories
+            text = text.lstrip("\n")
+        if text:
+            yield "reasoning", text
+    if categories is None:
+        # 改行が無いまま終わった場合は全体をカテゴリの行とみなす
+        yield "categories", _parse_categories(buffer)
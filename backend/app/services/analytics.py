@@ -0,0 +1,238 @@
+"""
+フィードバック全体を対象とした集計分析（管理者向け）
+feedbacksテーブルの列をNumPy配列として一括読み込みし、クロス集計やヒストグラムをベクトル演算で計算する
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+from ..models.activity import Activity
+from ..models.feedback import Feedback
+from ..schemas.activity import ActivityCategory, Location
+from ..schemas.feedback import CompletionStatus
+
+logger = logging.getLogger(__name__)
+
+# カテゴリ値は小さな整数コードに変換して保持する（末尾は未知の値用）
+LABELS: Dict[str, List[str]] = {
+    "location": [loc.value for loc in Location] + ["unknown"],
+    "category": [cat.value for cat in ActivityCategory] + ["unknown"],
+    "completion_status": [status.value for status in CompletionStatus] + ["unknown"],
+    "fatigue_level": [str(level) for level in range(1, 11)],
+    "rating": [str(rating) for rating in range(1, 11)],
+}
+CROSSTAB_DIMENSIONS = tuple(LABELS)
+HISTOGRAM_FIELDS = ("rating", "fatigue_level", "duration")
+COMPLETED_CODE = LABELS["completion_status"].index(CompletionStatus.completed.value)
+
+_CODES = {
+    name: {label: code for code, label in enumerate(labels)}
+    for name, labels in LABELS.items()
+}
+
+
+@dataclass
+class FeedbackColumns:
+    """フィードバックの列指向スナップショット"""
+    user_id: np.ndarray  # int32
+    activity_id: np.ndarray  # int32
+    rating: np.ndarray  # int8 (1-10)
+    fatigue_level: np.ndarray  # int8 (1-10)
+    duration: np.ndarray  # int16
+    location: np.ndarray  # uint8 コード
+    category: np.ndarray  # uint8 コード
+    completion_status: np.ndarray  # uint8 コード
+    max_feedback_id: int
+    built_at: float
+
+    FIELDS = (
+        "user_id", "activity_id", "rating", "fatigue_level", "duration",
+        "location", "category", "completion_status",
+    )
+
+    def __len__(self) -> int:
+        return int(self.rating.shape[0])
+
+    def code_array(self, dimension: str) -> np.ndarray:
+        """クロス集計用に0始まりのコード配列を取得"""
+        if dimension in ("fatigue_level", "rating"):
+            return getattr(self, dimension).astype(np.intp) - 1
+        return getattr(self, dimension).astype(np.intp)
+
+
+def _encode(values: Sequence[Optional[str]], dimension: str) -> np.ndarray:
+    codes = _CODES[dimension]
+    unknown = len(LABELS[dimension]) - 1
+    return np.fromiter((codes.get(value, unknown) for value in values), dtype=np.uint8, count=len(values))
+
+
+def load_feedback_columns(engine: Engine, chunk_size: int = 50000) -> FeedbackColumns:
+    """
+    サーバーサイドカーソルでフィードバックをチャンクごとに読み込み、列配列に変換
+    """
+    stmt = select(
+        Feedback.id,
+        Feedback.user_id,
+        Feedback.activity_id,
+        Feedback.rating,
+        Feedback.fatigue_level,
+        Feedback.duration,
+        Feedback.location,
+        Activity.category,
+        Feedback.completion_status,
+    ).join(Activity, Feedback.activity_id == Activity.id)
+
+    chunks: Dict[str, List[np.ndarray]] = {name: [] for name in FeedbackColumns.FIELDS}
+    max_id = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        for partition in result.partitions():
+            ids, user_ids, activity_ids, ratings, fatigues, durations, locations, categories, statuses = zip(*partition)
+            max_id = max(max_id, max(ids))
+            chunks["user_id"].append(np.asarray(user_ids, dtype=np.int32))
+            chunks["activity_id"].append(np.asarray(activity_ids, dtype=np.int32))
+            chunks["rating"].append(np.asarray(ratings, dtype=np.int8))
+            chunks["fatigue_level"].append(np.asarray(fatigues, dtype=np.int8))
+            chunks["duration"].append(np.asarray(durations, dtype=np.int16))
+            chunks["location"].append(_encode(locations, "location"))
+            chunks["category"].append(_encode(categories, "category"))
+            chunks["completion_status"].append(_encode(statuses, "completion_status"))
+
+    dtypes = {
+        "user_id": np.int32, "activity_id": np.int32, "rating": np.int8, "fatigue_level": np.int8,
+        "duration": np.int16, "location": np.uint8, "category": np.uint8, "completion_status": np.uint8,
+    }
+    arrays = {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+        for name, parts in chunks.items()
+    }
+    return FeedbackColumns(**arrays, max_feedback_id=max_id, built_at=time.time())
+
+
+def save_snapshot(columns: FeedbackColumns, path: str) -> None:
+    """
+    列スナップショットをファイルに書き出す（一時ファイルからの置き換えでアトミックに更新）
+    定期ジョブと他のワーカーでの再作成が同時に書き込むため、一時ファイルはプロセス・スレッドごとに分ける
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            max_feedback_id=np.int64(columns.max_feedback_id),
+            built_at=np.float64(columns.built_at),
+            **{name: getattr(columns, name) for name in FeedbackColumns.FIELDS},
+        )
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str) -> Optional[FeedbackColumns]:
+    """列スナップショットを読み込む（存在しなければNone）"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return FeedbackColumns(
+            **{name: data[name] for name in FeedbackColumns.FIELDS},
+            max_feedback_id=int(data["max_feedback_id"]),
+            built_at=float(data["built_at"]),
+        )
+
+
+_lock = threading.Lock()
+_cached: Optional[FeedbackColumns] = None
+
+
+def get_feedback_columns(
+    engine: Engine,
+    snapshot_path: Optional[str] = None,
+    max_age_seconds: Optional[int] = None,
+    refresh: bool = False,
+) -> FeedbackColumns:
+    """
+    分析用の列データを取得
+    プロセス内キャッシュ → スナップショットファイル → DB読み込み の順に、期限内のものを使う
+    """
+    global _cached
+    snapshot_path = snapshot_path or settings.ANALYTICS_SNAPSHOT_PATH
+    max_age = settings.ANALYTICS_SNAPSHOT_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+
+    with _lock:
+        now = time.time()
+        if not refresh:
+            if _cached is not None and now - _cached.built_at < max_age:
+                return _cached
+            try:
+                snapshot = load_snapshot(snapshot_path)
+            except Exception as e:
+                logger.warning(f"分析スナップショットの読み込みに失敗しました: {str(e)}")
+                snapshot = None
+            if snapshot is not None and now - snapshot.built_at < max_age:
+                _cached = snapshot
+                return _cached
+
+        columns = load_feedback_columns(engine, settings.ANALYTICS_CHUNK_SIZE)
+        try:
+            save_snapshot(columns, snapshot_path)
+        except OSError as e:
+            logger.warning(f"分析スナップショットの書き込みに失敗しました: {str(e)}")
+        _cached = columns
+        logger.info(f"Loaded {len(columns)} feedback rows for analytics")
+        return columns
+
+
+def crosstab(
+    columns: FeedbackColumns, dimensions: Sequence[str], min_count: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    指定した次元の組み合わせごとに件数・完了率・平均評価を計算
+    """
+    for dimension in dimensions:
+        if dimension not in LABELS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+
+    shape = tuple(len(LABELS[dimension]) for dimension in dimensions)
+    size = int(np.prod(shape))
+    if len(columns) == 0:
+        return []
+
+    flat = np.ravel_multi_index(tuple(columns.code_array(d) for d in dimensions), shape)
+    counts = np.bincount(flat, minlength=size)
+    completed = np.bincount(flat, weights=columns.completion_status == COMPLETED_CODE, minlength=size)
+    rating_sums = np.bincount(flat, weights=columns.rating, minlength=size)
+
+    cells = []
+    for index in np.flatnonzero(counts >= max(min_count, 1)):
+        count = int(counts[index])
+        cell: Dict[str, Any] = {
+            dimension: LABELS[dimension][code]
+            for dimension, code in zip(dimensions, np.unravel_index(index, shape))
+        }
+        cell.update({
+            "count": count,
+            "completion_rate": round(float(completed[index]) / count * 100, 1),
+            "average_rating": round(float(rating_sums[index]) / count, 2),
+        })
+        cells.append(cell)
+
+    return cells
+
+
+def histogram(columns: FeedbackColumns, field: str) -> Dict[str, int]:
+    """
+    評価・疲労度・時間の分布を計算
+    """
+    if field not in HISTOGRAM_FIELDS:
+        raise ValueError(f"Unknown histogram field: {field}")
+    values = getattr(columns, field).astype(np.intp)
+    if values.size == 0:
+        return {}
+    counts = np.bincount(values - values.min())
+    offset = int(values.min())
+    return {str(offset + value): int(count) for value, count in enumerate(counts) if count}
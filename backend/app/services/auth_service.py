@@ -2,43 +2,145 @@
 Supabase認証サービス
 JWTベースの認証を置き換える形でSupabaseの認証機能を利用します
 """
+import asyncio
+import hashlib
 import logging
+import time
 from typing import Optional, Dict, Any
-from fastapi import Depends, HTTPException, status
-from supabase import Client
-from ..database_supabase import get_supabase
+from fastapi import HTTPException, status
+from jose import jwt, JWTError
+from ..config import settings
+from .supabase_http import SupabaseRequestError, get_supabase_client
+from .ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-async def signup_user(email: str, password: str, name: str, supabase: Client = Depends(get_supabase)) -> Dict[str, Any]:
+# ローカル検証で受け付ける署名アルゴリズム
+LOCAL_ALGORITHMS = ("HS256", "RS256", "ES256")
+
+# リモート検証結果のキャッシュ（キーはトークンのハッシュ、失敗時はNoneを保持）
+_token_cache = TTLCache(maxsize=10000, ttl=settings.SUPABASE_TOKEN_CACHE_SECONDS, name="supabase_token")
+_MISSING = object()
+
+_jwks: Optional[Dict[str, Any]] = None
+_jwks_fetched_at = 0.0
+_jwks_lock = asyncio.Lock()
+
+
+class InvalidTokenError(Exception):
+    """ローカル検証でトークンが無効と確定したことを示す例外"""
+
+
+async def _get_jwks(force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Supabaseの公開鍵（JWKS）をキャッシュ付きで取得
+    forceの場合もSUPABASE_JWKS_MIN_REFRESH_SECONDS以内の再取得は行わない
+    （未知のkidを持つトークンを送り続けることで外部への取得を繰り返させないため）
+    同時に取得が必要になった場合も、実際の取得は1回のみ行う
+    """
+    global _jwks, _jwks_fetched_at
+    if not settings.SUPABASE_URL:
+        return None
+
+    def fresh() -> bool:
+        age = time.monotonic() - _jwks_fetched_at
+        if _jwks_fetched_at and age < settings.SUPABASE_JWKS_MIN_REFRESH_SECONDS:
+            return True
+        return not force and _jwks is not None and age < settings.SUPABASE_JWKS_CACHE_SECONDS
+
+    if fresh():
+        return _jwks
+    async with _jwks_lock:
+        # 待っている間に他のリクエストが取得していればその結果を使う
+        if fresh():
+            return _jwks
+        try:
+            _jwks = await get_supabase_client().get_json("/auth/v1/.well-known/jwks.json")
+        except Exception as e:
+            logger.warning(f"JWKS fetch error: {str(e)}")
+        # 取得に失敗した場合も一定時間は再取得しない
+        _jwks_fetched_at = time.monotonic()
+    return _jwks
+
+
+async def verify_token_locally(token: str) -> Optional[Dict[str, Any]]:
+    """
+    署名・有効期限・audienceをローカルで検証し、クレームを返す
+    検証用の鍵が無い場合はNone（リモート検証に委ねる）、無効と確定した場合はInvalidTokenError
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        raise InvalidTokenError()
+
+    algorithm = header.get("alg")
+    if algorithm not in LOCAL_ALGORITHMS:
+        return None
+
+    if algorithm == "HS256":
+        if not settings.SUPABASE_JWT_SECRET:
+            return None
+        key: Any = settings.SUPABASE_JWT_SECRET
+    else:
+        jwks = await _get_jwks()
+        keys = (jwks or {}).get("keys", [])
+        key = next((k for k in keys if k.get("kid") == header.get("kid")), None)
+        if key is None:
+            # 鍵のローテーション直後の可能性があるため一度だけ再取得する
+            jwks = await _get_jwks(force=True)
+            key = next((k for k in (jwks or {}).get("keys", []) if k.get("kid") == header.get("kid")), None)
+        if key is None:
+            return None
+
+    try:
+        return jwt.decode(
+            token, key, algorithms=[algorithm], audience=settings.SUPABASE_JWT_AUDIENCE,
+            options={"require_exp": True},
+        )
+    except JWTError:
+        raise InvalidTokenError()
+
+
+def _remote_cache_ttl(token: str) -> float:
+    """成功結果のキャッシュ時間（トークンの有効期限を超えない）"""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        exp = None
+    ttl = float(settings.SUPABASE_TOKEN_CACHE_SECONDS)
+    if exp:
+        ttl = min(ttl, exp - time.time())
+    return max(ttl, 0.0)
+
+async def signup_user(email: str, password: str, name: str, client=None) -> Dict[str, Any]:
     """
     Supabaseを使用してユーザーを登録
     """
+    client = client or get_supabase_client()
     try:
         # Supabaseでユーザー登録
-        response = supabase.auth.sign_up({
-            "email": email,
-            "password": password,
-        })
+        response = await client.sign_up(email, password)
+        user = response.get("user") or {}
+        session = response.get("session") or {}
         
         # ユーザー登録に成功した場合、追加情報をプロフィールテーブルに保存
-        if response.user and response.user.id:
-            user_id = response.user.id
+        if user.get("id"):
+            user_id = user["id"]
             
             # プロフィールテーブルにデータを挿入
-            supabase.table("profiles").insert({
+            await client.insert("profiles", {
                 "id": user_id,
                 "name": name,
                 "created_at": "now()",
                 "updated_at": "now()"
-            }).execute()
+            })
             
             return {
                 "user_id": user_id,
                 "email": email,
                 "name": name,
-                "access_token": response.session.access_token if response.session else None,
-                "refresh_token": response.session.refresh_token if response.session else None
+                "access_token": session.get("access_token"),
+                "refresh_token": session.get("refresh_token")
             }
         else:
             raise HTTPException(
@@ -46,6 +148,8 @@ async def signup_user(email: str, password: str, name: str, supabase: Client = D
                 detail="ユーザー登録に失敗しました"
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"User signup error: {str(e)}")
         raise HTTPException(
@@ -53,22 +157,22 @@ async def signup_user(email: str, password: str, name: str, supabase: Client = D
             detail=f"ユーザー登録エラー: {str(e)}"
         )
 
-async def login_user(email: str, password: str, supabase: Client = Depends(get_supabase)) -> Dict[str, Any]:
+async def login_user(email: str, password: str, client=None) -> Dict[str, Any]:
     """
     Supabaseを使用してユーザーログイン
     """
+    client = client or get_supabase_client()
     try:
-        response = supabase.auth.sign_in_with_password({
-            "email": email,
-            "password": password
-        })
+        response = await client.sign_in_with_password(email, password)
+        user = response.get("user")
+        session = response.get("session")
         
-        if response.user and response.session:
+        if user and session:
             return {
-                "user_id": response.user.id,
-                "email": response.user.email,
-                "access_token": response.session.access_token,
-                "refresh_token": response.session.refresh_token
+                "user_id": user["id"],
+                "email": user.get("email"),
+                "access_token": session["access_token"],
+                "refresh_token": session.get("refresh_token")
             }
         else:
             raise HTTPException(
@@ -76,6 +180,8 @@ async def login_user(email: str, password: str, supabase: Client = Depends(get_s
                 detail="メールアドレスまたはパスワードが正しくありません"
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"User login error: {str(e)}")
         raise HTTPException(
@@ -83,32 +189,65 @@ async def login_user(email: str, password: str, supabase: Client = Depends(get_s
             detail="ログインに失敗しました"
         )
 
-async def validate_token(token: str, supabase: Client = Depends(get_supabase)) -> Optional[Dict[str, Any]]:
+async def validate_token(token: str, client=None) -> Optional[Dict[str, Any]]:
     """
     アクセストークンを検証してユーザー情報を取得
+    まずローカルで署名を検証し、検証できない場合のみ認証サーバーに問い合わせる
     """
     try:
-        # アクセストークンを検証
-        response = supabase.auth.get_user(token)
-        
-        if response and response.user:
-            return {
-                "user_id": response.user.id,
-                "email": response.user.email
-            }
-        
+        claims = await verify_token_locally(token)
+    except InvalidTokenError:
+        return None
+    
+    if claims is not None:
+        return {
+            "user_id": claims.get("sub"),
+            "email": claims.get("email")
+        }
+    
+    # リモート検証（結果はキャッシュする）
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    cached = _token_cache.get(cache_key, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    
+    client = client or get_supabase_client()
+    try:
+        user = await client.get_user(token)
+    except SupabaseRequestError as e:
+        # 認証サーバーがトークンを拒否した場合のみ失敗をキャッシュする
+        if e.status_code in (401, 403):
+            _token_cache.set(cache_key, None, ttl=settings.SUPABASE_NEGATIVE_TOKEN_CACHE_SECONDS)
+        logger.error(f"Token validation error: {str(e)}")
         return None
     except Exception as e:
         logger.error(f"Token validation error: {str(e)}")
         return None
+    
+    if user and user.get("id"):
+        user_data = {
+            "user_id": user["id"],
+            "email": user.get("email")
+        }
+        _token_cache.set(cache_key, user_data, ttl=_remote_cache_ttl(token))
+        return user_data
+    
+    _token_cache.set(cache_key, None, ttl=settings.SUPABASE_NEGATIVE_TOKEN_CACHE_SECONDS)
+    return None
+
+def invalidate_token(token: str) -> None:
+    """リモート検証結果のキャッシュを破棄"""
+    _token_cache.delete(hashlib.sha256(token.encode()).hexdigest())
 
-async def logout_user(token: str, supabase: Client = Depends(get_supabase)) -> bool:
+async def logout_user(token: str, client=None) -> bool:
     """
     ユーザーをログアウト
     """
+    client = client or get_supabase_client()
     try:
         # セッションを無効化
-        supabase.auth.sign_out(token)
+        await client.sign_out(token)
+        invalidate_token(token)
         return True
     except Exception as e:
         logger.error(f"User logout error: {str(e)}")
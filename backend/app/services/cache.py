@@ -0,0 +1,224 @@
+"""
+共有キャッシュ
+get / set（TTL・タグ付き）/ delete / delete_tag の共通インターフェースと、2つのバックエンド
+- memory: ワーカープロセスごとのLRU（既定）
+- redis: Redis互換サーバーで全ワーカー・全ホストが共有（ヒット率がワーカー数に依存しない）
+タグ（例: "user:{id}", "catalog"）を付けて登録したエントリは、タグ単位でまとめて破棄できる
+値としてNoneは保存できない（未登録と区別できないため）
+"""
+import logging
+import pickle
+import threading
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+from ..config import settings
+from .resp_client import RespClient, RespError
+from .ttl_cache import TTLCache, register_cache
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TAG = "catalog"
+
+
+def user_tag(user_id: int) -> str:
+    """ユーザーに由来するエントリのタグ"""
+    return f"user:{user_id}"
+
+
+class MemoryCacheBackend:
+    """
+    プロセス内のLRU + TTL
+    タグの索引もプロセス内に持つ（期限切れ・追い出し済みのキーは索引が大きくなった時点で掃除する）
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries = TTLCache(maxsize=max_entries, ttl=3600, name="cache_memory")
+        self._tags: Dict[str, Set[str]] = {}
+        self._tag_refs = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        return self._entries.get(key)
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        self._entries.set(key, value, ttl)
+        if not tags:
+            return
+        with self._lock:
+            for tag in tags:
+                keys = self._tags.setdefault(tag, set())
+                if key not in keys:
+                    keys.add(key)
+                    self._tag_refs += 1
+            if self._tag_refs > 2 * self.max_entries:
+                self._sweep_tags()
+
+    def _sweep_tags(self) -> None:
+        # ロックを保持した状態で呼び出す
+        for tag in list(self._tags):
+            keys = {key for key in self._tags[tag] if key in self._entries}
+            if keys:
+                self._tags[tag] = keys
+            else:
+                del self._tags[tag]
+        self._tag_refs = sum(len(keys) for keys in self._tags.values())
+
+    def delete(self, key: str) -> None:
+        self._entries.delete(key)
+
+    def delete_tag(self, tag: str) -> None:
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+            self._tag_refs -= len(keys)
+        for key in keys:
+            self._entries.delete(key)
+
+    def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisCacheBackend:
+    """
+    Redis互換サーバーを使う共有キャッシュ
+    値はpickleで保存する（自サービス専用のサーバーを前提とする）
+    タグは集合型のキーに登録先のキーを保持し、delete_tagで集合の要素ごと削除する
+    サーバーに接続できない場合はキャッシュ無しとして動作する
+    """
+
+    def __init__(self, url: str, prefix: str = "", timeout: float = 0.25, tag_ttl: float = 86400):
+        self.client = RespClient(url, timeout=timeout)
+        self.prefix = prefix
+        self.tag_ttl_ms = int(tag_ttl * 1000)
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key: str) -> Any:
+        try:
+            data = self.client.execute("GET", self.prefix + key)
+        except (OSError, ConnectionError, RespError) as e:
+            logger.warning(f"Cache backend error on get: {str(e)}")
+            return None
+        if data is None:
+            return None
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            logger.warning(f"Cache entry {key} could not be decoded: {str(e)}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        full_key = self.prefix + key
+        commands = [("SET", full_key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                     "PX", max(1, int(ttl * 1000)))]
+        for tag in tags:
+            # タグの集合はエントリより長く保持し、エントリが残っているうちに消えないようにする
+            commands.append(("SADD", self._tag_key(tag), full_key))
+            commands.append(("PEXPIRE", self._tag_key(tag), self.tag_ttl_ms))
+        try:
+            self.client.pipeline(commands)
+        except (OSError, ConnectionError, RespError) as e:
+            logger.warning(f"Cache backend error on set: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.execute("DEL", self.prefix + key)
+        except (OSError, ConnectionError, RespError) as e:
+            logger.warning(f"Cache backend error on delete: {str(e)}")
+
+    def delete_tag(self, tag: str) -> None:
+        tag_key = self._tag_key(tag)
+        try:
+            keys = self.client.execute("SMEMBERS", tag_key)
+            if keys:
+                # 集合自体は消さず、取得した要素のみ取り除く（並行して登録されたキーを残す）
+                self.client.pipeline([("DEL", *keys), ("SREM", tag_key, *keys)])
+        except (OSError, ConnectionError, RespError) as e:
+            logger.warning(f"Cache backend error on delete_tag: {str(e)}")
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class CacheNamespace:
+    """
+    用途ごとのキャッシュ（キーに名前空間を付け、既定のTTLとヒット率を持つ）
+    タグは名前空間をまたいで共通
+    """
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        register_cache(self)
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.name}:{key}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = get_backend().get(self._key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()) -> None:
+        get_backend().set(self._key(key), value, self.ttl if ttl is None else ttl, tuple(tags))
+
+    def delete(self, key: Hashable) -> None:
+        get_backend().delete(self._key(key))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """設定に応じたバックエンドを取得（初回利用時に作成）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.CACHE_BACKEND == "redis":
+                    logger.info(f"Using shared cache at {settings.CACHE_REDIS_URL}")
+                    _backend = RedisCacheBackend(
+                        settings.CACHE_REDIS_URL,
+                        prefix=settings.CACHE_KEY_PREFIX,
+                        timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+                        tag_ttl=settings.CACHE_TAG_TTL_SECONDS,
+                    )
+                else:
+                    _backend = MemoryCacheBackend(max_entries=settings.CACHE_MEMORY_MAX_ENTRIES)
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """バックエンドを差し替える（テストでスタンドインのサーバーに向ける場合など）"""
+    global _backend
+    _backend = backend
+
+
+def get_cache(name: str, ttl: float) -> CacheNamespace:
+    """用途ごとのキャッシュを作成"""
+    return CacheNamespace(name, ttl)
+
+
+def delete_tag(tag: str) -> None:
+    """タグの付いたエントリをすべての名前空間から破棄"""
+    get_backend().delete_tag(tag)
+
+
+def invalidate_user(user_id: int) -> None:
+    """ユーザーに由来するキャッシュ（集計など）を破棄"""
+    delete_tag(user_tag(user_id))
+
+
+def close_cache() -> None:
+    """バックエンドの接続を解放"""
+    global _backend
+    if _backend is not None:
+        _backend.close()
+        _backend = None
@@ -0,0 +1,115 @@
+"""
+活動カタログのシリアライズ済みレスポンスのキャッシュ
+カタログの版（改訂番号・件数・最終更新時刻）ごとにJSONのバイト列を保持し、
+変更がなければ行の読み込み・検証・エンコードを省略する
+圧縮済みの本文も形式ごとに一度だけ作成して保持する
+版はDBから求めるため、他のワーカーでの更新も次のリクエストで反映される
+（共有キャッシュを使う場合、シリアライズ・圧縮は全ワーカーで一度だけ行われる）
+同じ版の共有メモリスナップショットがあれば、本文はDBを読まずにスナップショットから組み立てる
+"""
+import logging
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from ..config import settings
+from ..crud import activity as crud_activity
+from ..models.activity import Activity
+from ..responses import json_bytes_response
+from ..schemas.activity import ActivityList
+from . import catalog_snapshot
+from .cache import CATALOG_TAG, delete_tag, get_cache
+from .compression import compress, negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+_pages = get_cache("catalog_pages", ttl=settings.CATALOG_CACHE_SECONDS)
+
+
+class CatalogBody:
+    """シリアライズ済みの本文と、形式ごとに一度だけ圧縮した本文"""
+
+    def __init__(self, identity: bytes):
+        self.identity = identity
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> Optional[bytes]:
+        return self._encoded.get(encoding)
+
+    def add_encoding(self, encoding: str) -> bytes:
+        body = compress(self.identity, encoding, best=True)
+        self._encoded[encoding] = body
+        return body
+
+
+def serialize_activities(rows: Sequence) -> bytes:
+    """活動の行（タプル）をレスポンスのJSONにまとめてシリアライズ"""
+    items = ActivityList.validate_python([crud_activity.activity_row_to_dict(row) for row in rows])
+    return ActivityList.dump_json(items)
+
+
+def _page_key(version, skip: int, limit: int) -> str:
+    revision, count, updated_at = version
+    return f"{revision}:{count}:{updated_at.isoformat() if updated_at else ''}:{skip}:{limit}"
+
+
+def is_canonical_page(skip: int, limit: int) -> bool:
+    """
+    キャッシュ対象のページか（既定のページサイズ区切りで、先頭からCATALOG_CACHE_MAX_PAGESページまで）
+    任意のskip/limitの組み合わせごとに本文と圧縮結果を保持しないよう、対象を限定する
+    """
+    page_size = settings.CATALOG_PAGE_SIZE
+    return limit == page_size and skip % page_size == 0 and skip // page_size < settings.CATALOG_CACHE_MAX_PAGES
+
+
+def _build_body(db: Session, version, skip: int, limit: int) -> bytes:
+    snapshot = catalog_snapshot.get_snapshot()
+    if snapshot is not None and snapshot.matches(version):
+        return snapshot.page_body(skip, limit)
+    return serialize_activities(crud_activity.get_activity_rows(db, skip=skip, limit=limit))
+
+
+def get_catalog_response(db: Session, skip: int, limit: int, accept_encoding: Optional[str]) -> Response:
+    """
+    活動一覧のJSONをクライアントが受け付ける形式で返す（カタログの版が変わるまでキャッシュ）
+    圧縮済みのためミドルウェアでは再圧縮しない
+    キャッシュ対象外のページは毎回作成し、圧縮はミドルウェアに任せる
+    """
+    version = crud_activity.get_catalog_version(db)
+    if not is_canonical_page(skip, limit):
+        return json_bytes_response(_build_body(db, version, skip, limit))
+
+    key = _page_key(version, skip, limit)
+    page = _pages.get(key)
+    if page is None:
+        page = CatalogBody(_build_body(db, version, skip, limit))
+        _pages.set(key, page, tags=[CATALOG_TAG])
+
+    encoding = None
+    if settings.COMPRESSION_ENABLED and len(page.identity) >= settings.COMPRESSION_MIN_SIZE:
+        encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return json_bytes_response(page.identity, headers={"Vary": "Accept-Encoding"})
+
+    body = page.encoded(encoding)
+    if body is None:
+        # 同時に作成されても結果は同じため、ロックは取らない
+        body = page.add_encoding(encoding)
+        _pages.set(key, page, tags=[CATALOG_TAG])
+    return json_bytes_response(body, headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+
+
+def clear_catalog_cache() -> None:
+    """キャッシュを破棄"""
+    delete_tag(CATALOG_TAG)
+
+
+# 活動の追加・更新・削除時は版の変化を待たずに破棄する
+@event.listens_for(Activity, "after_insert")
+@event.listens_for(Activity, "after_update")
+@event.listens_for(Activity, "after_delete")
+def _invalidate_on_change(mapper, connection, target: Activity) -> None:
+    clear_catalog_cache()
+    catalog_snapshot.mark_stale()
@@ -0,0 +1,274 @@
+"""
+活動カタログの共有メモリスナップショット
+書き込みプロセス（scripts/catalog_snapshot_writer.py）がカタログを1つのバイナリファイルにまとめ、
+各ワーカーはそれを読み取り専用でmmapする（ページキャッシュを共有するため、ワーカー数に関わらず1部）
+
+ファイル形式（リトルエンディアン）:
+- ヘッダー16バイト: マジック"TBCS", 形式の版(uint16), 予約(uint16), メタデータ長(uint64)
+- メタデータ(JSON): カタログの版, 行数, 各列の型とオフセット, テキスト領域の位置
+- 数値列（8バイト境界に配置）: id, duration, fatigue_min, fatigue_max, locations(場所のビット集合)
+- テキスト領域: 活動ごとのレスポンスJSONを連結したもの（offsets[i]:offsets[i+1]がi行目）
+
+書き込みは一時ファイルからの置き換えで行い、ワーカーはファイルの差し替えを検知して次のリクエストから新しい版を使う
+（置き換え前にmmapした版は参照が無くなるまで有効）
+DBとの差は書き込みプロセスの確認間隔 + CATALOG_SNAPSHOT_CHECK_SECONDS 以内
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..crud import activity as crud_activity
+from ..schemas.activity import Activity as ActivitySchema, ActivityList, Location
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TBCS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+LOCATIONS = [loc.value for loc in Location]
+
+# 数値列の名前と型（行数分の配列として格納する）
+COLUMNS = (
+    ("id", "<i8"),
+    ("duration", "<i4"),
+    ("fatigue_min", "<i2"),
+    ("fatigue_max", "<i2"),
+    ("locations", "<u1"),
+)
+
+
+def version_key(version: Tuple[int, int, Any]) -> List:
+    """カタログの版（改訂番号・件数・最終更新時刻）をメタデータに保存できる形に変換"""
+    revision, count, updated_at = version
+    return [int(revision), int(count), updated_at.isoformat() if updated_at else None]
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def build_snapshot(rows: Sequence, version: Tuple[int, int, Any]) -> bytes:
+    """活動の行（id順）からスナップショットのバイト列を作成"""
+    items = ActivityList.validate_python([crud_activity.activity_row_to_dict(row) for row in rows])
+    records = [item.model_dump_json().encode("utf-8") for item in items]
+    columns = {
+        "id": [item.id for item in items],
+        "duration": [item.duration for item in items],
+        "fatigue_min": [item.fatigue_range.min for item in items],
+        "fatigue_max": [item.fatigue_range.max for item in items],
+        "locations": [
+            sum(1 << LOCATIONS.index(loc.value) for loc in set(item.locations)) for item in items
+        ],
+    }
+    offsets = np.zeros(len(records) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(record) for record in records], dtype=np.uint64)
+
+    sections = [(name, np.asarray(columns[name], dtype=dtype)) for name, dtype in COLUMNS]
+    sections.append(("offsets", offsets))
+    meta: Dict[str, Any] = {
+        "catalog_version": version_key(version),
+        "rows": len(records),
+        "created_at": time.time(),
+        "locations": LOCATIONS,
+        "columns": {},
+    }
+
+    # メタデータの長さがオフセットに依存するため、オフセットを確定させてから長さを合わせる
+    meta_length = 0
+    while True:
+        position = _align(HEADER.size + meta_length)
+        for name, array in sections:
+            meta["columns"][name] = [array.dtype.str, position]
+            position = _align(position + array.nbytes)
+        meta["blob"] = [position, int(offsets[-1])]
+        meta_bytes = json.dumps(meta).encode("utf-8")
+        if len(meta_bytes) <= meta_length:
+            meta_bytes = meta_bytes.ljust(meta_length)
+            break
+        meta_length = len(meta_bytes)
+
+    buffer = bytearray(position + int(offsets[-1]))
+    buffer[:HEADER.size] = HEADER.pack(MAGIC, FORMAT_VERSION, 0, meta_length)
+    buffer[HEADER.size:HEADER.size + meta_length] = meta_bytes
+    for name, array in sections:
+        start = meta["columns"][name][1]
+        buffer[start:start + array.nbytes] = array.tobytes()
+    buffer[position:] = b"".join(records)
+    return bytes(buffer)
+
+
+def write_snapshot(db: Session, path: str) -> Tuple[List, int]:
+    """
+    DBのカタログからスナップショットを作成し、一時ファイルからの置き換えでアトミックに更新
+    戻り値は(カタログの版, 行数)
+    """
+    version = crud_activity.get_catalog_version(db)
+    rows = crud_activity.get_activity_rows(db, skip=0, limit=None)
+    data = build_snapshot(rows, version)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return version_key(version), len(rows)
+
+
+def read_snapshot_version(path: str) -> Optional[List]:
+    """ファイルのカタログの版を読む（存在しない・形式が異なる場合はNone）"""
+    try:
+        with open(path, "rb") as f:
+            magic, format_version, _, meta_length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or format_version != FORMAT_VERSION:
+                return None
+            return json.loads(f.read(meta_length))["catalog_version"]
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+class CatalogSnapshot:
+    """mmapしたスナップショット（列はファイル上の領域を直接参照し、コピーしない）"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+        self.size = len(self._mmap)
+
+        magic, format_version, _, meta_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a catalog snapshot")
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {format_version}")
+        meta = json.loads(bytes(self._mmap[HEADER.size:HEADER.size + meta_length]))
+        if meta["locations"] != LOCATIONS:
+            raise ValueError("Snapshot was built with a different set of locations")
+
+        self.version = meta["catalog_version"]
+        self.rows = meta["rows"]
+        self.created_at = meta["created_at"]
+        columns = {}
+        for name, (dtype, offset) in meta["columns"].items():
+            count = self.rows + 1 if name == "offsets" else self.rows
+            columns[name] = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+        self.ids = columns["id"]
+        self.duration = columns["duration"]
+        self.fatigue_min = columns["fatigue_min"]
+        self.fatigue_max = columns["fatigue_max"]
+        self.locations = columns["locations"]
+        self.offsets = columns["offsets"]
+        blob_offset, blob_length = meta["blob"]
+        if blob_offset + blob_length > self.size or int(self.offsets[-1]) != blob_length:
+            raise ValueError("Snapshot is truncated")
+        self._blob = memoryview(self._mmap)[blob_offset:blob_offset + blob_length]
+
+    def matches(self, version: Tuple[int, int, Any]) -> bool:
+        """DBのカタログの版と一致するか"""
+        return self.version == version_key(version)
+
+    def record(self, index: int) -> bytes:
+        """i行目の活動のレスポンスJSON"""
+        return self._blob[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes()
+
+    def index_of(self, activity_id: int) -> Optional[int]:
+        """活動IDの行番号（id順に並んでいるため二分探索）"""
+        index = int(np.searchsorted(self.ids, activity_id))
+        if index < self.rows and self.ids[index] == activity_id:
+            return index
+        return None
+
+    def page_body(self, skip: int, limit: int) -> bytes:
+        """活動一覧（id順）のJSON配列"""
+        start = min(max(skip, 0), self.rows)
+        end = min(start + max(limit, 0), self.rows)
+        if start == end:
+            return b"[]"
+        return b"[" + b",".join(self.record(i) for i in range(start, end)) + b"]"
+
+    def filter(self, fatigue_level: int, location: str, duration: int, limit: int) -> np.ndarray:
+        """推奨条件（疲労度・場所・時間の25%増しまで）に合う行番号をid順に返す"""
+        if location not in LOCATIONS:
+            return np.empty(0, dtype=np.intp)
+        mask = (
+            (self.fatigue_min <= fatigue_level)
+            & (self.fatigue_max >= fatigue_level)
+            & (self.duration <= duration * 1.25)
+            & ((self.locations & (1 << LOCATIONS.index(location))) != 0)
+        )
+        return np.flatnonzero(mask)[:limit]
+
+    def activities(self, indexes) -> List[ActivitySchema]:
+        """行番号の活動をレスポンススキーマとして取得"""
+        return [ActivitySchema.model_validate_json(self.record(int(i))) for i in indexes]
+
+
+_current: Optional[CatalogSnapshot] = None
+_checked_at = 0.0
+_stale = False
+_lock = threading.Lock()
+
+
+def _refresh(path: str) -> None:
+    global _current, _stale
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if _current is not None:
+            logger.warning(f"Catalog snapshot {path} was removed")
+        _current = None
+        return
+    file_id = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+    if _current is not None and _current.file_id == file_id:
+        return
+    try:
+        snapshot = CatalogSnapshot(path)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.warning(f"カタログのスナップショット読み込みに失敗しました: {str(e)}")
+        return
+    # 参照の差し替えのみ（処理中のリクエストは古い版を使い終えてから解放される）
+    _current = snapshot
+    _stale = False
+    logger.info(f"Mapped catalog snapshot {path} ({snapshot.rows} activities, version {snapshot.version})")
+
+
+def get_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    現在のスナップショットを取得（無効・未作成の場合や、このワーカーで更新した直後はNone）
+    ファイルの差し替えの確認は CATALOG_SNAPSHOT_CHECK_SECONDS ごとに行う
+    """
+    global _checked_at
+    path = settings.CATALOG_SNAPSHOT_PATH
+    if not path:
+        return None
+    now = time.monotonic()
+    if now - _checked_at >= settings.CATALOG_SNAPSHOT_CHECK_SECONDS:
+        with _lock:
+            if now - _checked_at >= settings.CATALOG_SNAPSHOT_CHECK_SECONDS:
+                _refresh(path)
+                _checked_at = now
+    return None if _stale else _current
+
+
+def current_snapshot() -> Optional[CatalogSnapshot]:
+    """確認を行わずに、mmap済みのスナップショットを取得（メトリクス用）"""
+    return _current
+
+
+def mark_stale() -> None:
+    """このワーカーでカタログを更新した場合、次の版が書かれるまでスナップショットを使わない"""
+    global _stale
+    if _current is not None:
+        _stale = True
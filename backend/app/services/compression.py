@@ -0,0 +1,89 @@
+"""
+レスポンス圧縮（gzip / brotli）
+Accept-Encodingの交渉と、一括・ストリーミングそれぞれの圧縮処理
+brotliは任意の依存関係（未導入の場合はgzipのみ）
+"""
+import gzip
+import zlib
+from typing import Dict, Optional
+
+from ..config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotliは任意の依存関係
+    brotli = None
+
+# サーバー側の優先順（品質値が同じ場合に先頭を選ぶ）
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml")
+# 逐次配信が前提のため圧縮しない（バッファリングで配信が遅れる）
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    qualities: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encodingから使用する圧縮形式を選ぶ（圧縮しない場合はNone）"""
+    if not accept_encoding:
+        return None
+    qualities = _parse_accept_encoding(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    if content_type.startswith(UNCOMPRESSIBLE_TYPES):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    一括で圧縮（bestは一度だけ圧縮して使い回す事前圧縮用の最高圧縮率）
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=9 if best else settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """ストリーミングレスポンスの逐次圧縮"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk)
+        return self._compressor.compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish() if self.encoding == "br" else self._compressor.flush()
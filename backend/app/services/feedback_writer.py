@@ -0,0 +1,200 @@
+"""
+フィードバック書き込みのグループコミット
+リクエストごとにcommitせず、一定間隔または一定件数ごとにまとめて1トランザクションで書き込む
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..crud import feedback as crud_feedback
+from ..database import SessionLocal
+from ..models.feedback import Feedback
+from ..schemas.feedback import FeedbackCreate
+from .ranker import observe_feedbacks
+
+logger = logging.getLogger(__name__)
+
+PendingItem = Tuple[FeedbackCreate, int, asyncio.Future]
+
+
+class FeedbackWriteBuffer:
+    """
+    フィードバック挿入をプロセス内のキューに溜め、まとめてフラッシュするバッファ
+    submit()はフラッシュ（コミット）完了まで待機するため、
+    呼び出し側に結果が返った時点でデータは永続化されている
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_interval_ms: int = 20,
+        max_rows: int = 200,
+    ):
+        self._session_factory = session_factory
+        self._flush_interval = flush_interval_ms / 1000
+        self._max_rows = max_rows
+        self._pending: List[PendingItem] = []
+        self._full = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """フラッシュループを開始"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        フラッシュループを停止し、残りのフィードバックを書き込む
+        書き込み中のタスクはキャンセルせず、そのフラッシュが終わってからループを抜けさせる
+        （キャンセルすると書き込み中の呼び出し元に結果が返らなくなるため）
+        """
+        self._stopping = True
+        self._full.set()
+        if self._task is not None:
+            try:
+                await asyncio.shield(self._task)
+            finally:
+                self._task = None
+        await self.flush()
+        # 停止中に追加されたものなど、書き込めなかった分は待たせずにエラーを返す
+        self._fail_pending(RuntimeError("フィードバックの書き込みバッファは停止しています"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, []
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    async def submit(self, feedback: FeedbackCreate, user_id: int) -> Feedback:
+        """
+        フィードバックをキューに追加し、コミット完了後に作成行を返す
+        """
+        if self._stopping and self._task is None:
+            raise RuntimeError("フィードバックの書き込みバッファは停止しています")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((feedback, user_id, future))
+        if len(self._pending) >= self._max_rows:
+            self._full.set()
+        return await future
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"フィードバックのフラッシュ中にエラーが発生しました: {str(e)}")
+
+    async def flush(self) -> None:
+        """キューに溜まったフィードバックを書き込み、待機中の呼び出し元に結果を返す"""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        results: Optional[List[object]] = None
+        try:
+            try:
+                results = await run_in_threadpool(self._write, batch)
+            except Exception as e:
+                logger.warning(f"グループコミットに失敗したため個別に書き込みます: {str(e)}")
+                try:
+                    results = await run_in_threadpool(self._write_individually, batch)
+                except Exception as retry_error:
+                    results = [retry_error] * len(batch)
+        finally:
+            # キャンセルなどで結果が得られなかった場合も、呼び出し元を待たせたままにしない
+            if results is None:
+                results = [RuntimeError("フィードバックの書き込みが中断されました")] * len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _write(self, batch: List[PendingItem]) -> List[Feedback]:
+        """ユーザーごとに複数行INSERTを行い、全体を1回のコミットで確定する"""
+        by_user: Dict[int, List[int]] = defaultdict(list)
+        for index, (_, user_id, _) in enumerate(batch):
+            by_user[user_id].append(index)
+
+        results: List[Optional[Feedback]] = [None] * len(batch)
+        created: List[Feedback] = []
+        db = self._session_factory()
+        try:
+            db.expire_on_commit = False
+            for user_id, indexes in by_user.items():
+                feedbacks, new_rows = crud_feedback.create_feedbacks_batch(
+                    db, [batch[i][0] for i in indexes], user_id, commit=False
+                )
+                created.extend(new_rows)
+                for index, feedback in zip(indexes, feedbacks):
+                    results[index] = feedback
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        observe_feedbacks(created)
+        return results
+
+    def _write_individually(self, batch: List[PendingItem]) -> List[object]:
+        """一括書き込みに失敗した場合、1件ずつ書き込んで失敗した項目だけを例外にする"""
+        results: List[object] = []
+        db = self._session_factory()
+        try:
+            for feedback, user_id, _ in batch:
+                try:
+                    results.append(crud_feedback.create_feedback(db, feedback, user_id))
+                except Exception as e:
+                    db.rollback()
+                    results.append(e)
+        finally:
+            db.close()
+
+        return results
+
+
+# アプリケーション全体で共有するバッファ（FEEDBACK_WRITE_BEHIND有効時のみ生成）
+_write_buffer: Optional[FeedbackWriteBuffer] = None
+
+
+def get_feedback_writer() -> Optional[FeedbackWriteBuffer]:
+    """起動中の書き込みバッファを取得（無効時はNone）"""
+    return _write_buffer
+
+
+async def start_feedback_writer() -> None:
+    """設定が有効な場合に書き込みバッファを起動"""
+    global _write_buffer
+    if not settings.FEEDBACK_WRITE_BEHIND or _write_buffer is not None:
+        return
+    _write_buffer = FeedbackWriteBuffer(
+        flush_interval_ms=settings.FEEDBACK_FLUSH_INTERVAL_MS,
+        max_rows=settings.FEEDBACK_FLUSH_MAX_ROWS,
+    )
+    await _write_buffer.start()
+    logger.info("Feedback write-behind buffer started")
+
+
+async def stop_feedback_writer() -> None:
+    """書き込みバッファを停止し、残りを書き込む"""
+    global _write_buffer
+    if _write_buffer is None:
+        return
+    await _write_buffer.stop()
+    _write_buffer = None
@@ -0,0 +1,107 @@
+"""
+定期ジョブの定義
+リクエストの処理中に行っていた重い再計算を、スケジューラから決まった間隔で実行する
+各ジョブはfull=Trueの場合に全件を対象に作り直す（手動実行の --full）
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+
+from ..config import settings
+from ..crud import job as crud_job
+from ..crud import user as crud_user
+from ..database import SessionLocal, engine
+from ..models.user import UserProfile
+from . import ai_service, analytics
+from .rollup_compactor import compact_rollups
+from .scheduler import register_job
+
+logger = logging.getLogger(__name__)
+
+
+@register_job(
+    "rollup_compaction", settings.ROLLUP_COMPACTION_INTERVAL_SECONDS,
+    "直近の日次ロールアップを生データから再計算（fullの場合は全期間）",
+)
+def rollup_compaction(full: bool = False) -> str:
+    rebuilt = compact_rollups(None if full else settings.ROLLUP_COMPACTION_DAYS)
+    return f"{rebuilt} rollup rows rebuilt"
+
+
+@register_job(
+    "analytics_snapshot", settings.ANALYTICS_REFRESH_INTERVAL_SECONDS,
+    "管理者向け分析の列スナップショットを作成し直す（期限切れによるリクエスト中の再読み込みを防ぐ）",
+)
+def analytics_snapshot(full: bool = False) -> str:
+    columns = analytics.get_feedback_columns(engine, refresh=True)
+    return f"{len(columns)} feedback rows"
+
+
+@register_job(
+    "textual_profiles", settings.PROFILE_REGENERATION_INTERVAL_SECONDS,
+    "生成に失敗した文章形式のプロファイルを作成し直す（fullの場合はモデル変更後などに全件）",
+)
+def textual_profiles(full: bool = False) -> str:
+    db = SessionLocal()
+    regenerated = failed = 0
+    last_id = 0
+    try:
+        if not full:
+            # 定期実行は前回の続きから処理する（失敗し続けるプロファイルで先頭のバッチが埋まらないように）
+            last_id = int(crud_job.get_cursor(db, "textual_profiles") or 0)
+        wrapped = last_id == 0
+        while True:
+            query = select(UserProfile).where(UserProfile.id > last_id).order_by(UserProfile.id)
+            if not full:
+                query = query.where(or_(
+                    UserProfile.textual_profile.is_(None),
+                    UserProfile.textual_profile == ai_service.PROFILE_ERROR_MESSAGE,
+                ))
+            profiles = list(db.scalars(query.limit(settings.PROFILE_REGENERATION_BATCH_SIZE)))
+            if not profiles:
+                if full or wrapped:
+                    break
+                # 末尾まで進んだ場合は先頭に戻る
+                last_id, wrapped = 0, True
+                continue
+            for profile in profiles:
+                last_id = profile.id
+                preferences = {
+                    "interests": json.loads(profile.interests) if profile.interests else [],
+                    "work_style": profile.work_style,
+                    "rest_preferences": json.loads(profile.rest_preferences) if profile.rest_preferences else [],
+                }
+                # ジョブはワーカースレッドで実行されるため、生成処理用のイベントループを作成する
+                textual_profile = asyncio.run(ai_service.generate_textual_profile(preferences))
+                if textual_profile == ai_service.PROFILE_ERROR_MESSAGE:
+                    failed += 1
+                    continue
+                crud_user.update_user_profile_text(db, profile, textual_profile)
+                regenerated += 1
+            # 定期実行では1回あたりの件数（AIの呼び出し回数）を制限する
+            if not full:
+                break
+        if not full:
+            # バッチが埋まらなかった場合は末尾に達しているため、次回は先頭から処理する
+            if len(profiles) < settings.PROFILE_REGENERATION_BATCH_SIZE:
+                last_id = 0
+            crud_job.set_cursor(db, "textual_profiles", str(last_id) if last_id else None)
+    finally:
+        db.close()
+    return f"{regenerated} profiles regenerated, {failed} failed"
+
+
+@register_job(
+    "job_run_pruning", 86400,
+    "保持期間を過ぎたジョブの実行履歴を削除",
+)
+def job_run_pruning(full: bool = False) -> str:
+    db = SessionLocal()
+    try:
+        before = datetime.utcnow() - timedelta(days=settings.JOB_RUN_RETENTION_DAYS)
+        return f"{crud_job.prune_job_runs(db, before)} runs deleted"
+    finally:
+        db.close()
@@ -0,0 +1,377 @@
+"""
+Prometheus形式のメトリクス
+計測側はロックを取らず、系列ごとに事前確保した配列を加算するだけにする
+（GILの切り替えが加算の途中に入った場合に稀に1件取りこぼすことは許容する）
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# 秒単位のレイテンシ用の既定バケット
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 待ち時間（コネクション取得・イベントループ遅延）用の細かいバケット
+WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# 定期ジョブの実行時間用の粗いバケット
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter:
+    """単調増加するカウンター"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], _CounterSeries] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str) -> _CounterSeries:
+        series = self._series.get(values)
+        if series is None:
+            series = self._series.setdefault(values, _CounterSeries())
+        return series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for values, series in list(self._series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {series.value}")
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # 最後の要素は+Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    """バケットを事前確保したヒストグラム"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str) -> _HistogramSeries:
+        series = self._series.get(values)
+        if series is None:
+            series = self._series.setdefault(values, _HistogramSeries(self.buckets))
+        return series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, series in list(self._series.items()):
+            cumulative = 0
+            counts = list(series.counts)
+            for upper, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if upper == float("inf") else repr(upper)
+                labels = _format_labels(self.labelnames, values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {series.sum}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackGauge:
+    """スクレイプ時に値を計算するゲージ（コールバックは(ラベル値のタプル, 値)を返す）"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            for values, value in self.callback():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {value}")
+        except Exception as e:
+            logger.warning(f"Metrics callback {self.name} failed: {str(e)}")
+        return lines
+
+
+REGISTRY: List = []
+
+
+def render_metrics() -> str:
+    """全メトリクスをPrometheusのテキスト形式で出力（イベントループのスレッドから呼び出す）"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTPリクエスト
+http_requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+
+# データベースのコネクションプール
+db_pool_checkout_wait_seconds = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection", ("pool",),
+    buckets=WAIT_BUCKETS,
+)
+_pools: Dict[str, object] = {}
+
+
+def instrument_pool(pool, name: str) -> None:
+    """コネクションプールの取得待ち時間を計測する"""
+    do_get = pool._do_get
+    series = db_pool_checkout_wait_seconds.labels(name)
+
+    @functools.wraps(do_get)
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            series.observe(time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
+    _pools[name] = pool
+
+
+def _pool_state() -> Iterable[Tuple[Tuple[str, ...], float]]:
+    # NullPoolなど接続を保持しないプールは取得待ちのみ計測する
+    for name, pool in list(_pools.items()):
+        for state in ("checkedout", "size", "overflow"):
+            if hasattr(pool, state):
+                yield (name, state), getattr(pool, state)()
+
+
+CallbackGauge("db_pool_connections", "DB connections by pool and state", ("pool", "state"), _pool_state)
+
+# AI（Gemini）呼び出し
+ai_call_duration_seconds = Histogram(
+    "ai_call_duration_seconds", "ai_service call latency by function", ("function",)
+)
+ai_calls_total = Counter(
+    "ai_calls_total", "ai_service calls by function and outcome", ("function", "outcome")
+)
+ai_stream_first_chunk_seconds = Histogram(
+    "ai_stream_first_chunk_seconds", "Time to the first streamed ai_service chunk by function", ("function",)
+)
+_ai_outcome: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("ai_outcome", default=None)
+
+
+def set_ai_outcome(outcome: str) -> None:
+    """
+    実行中のAI呼び出しの結果を記録（例外を握りつぶして既定値を返す場合に呼び出す）
+    """
+    holder = _ai_outcome.get()
+    if holder is not None:
+        holder[0] = outcome
+
+
+def instrument_ai_call(func):
+    """ai_serviceの非同期関数のレイテンシと結果（success, error, invalid_response）を計測するデコレーター"""
+    name = func.__name__
+    duration = ai_call_duration_seconds.labels(name)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        holder = ["success"]
+        token = _ai_outcome.set(holder)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            holder[0] = "error"
+            raise
+        finally:
+            _ai_outcome.reset(token)
+            duration.observe(time.perf_counter() - started)
+            ai_calls_total.labels(name, holder[0]).inc()
+
+    return wrapper
+
+
+def instrument_ai_stream(func):
+    """
+    ai_serviceの非同期ジェネレーターの最初のチャンクまでの時間・全体のレイテンシ・結果を計測するデコレーター
+    結果は success, error, cancelled（クライアントの切断などで途中終了）
+    """
+    name = func.__name__
+    duration = ai_call_duration_seconds.labels(name)
+    first_chunk = ai_stream_first_chunk_seconds.labels(name)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        outcome = "error"
+        started = time.perf_counter()
+        waiting = True
+        try:
+            async for item in func(*args, **kwargs):
+                if waiting:
+                    first_chunk.observe(time.perf_counter() - started)
+                    waiting = False
+                yield item
+            outcome = "success"
+        except GeneratorExit:
+            outcome = "cancelled"
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+            ai_calls_total.labels(name, outcome).inc()
+
+    return wrapper
+
+
+# キャッシュのヒット率
+def _cache_stats() -> Iterable[Tuple[Tuple[str, ...], float]]:
+    from .ttl_cache import registered_caches
+    for cache in registered_caches():
+        yield (cache.name, "hits"), cache.hits
+        yield (cache.name, "misses"), cache.misses
+        # 共有キャッシュの名前空間は件数を持たない
+        if hasattr(cache, "__len__"):
+            yield (cache.name, "entries"), len(cache)
+
+
+def _cache_hit_ratio() -> Iterable[Tuple[Tuple[str, ...], float]]:
+    from .ttl_cache import registered_caches
+    for cache in registered_caches():
+        total = cache.hits + cache.misses
+        yield (cache.name,), (cache.hits / total) if total else 0.0
+
+
+CallbackGauge("cache_operations", "Cache hits, misses and entries", ("cache", "kind"), _cache_stats)
+CallbackGauge("cache_hit_ratio", "Cache hit ratio since start (per worker)", ("cache",), _cache_hit_ratio)
+
+
+# 共有メモリのカタログスナップショット
+def _catalog_snapshot_state() -> Iterable[Tuple[Tuple[str, ...], float]]:
+    from .catalog_snapshot import current_snapshot
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        yield ("rows",), snapshot.rows
+        yield ("bytes",), snapshot.size
+        yield ("age_seconds",), time.time() - snapshot.created_at
+
+
+CallbackGauge("catalog_snapshot", "Mapped catalog snapshot rows, size and age", ("kind",), _catalog_snapshot_state)
+
+
+# 定期ジョブ
+scheduler_job_duration_seconds = Histogram(
+    "scheduler_job_duration_seconds", "Scheduled job run time by job and status", ("job", "status"),
+    buckets=JOB_BUCKETS,
+)
+scheduler_job_runs_total = Counter(
+    "scheduler_job_runs_total", "Scheduled job runs by job, trigger and status", ("job", "trigger", "status")
+)
+
+
+# レート制限の共有バックエンドの障害（outcomeはRATE_LIMIT_FAILURE_MODEによる判定結果）
+rate_limit_backend_errors_total = Counter(
+    "rate_limit_backend_errors_total", "Rate limit backend errors by resulting decision", ("outcome",)
+)
+
+# スレッドプール・イベントループの飽和度
+def _threadpool_state() -> Iterable[Tuple[Tuple[str, ...], float]]:
+    import anyio.to_thread
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    yield ("request", "busy"), limiter.borrowed_tokens
+    yield ("request", "limit"), limiter.total_tokens
+    yield ("request", "waiting"), limiter.statistics().tasks_waiting
+    from .password_hasher import password_hasher
+    yield ("password_hasher", "busy"), password_hasher.pending
+    yield ("password_hasher", "limit"), settings.PASSWORD_HASH_MAX_PENDING
+
+
+CallbackGauge("threadpool_tasks", "Worker pool occupancy", ("pool", "state"), _threadpool_state)
+
+event_loop_lag_seconds = Histogram(
+    "event_loop_lag_seconds", "Delay of a scheduled wake-up on the event loop", buckets=WAIT_BUCKETS
+)
+_loop_monitor_task: Optional[asyncio.Task] = None
+
+
+async def _monitor_event_loop(interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    series = event_loop_lag_seconds.labels()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        series.observe(max(0.0, loop.time() - started - interval))
+
+
+async def start_loop_monitor() -> None:
+    """イベントループの遅延計測を開始"""
+    global _loop_monitor_task
+    if not settings.METRICS_ENABLED or _loop_monitor_task is not None:
+        return
+    _loop_monitor_task = asyncio.create_task(
+        _monitor_event_loop(settings.EVENT_LOOP_MONITOR_INTERVAL_SECONDS)
+    )
+
+
+async def stop_loop_monitor() -> None:
+    """イベントループの遅延計測を停止"""
+    global _loop_monitor_task
+    if _loop_monitor_task is not None:
+        _loop_monitor_task.cancel()
+        try:
+            await _loop_monitor_task
+        except asyncio.CancelledError:
+            pass
+        _loop_monitor_task = None
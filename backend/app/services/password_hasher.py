@@ -0,0 +1,158 @@
+"""
+パスワードハッシュ処理
+bcryptの計算をリクエスト用スレッドプールから切り離し、専用のプロセスプールで実行する
+同時実行数の上限を超えた場合は待たせずに503を返す
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_contexts: Dict[int, CryptContext] = {}
+
+
+def get_crypt_context(rounds: Optional[int] = None) -> CryptContext:
+    """
+    指定コストのCryptContextを取得
+    min/maxも同じ値に固定し、コストが変わったハッシュはneeds_updateで検出されるようにする
+    """
+    rounds = rounds or settings.BCRYPT_ROUNDS
+    context = _contexts.get(rounds)
+    if context is None:
+        context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        _contexts[rounds] = context
+    return context
+
+
+def hash_password_sync(password: str, rounds: Optional[int] = None) -> str:
+    """パスワードをハッシュ化（ワーカー側で実行）"""
+    return get_crypt_context(rounds).hash(password)
+
+
+def warm_worker_sync(rounds: Optional[int] = None) -> None:
+    """bcryptのバックエンドを読み込む（起動時のウォームアップ用。最小コストで1回ハッシュ化する）"""
+    get_crypt_context(rounds)
+    get_crypt_context(4).hash("warmup")
+
+
+def verify_and_update_sync(
+    password: str, hashed_password: str, rounds: Optional[int] = None
+) -> Tuple[bool, Optional[str]]:
+    """
+    パスワードを検証し、コスト変更などで再ハッシュが必要なら新しいハッシュも返す（ワーカー側で実行）
+    """
+    return get_crypt_context(rounds).verify_and_update(password, hashed_password)
+
+
+class HashingOverloadedError(HTTPException):
+    """ハッシュ処理の待ち行列が上限に達したことを示す例外"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="認証処理が混み合っています。しばらく経ってからお試しください",
+            headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+        )
+
+
+class PasswordHasher:
+    """
+    専用Executorでハッシュ処理を行うクラス
+    実行中と待機中を合わせてmax_pending件を超える要求は即座に拒否する
+    """
+
+    def __init__(self, workers: int, max_pending: int, executor_kind: str = "process", rounds: Optional[int] = None):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._executor_kind = executor_kind
+        self._rounds = rounds
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """実行中・待機中のハッシュ処理の件数"""
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self._executor_kind == "process":
+                # フォーク時のロック引き継ぎを避けるためspawnでワーカーを起動する
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._workers, thread_name_prefix="password-hasher"
+                )
+        return self._executor
+
+    def _discard_executor(self, executor: Executor) -> None:
+        # 同時に失敗した他の呼び出しが既に作り直していれば何もしない
+        if self._executor is executor:
+            logger.warning("Password hashing worker died; restarting the process pool")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        """
+        Executorで実行する
+        ワーカープロセスが異常終了したプールは以後使えなくなるため、破棄して新しいプールで1回だけ再実行する
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    async def _submit(self, func, *args):
+        if self._pending >= self._max_pending:
+            raise HashingOverloadedError()
+        self._pending += 1
+        try:
+            return await self._run(func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """パスワードをハッシュ化"""
+        return await self._submit(hash_password_sync, password, self._rounds)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """パスワードを検証し、(一致したか, 再ハッシュ後の値またはNone) を返す"""
+        return await self._submit(verify_and_update_sync, password, hashed_password, self._rounds)
+
+    async def warm(self) -> None:
+        """ワーカーを起動し、各ワーカーでbcryptを読み込ませる（待ち行列の上限には数えない）"""
+        await asyncio.gather(*(self._run(warm_worker_sync, self._rounds) for _ in range(self._workers)))
+
+    def shutdown(self) -> None:
+        """Executorを停止"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    executor_kind=settings.PASSWORD_HASH_EXECUTOR,
+    rounds=settings.BCRYPT_ROUNDS,
+)
@@ -0,0 +1,35 @@
+"""
+LLMによるパーソナライズ結果（推奨カテゴリと推奨理由）のキャッシュ
+キーは (ユーザー, 疲労度, プロファイルとフィードバックの内容のハッシュ) で、
+プロファイルやフィードバックが変われば別のキーになる
+user:{id}タグを付けるため、フィードバックの書き込み時にも破棄される
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from .cache import get_cache, user_tag
+
+_cache = get_cache("personalization", ttl=settings.PERSONALIZATION_CACHE_SECONDS)
+
+
+def personalization_key(user_id: int, fatigue_level: int, textual_profile: str, feedback_data: List[Dict]) -> str:
+    """プロンプトの入力が同じ場合に同じになるキー"""
+    content = json.dumps([textual_profile, feedback_data], ensure_ascii=False, sort_keys=True, default=str)
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+    return f"{user_id}:{fatigue_level}:{digest}"
+
+
+def get_personalization(key: str) -> Optional[Dict[str, Any]]:
+    """{"categories": [...], "reasoning": 文字列またはNone}（未登録の場合はNone）"""
+    return _cache.get(key)
+
+
+def set_personalization(user_id: int, key: str, categories: List[str], reasoning: Optional[str] = None) -> None:
+    """パーソナライズ結果を保存（推奨理由が既に保存されていれば残す）"""
+    if reasoning is None:
+        existing = _cache.get(key)
+        if existing is not None and existing.get("categories") == categories:
+            reasoning = existing.get("reasoning")
+    _cache.set(key, {"categories": list(categories), "reasoning": reasoning}, tags=[user_tag(user_id)])
@@ -0,0 +1,75 @@
+"""
+認証済みユーザー（プリンシパル）のキャッシュ
+JWTのsubからユーザーを解決する際、リクエストごとのDB問い合わせを省く
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+
+from ..config import settings
+from ..models.user import User
+from .cache import get_cache, invalidate_user
+
+# レスポンスや認可で使用するユーザーの列（パスワードハッシュは保持しない）
+PRINCIPAL_FIELDS = ("id", "email", "name", "created_at", "updated_at")
+
+_cache = get_cache("principal", ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def get_principal(user_id: int) -> Optional[User]:
+    """
+    キャッシュからユーザーを取得
+    返すのはセッションに属さない一時的なUserインスタンス
+    """
+    values = _cache.get(user_id)
+    if values is None:
+        return None
+    return User(**values)
+
+
+def cache_principal(user: User) -> None:
+    """ユーザーをキャッシュに登録"""
+    _cache.set(user.id, {field: getattr(user, field) for field in PRINCIPAL_FIELDS})
+
+
+def invalidate_principal(user_id: int) -> None:
+    """ユーザーのキャッシュを破棄"""
+    _cache.delete(user_id)
+
+
+def token_claims(user: User) -> Dict[str, Any]:
+    """
+    アクセストークンに埋め込むユーザー情報
+    トークンの有効期限内はユーザー情報の変更が反映されない点に注意
+    """
+    return {
+        "email": user.email,
+        "name": user.name,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "updated_at": user.updated_at.isoformat() if user.updated_at else None,
+    }
+
+
+def principal_from_claims(user_id: int, payload: Dict[str, Any]) -> Optional[User]:
+    """トークンに必要な情報が揃っていればDBを参照せずにユーザーを組み立てる"""
+    if not all(payload.get(field) for field in ("email", "created_at", "updated_at")):
+        return None
+    try:
+        return User(
+            id=user_id,
+            email=payload["email"],
+            name=payload.get("name"),
+            created_at=datetime.fromisoformat(payload["created_at"]),
+            updated_at=datetime.fromisoformat(payload["updated_at"]),
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+# ユーザーの更新・削除時にキャッシュを破棄する
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target: User) -> None:
+    invalidate_principal(target.id)
+    invalidate_user(target.id)
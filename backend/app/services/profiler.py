@@ -0,0 +1,122 @@
+"""
+サンプリングプロファイラー
+別スレッドから一定間隔で対象リクエストを処理しているスレッドのスタックを採取し、
+フレームグラフ用の collapsed stack 形式（"a;b;c 件数"）で出力する
+対象はイベントループのスレッドと、そのリクエストから呼び出したスレッドプールの処理中のスレッドのみ
+（他のリクエストやバックグラウンドのスレッドは含めない）
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# プロファイル中のリクエストのコンテキストで設定する（スレッドプールの処理にも引き継がれる）
+current_profiler: contextvars.ContextVar[Optional["SamplingProfiler"]] = contextvars.ContextVar(
+    "current_profiler", default=None
+)
+
+# スレッドプールのワーカーが処理中の項目のコンテキストを保持するフレーム（anyioのWorkerThread.run）
+WORKER_FRAME = ("_asyncio.py", "run")
+
+# 待機中のスレッドのスタックは集計から除外する（末尾のフレームで判定）
+IDLE_LEAF_FUNCTIONS = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    # collapsed形式の区切り文字を含めない
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _worker_context(frame) -> Optional[contextvars.Context]:
+    # スレッドプールのワーカーが実行中の項目のコンテキスト（ワーカー以外のスレッドはNone）
+    while frame is not None:
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) == WORKER_FRAME:
+            context = frame.f_locals.get("context")
+            return context if isinstance(context, contextvars.Context) else None
+        frame = frame.f_back
+    return None
+
+
+class SamplingProfiler:
+    """
+    start()からstop()までの間、interval秒ごとに対象スレッドのスタックを採取する
+    start()はイベントループのスレッドで、current_profilerを設定したコンテキストから呼び出す
+    イベントループのスレッドでは、同時に実行中の他のリクエストのコルーチンも現れうる点に注意
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+        self._started_at = 0.0
+        self.duration = 0.0
+
+    def _is_target(self, thread_id: int, frame) -> bool:
+        if thread_id == self._loop_thread_id:
+            return True
+        context = _worker_context(frame)
+        return context is not None and context.get(current_profiler) is self
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.sample_count += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or not self._is_target(thread_id, frame):
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAF_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)).replace(";", ":").replace(" ", "_"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started_at
+
+    def collapsed(self) -> str:
+        """collapsed stack形式の文字列（flamegraph.pl / speedscope などで読み込める）"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+# 同時に1リクエストのみプロファイルする（オーバーヘッドを抑えるため）
+_profile_lock = threading.Lock()
+
+
+def try_acquire() -> bool:
+    """プロファイル中でなければ実行権を取得"""
+    return _profile_lock.acquire(blocking=False)
+
+
+def release() -> None:
+    _profile_lock.release()
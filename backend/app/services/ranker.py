@@ -0,0 +1,278 @@
+"""
+バンディットアルゴリズムによる推奨活動の並べ替え
+(疲労度帯 × 場所) のコンテキストごとに活動のBeta事後分布を保持し、
+フィードバックの完了状況と評価から逐次更新する
+各ワーカーは自身の観測をRANKER_SNAPSHOT_PATHのファイルに定期的に合算し、他のワーカーの観測を取り込む
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..schemas.activity import Location
+
+logger = logging.getLogger(__name__)
+
+BANDIT_METHODS = ("thompson", "ucb")
+
+# 疲労度帯の上限（1-3, 4-6, 7-8, 9-10）
+FATIGUE_BAND_UPPER = (3, 6, 8, 10)
+LOCATIONS = [loc.value for loc in Location]
+N_BUCKETS = len(FATIGUE_BAND_UPPER) * len(LOCATIONS)
+
+# 完了状況ごとの報酬（評価と半々で合成する）
+COMPLETION_REWARD = {"completed": 1.0, "partial": 0.5, "abandoned": 0.0}
+
+
+def context_bucket(fatigue_level: int, location: str) -> int:
+    """疲労度と場所からコンテキストの番号を計算"""
+    band = next(
+        (i for i, upper in enumerate(FATIGUE_BAND_UPPER) if fatigue_level <= upper),
+        len(FATIGUE_BAND_UPPER) - 1,
+    )
+    location_index = LOCATIONS.index(location) if location in LOCATIONS else LOCATIONS.index("other")
+    return band * len(LOCATIONS) + location_index
+
+
+def feedback_reward(completion_status: str, rating: int) -> float:
+    """完了状況と評価（1-10）を0〜1の報酬に変換"""
+    completion = COMPLETION_REWARD.get(completion_status, 0.0)
+    return 0.5 * completion + 0.5 * (min(max(rating, 1), 10) - 1) / 9
+
+
+class BetaPosteriorStore:
+    """
+    コンテキスト × 活動のBeta(α, β)を2次元配列で保持するストア
+    活動IDは列番号に対応付け、容量が足りなくなったら倍に拡張する
+    保存時に他のワーカーの観測と合算できるよう、前回の保存以降の観測も保持する
+    """
+
+    def __init__(self, n_buckets: int = N_BUCKETS, capacity: int = 64, prior: Tuple[float, float] = (1.0, 1.0)):
+        self.prior = prior
+        self._alpha = np.full((n_buckets, capacity), prior[0], dtype=np.float64)
+        self._beta = np.full((n_buckets, capacity), prior[1], dtype=np.float64)
+        self._columns: Dict[int, int] = {}
+        self._unsaved: List[Tuple[int, int, float]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def dirty(self) -> bool:
+        """保存されていない観測があるか"""
+        return bool(self._unsaved)
+
+    def _column(self, activity_id: int) -> int:
+        column = self._columns.get(activity_id)
+        if column is not None:
+            return column
+        column = len(self._columns)
+        if column >= self._alpha.shape[1]:
+            grow = self._alpha.shape[1]
+            self._alpha = np.pad(self._alpha, ((0, 0), (0, grow)), constant_values=self.prior[0])
+            self._beta = np.pad(self._beta, ((0, 0), (0, grow)), constant_values=self.prior[1])
+        self._columns[activity_id] = column
+        return column
+
+    def _apply(self, bucket: int, activity_id: int, reward: float) -> None:
+        column = self._column(activity_id)
+        self._alpha[bucket, column] += reward
+        self._beta[bucket, column] += 1.0 - reward
+
+    def update(self, bucket: int, activity_id: int, reward: float) -> None:
+        """報酬rをα += r, β += 1 - r として反映"""
+        with self._lock:
+            self._apply(bucket, activity_id, reward)
+            self._unsaved.append((bucket, activity_id, reward))
+
+    def scores(
+        self,
+        bucket: int,
+        activity_ids: Sequence[int],
+        method: str,
+        rng: Optional[np.random.Generator] = None,
+        exploration: float = 1.0,
+    ) -> np.ndarray:
+        """候補活動のスコアを計算（候補数に比例するコスト）"""
+        with self._lock:
+            columns = np.array([self._columns.get(a, -1) for a in activity_ids], dtype=np.intp)
+            known = columns >= 0
+            alpha = np.full(len(activity_ids), self.prior[0])
+            beta = np.full(len(activity_ids), self.prior[1])
+            alpha[known] = self._alpha[bucket, columns[known]]
+            beta[known] = self._beta[bucket, columns[known]]
+            # 総観測回数は使用中の列のみで数え、事前分布の分を差し引く（未使用の予備の列を含めない）
+            n = len(self._columns)
+            bucket_total = float(
+                (self._alpha[bucket, :n] + self._beta[bucket, :n]).sum() - n * sum(self.prior)
+            )
+
+        if method == "thompson":
+            rng = rng or np.random.default_rng()
+            return rng.beta(alpha, beta)
+
+        # UCB: 事後平均 + 観測回数が少ないほど大きい探索ボーナス
+        observations = alpha + beta
+        mean = alpha / observations
+        return mean + exploration * np.sqrt(np.log(max(bucket_total, 2.0)) / observations)
+
+    def _write(self, path: str) -> None:
+        # 一時ファイルはプロセスごとに分け、置き換えでアトミックに更新する
+        with self._lock:
+            ids = np.fromiter(self._columns.keys(), dtype=np.int64, count=len(self._columns))
+            order = np.fromiter(self._columns.values(), dtype=np.intp, count=len(self._columns))
+            alpha = self._alpha[:, order].copy()
+            beta = self._beta[:, order].copy()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, activity_ids=ids, alpha=alpha, beta=beta, prior=np.array(self.prior))
+        os.replace(tmp_path, path)
+
+    def save(self, path: str) -> None:
+        """
+        前回の保存以降の観測をファイル上の事後分布に合算して保存し、合算結果を読み込み直す
+        複数のワーカーが同じファイルに保存しても、互いの観測を上書きしない（ファイルロックで直列化）
+        """
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, []
+        try:
+            with open(f"{path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    merged = self.load(path) if os.path.exists(path) else None
+                except Exception as e:
+                    logger.warning(f"ランカーのスナップショット読み込みに失敗しました: {str(e)}")
+                    merged = None
+                if merged is None:
+                    # 読み込めるファイルが無い場合は、このワーカーの事後分布をそのまま保存する
+                    self._write(path)
+                    return
+                for bucket, activity_id, reward in unsaved:
+                    merged._apply(bucket, activity_id, reward)
+                merged._write(path)
+        except Exception:
+            with self._lock:
+                self._unsaved = unsaved + self._unsaved
+            raise
+
+        with self._lock:
+            # 保存中に追加された観測は合算結果に反映し直し、次回の保存まで保持する
+            self._alpha, self._beta, self._columns = merged._alpha, merged._beta, merged._columns
+            for bucket, activity_id, reward in self._unsaved:
+                self._apply(bucket, activity_id, reward)
+
+    @classmethod
+    def load(cls, path: str) -> "BetaPosteriorStore":
+        """保存済みの事後分布を読み込む"""
+        with np.load(path) as data:
+            ids = data["activity_ids"]
+            store = cls(
+                n_buckets=data["alpha"].shape[0],
+                capacity=max(64, len(ids)),
+                prior=tuple(float(p) for p in data["prior"]),
+            )
+            store._alpha[:, :len(ids)] = data["alpha"]
+            store._beta[:, :len(ids)] = data["beta"]
+            store._columns = {int(a): i for i, a in enumerate(ids)}
+        return store
+
+
+_store: Optional[BetaPosteriorStore] = None
+_store_lock = threading.Lock()
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+def get_ranker() -> BetaPosteriorStore:
+    """共有の事後分布ストアを取得（初回はスナップショットから復元）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = settings.RANKER_SNAPSHOT_PATH
+                store = None
+                if path and os.path.exists(path):
+                    try:
+                        store = BetaPosteriorStore.load(path)
+                        logger.info(f"Loaded ranker posteriors from {path}")
+                    except Exception as e:
+                        logger.warning(f"ランカーのスナップショット読み込みに失敗しました: {str(e)}")
+                _store = store or BetaPosteriorStore()
+    return _store
+
+
+def observe_feedbacks(feedbacks) -> None:
+    """
+    作成されたフィードバックを事後分布に反映（バンディット並べ替えが有効な場合のみ）
+    """
+    if settings.RECOMMENDATION_ORDERING not in BANDIT_METHODS:
+        return
+    store = get_ranker()
+    for fb in feedbacks:
+        store.update(
+            context_bucket(fb.fatigue_level, fb.location),
+            fb.activity_id,
+            feedback_reward(fb.completion_status, fb.rating),
+        )
+
+
+def rank_activities(activities: List, fatigue_level: int, location: str, method: str) -> List:
+    """
+    候補活動をバンディットのスコア順に並べ替える
+    """
+    if not activities:
+        return activities
+    scores = get_ranker().scores(
+        context_bucket(fatigue_level, location),
+        [activity.id for activity in activities],
+        method,
+        exploration=settings.RANKER_UCB_EXPLORATION,
+    )
+    order = np.argsort(-scores, kind="stable")
+    return [activities[i] for i in order]
+
+
+def save_ranker_snapshot() -> bool:
+    """変更がある場合のみ事後分布を保存"""
+    if _store is None or not _store.dirty or not settings.RANKER_SNAPSHOT_PATH:
+        return False
+    _store.save(settings.RANKER_SNAPSHOT_PATH)
+    return True
+
+
+async def _run_snapshots(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(save_ranker_snapshot)
+        except Exception as e:
+            logger.error(f"ランカーのスナップショット保存中にエラーが発生しました: {str(e)}")
+
+
+async def start_ranker_snapshots() -> None:
+    """バンディット並べ替えが有効な場合に定期スナップショットを開始"""
+    global _snapshot_task
+    if settings.RECOMMENDATION_ORDERING not in BANDIT_METHODS or _snapshot_task is not None:
+        return
+    get_ranker()
+    if settings.RANKER_SNAPSHOT_INTERVAL_SECONDS > 0:
+        _snapshot_task = asyncio.create_task(_run_snapshots(settings.RANKER_SNAPSHOT_INTERVAL_SECONDS))
+
+
+async def stop_ranker_snapshots() -> None:
+    """定期スナップショットを停止し、最新の事後分布を保存"""
+    global _snapshot_task
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        try:
+            await _snapshot_task
+        except asyncio.CancelledError:
+            pass
+        _snapshot_task = None
+    try:
+        await run_in_threadpool(save_ranker_snapshot)
+    except Exception as e:
+        logger.error(f"ランカーのスナップショット保存中にエラーが発生しました: {str(e)}")
@@ -0,0 +1,197 @@
+"""
+ログイン・サインアップのレート制限（トークンバケット）
+IPアドレスとメールアドレスごとにバケットを持ち、パスワードのハッシュ処理より前に判定する
+複数ワーカーで制限を共有する場合は共有バックエンド（Redis互換）を使用する
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from .metrics import rate_limit_backend_errors_total
+from .resp_client import RespClient, RespError
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceededError(HTTPException):
+    """レート制限を超えたことを示す例外"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="試行回数が多すぎます。しばらく経ってからお試しください",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+
+
+class MemoryRateLimitBackend:
+    """
+    プロセス内のトークンバケット
+    キー数が上限を超えた場合は最も古く使われたバケットから破棄する
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def consume(self, key: str, capacity: int, refill_per_second: float, cost: float = 1.0) -> float:
+        """
+        トークンを消費する。許可された場合は0、拒否された場合は再試行までの秒数を返す
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - updated_at) * refill_per_second)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / refill_per_second
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+# バケットの補充と消費をサーバー側でアトミックに行うスクリプト
+# 戻り値は再試行までのミリ秒（0なら許可）
+# 1行目のコメントはスタンドインサーバー（scripts/cache_server.py）が同じ処理を実行するための目印
+TOKEN_BUCKET_SCRIPT = """-- token_bucket
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return wait
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    Redis互換サーバーを使う共有トークンバケット（複数ワーカー・複数ホスト用）
+    サーバーに接続できない場合の扱いはfail_openで決める
+    （True: 認証を止めないよう許可する, False: 制限を守るため拒否する）
+    """
+
+    def __init__(
+        self, url: str, prefix: str = "ratelimit:", timeout: float = 0.25,
+        fail_open: bool = True, fail_closed_retry_seconds: float = 1.0
+    ):
+        self.client = RespClient(url, timeout=timeout)
+        self.prefix = prefix
+        self.fail_open = fail_open
+        self.fail_closed_retry_seconds = fail_closed_retry_seconds
+
+    async def consume(self, key: str, capacity: int, refill_per_second: float, cost: float = 1.0) -> float:
+        try:
+            # 同期クライアントのため、スレッドプールで実行する
+            wait_ms = await run_in_threadpool(
+                self.client.execute,
+                "EVAL", TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, capacity, refill_per_second, cost,
+            )
+        except (OSError, ConnectionError, RespError) as e:
+            outcome = "allowed" if self.fail_open else "denied"
+            rate_limit_backend_errors_total.labels(outcome).inc()
+            logger.warning(f"Rate limit backend error (request {outcome}): {str(e)}")
+            return 0.0 if self.fail_open else self.fail_closed_retry_seconds
+        return int(wait_ms) / 1000.0
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class RateLimiter:
+    """
+    複数のルール（IP・メールアドレスなど）をまとめて判定するレート制限
+    ルールは {名前: (容量, 1秒あたりの補充量)}
+    """
+
+    def __init__(self, backend, rules: Dict[str, Tuple[int, float]]):
+        self.backend = backend
+        self.rules = rules
+
+    async def check(self, keys: Sequence[Tuple[str, str]]) -> None:
+        """
+        (ルール名, 識別子) の組ごとにトークンを消費し、いずれかが拒否されたら429を送出
+        """
+        keys = [(rule, identifier) for rule, identifier in keys if identifier]
+        waits = await asyncio.gather(*(
+            self.backend.consume(f"{rule}:{identifier}", *self.rules[rule])
+            for rule, identifier in keys
+        ))
+        retry_after = max(waits, default=0.0)
+        if retry_after > 0:
+            denied = [rule for (rule, _), wait in zip(keys, waits) if wait > 0]
+            logger.warning(f"Rate limit exceeded: {denied}")
+            raise RateLimitExceededError(retry_after)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    リクエスト元のIPアドレス
+    プロキシの背後で運用する場合のみX-Forwarded-Forを信頼する
+    """
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+def _create_backend():
+    # 設定の誤りで制限が無効にならないよう、起動時（読み込み時）にエラーとする
+    if settings.RATE_LIMIT_FAILURE_MODE not in ("open", "closed"):
+        raise ValueError(f"Unknown RATE_LIMIT_FAILURE_MODE: {settings.RATE_LIMIT_FAILURE_MODE}")
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        if not settings.RATE_LIMIT_REDIS_URL:
+            raise ValueError("RATE_LIMIT_REDIS_URL is required when RATE_LIMIT_BACKEND=redis")
+        return RedisRateLimitBackend(
+            settings.RATE_LIMIT_REDIS_URL,
+            timeout=settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+            fail_open=settings.RATE_LIMIT_FAILURE_MODE == "open",
+        )
+    if settings.RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
+    return MemoryRateLimitBackend(max_keys=settings.RATE_LIMIT_MEMORY_MAX_KEYS)
+
+
+auth_rate_limiter = RateLimiter(
+    _create_backend(),
+    rules={
+        "auth_ip": (settings.AUTH_RATE_LIMIT_IP_CAPACITY, settings.AUTH_RATE_LIMIT_IP_PER_MINUTE / 60.0),
+        "auth_email": (settings.AUTH_RATE_LIMIT_EMAIL_CAPACITY, settings.AUTH_RATE_LIMIT_EMAIL_PER_MINUTE / 60.0),
+    },
+)
+
+
+async def enforce_auth_rate_limit(request: Request, email: Optional[str]) -> None:
+    """
+    ログイン・サインアップの試行を制限（パスワードのハッシュ処理より前に呼び出す）
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    await auth_rate_limiter.check([
+        ("auth_ip", client_ip(request)),
+        ("auth_email", email.strip().lower() if email else None),
+    ])
@@ -0,0 +1,28 @@
+"""
+読み取りのレプリカ振り分け（read-your-writes）
+書き込み直後のユーザーはレプリカの反映遅延で自分の書き込みが見えなくなるため、
+一定時間はプライマリから読み込む
+"""
+from typing import Optional
+
+from ..config import settings
+from .cache import get_cache
+
+# 直近に書き込みを行ったユーザー（共有キャッシュを使う場合は全ワーカーで共有）
+_recent_writes = get_cache("recent_writes", ttl=settings.READ_YOUR_WRITES_SECONDS)
+
+
+def is_enabled() -> bool:
+    """レプリカへの振り分けが有効か（レプリカが無ければ読み取りは常にプライマリのため記録しない）"""
+    return bool(settings.DB_REPLICA_URL) and settings.READ_YOUR_WRITES_SECONDS > 0
+
+
+def mark_user_write(user_id: int) -> None:
+    """ユーザーの書き込みを記録（この時点から一定時間はプライマリを読む）"""
+    if is_enabled():
+        _recent_writes.set(user_id, True)
+
+
+def should_read_primary(user_id: Optional[int]) -> bool:
+    """読み取りをプライマリに向けるべきか"""
+    return user_id is not None and is_enabled() and _recent_writes.get(user_id, False)
@@ -0,0 +1,139 @@
+"""
+Redis互換サーバー用の最小限の同期クライアント（RESP2）
+共有キャッシュに必要なコマンドのみを使う前提で、パイプラインとコネクションプールを持つ
+リクエスト用スレッドプールから呼び出されるため、スレッドごとに接続を借りて使う
+"""
+import queue
+import socket
+from typing import Any, List, Sequence
+from urllib.parse import unquote, urlparse
+
+
+class RespError(Exception):
+    """サーバーがエラー応答を返したことを示す例外"""
+
+
+def _encode_command(args: Sequence[Any]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode("utf-8")
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class _Connection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def send(self, commands: Sequence[Sequence[Any]]) -> None:
+        self.sock.sendall(b"".join(_encode_command(args) for args in commands))
+
+    def read_reply(self) -> Any:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            return RespError(payload.decode("utf-8"))
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply: {line!r}")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespClient:
+    """
+    redis://[:password@]host:port/db 形式のURLで接続する
+    接続エラー時はその接続を破棄し、例外を呼び出し側に返す
+    """
+
+    def __init__(self, url: str, timeout: float = 0.5, max_idle_connections: int = 16):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[_Connection]" = queue.LifoQueue(maxsize=max_idle_connections)
+
+    def _connect(self) -> _Connection:
+        conn = _Connection(self.host, self.port, self.timeout)
+        setup: List[Sequence[Any]] = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            conn.send(setup)
+            for _ in setup:
+                reply = conn.read_reply()
+                if isinstance(reply, RespError):
+                    conn.close()
+                    raise reply
+        return conn
+
+    def _acquire(self) -> _Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _release(self, conn: _Connection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def pipeline(self, commands: Sequence[Sequence[Any]], raise_on_error: bool = True) -> List[Any]:
+        """複数のコマンドを1往復で実行し、応答をまとめて返す"""
+        conn = self._acquire()
+        try:
+            conn.send(commands)
+            replies = [conn.read_reply() for _ in commands]
+        except (OSError, ConnectionError):
+            conn.close()
+            raise
+        self._release(conn)
+        if raise_on_error:
+            for reply in replies:
+                if isinstance(reply, RespError):
+                    raise reply
+        return replies
+
+    def execute(self, *args: Any) -> Any:
+        """1つのコマンドを実行"""
+        return self.pipeline([args])[0]
+
+    def close(self) -> None:
+        """待機中の接続をすべて閉じる"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
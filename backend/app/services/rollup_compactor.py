@@ -0,0 +1,24 @@
+"""
+日次ロールアップのコンパクション
+書き込み時に加算されたロールアップを定期的に生データから再計算し、ずれを解消する
+（定期実行はスケジューラのジョブとして行う）
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from ..crud import rollup as crud_rollup
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def compact_rollups(days: Optional[int]) -> int:
+    """直近days日分（Noneの場合は全期間）のロールアップを再計算し、再作成した行数を返す"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1) if days else date(1970, 1, 1)
+    db = SessionLocal()
+    try:
+        return crud_rollup.rebuild_rollups(db, since)
+    finally:
+        db.close()
+
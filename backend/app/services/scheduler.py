@@ -0,0 +1,185 @@
+"""
+定期ジョブのスケジューラ
+各ワーカーのイベントループで実行時刻を確認し、DB上のロックを取得できたワーカーのみがジョブを実行する
+（ワーカー数・ホスト数に関わらず、各ジョブは間隔ごとに1回だけ実行される）
+次回実行時刻には間隔のSCHEDULER_JITTER_RATIOまでのランダムな遅れを加え、実行時刻が重ならないようにする
+ジョブ本体はリクエスト用スレッドプールで実行し、実行履歴はjob_runsテーブルに記録する
+ジョブの定義はjobs.py、手動実行はscripts/run_job.py
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..crud import job as crud_job
+from ..database import SessionLocal
+from ..models.job import JobRun
+from .metrics import scheduler_job_duration_seconds, scheduler_job_runs_total
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    定期ジョブ
+    funcはfull（全件を対象に作り直すか）を受け取り、結果の概要（任意）を返す
+    interval_secondsが0以下の場合は定期実行せず、手動実行のみ
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        interval_seconds: float,
+        description: str,
+        lease_seconds: Optional[float] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.description = description
+        self.lease_seconds = lease_seconds or settings.SCHEDULER_LOCK_SECONDS
+
+
+_jobs: Dict[str, Job] = {}
+_task: Optional[asyncio.Task] = None
+
+
+def register_job(name: str, interval_seconds: float, description: str, lease_seconds: Optional[float] = None):
+    """ジョブを登録するデコレーター"""
+    def decorator(func):
+        _jobs[name] = Job(name, func, interval_seconds, description, lease_seconds)
+        return func
+    return decorator
+
+
+def get_jobs() -> Dict[str, Job]:
+    """登録済みのジョブ（初回にジョブ定義を読み込む）"""
+    from . import jobs  # noqa: F401
+    return _jobs
+
+
+def worker_id() -> str:
+    """ロックの所有者として記録するワーカーの識別子"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def next_run_at(job: Job, now: datetime) -> Optional[datetime]:
+    """間隔にジッターを加えた次回実行時刻"""
+    if job.interval_seconds <= 0:
+        return None
+    jitter = random.uniform(0, settings.SCHEDULER_JITTER_RATIO)
+    return now + timedelta(seconds=job.interval_seconds * (1 + jitter))
+
+
+def run_job(name: str, trigger: str = "manual", full: bool = False, due_only: bool = False) -> Optional[JobRun]:
+    """
+    ロックを取得してジョブを実行し、実行履歴を返す（他のワーカーが実行中などで取得できない場合はNone）
+    ジョブの例外は履歴に記録し、呼び出し元には送出しない
+    """
+    jobs = get_jobs()
+    if name not in jobs:
+        raise ValueError(f"Unknown job: {name}")
+    job = jobs[name]
+    owner = worker_id()
+    db = SessionLocal()
+    try:
+        crud_job.ensure_jobs(db, [name])
+        now = datetime.utcnow()
+        if not crud_job.claim_job(db, name, owner, now, job.lease_seconds, due_only=due_only):
+            return None
+        run = crud_job.start_run(db, name, trigger, owner, now)
+        started = time.perf_counter()
+        status, result, error = "failed", None, None
+        try:
+            outcome = job.func(full=full)
+            status = "succeeded"
+            result = None if outcome is None else str(outcome)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.error(f"ジョブの実行中にエラーが発生しました ({name}): {error}")
+        finally:
+            elapsed = time.perf_counter() - started
+            scheduler_job_duration_seconds.labels(name, status).observe(elapsed)
+            scheduler_job_runs_total.labels(name, trigger, status).inc()
+            finished = datetime.utcnow()
+            crud_job.finish_run(db, run, status, finished, result, error)
+            crud_job.release_job(db, name, owner, next_run_at(job, finished))
+            # セッションを閉じた後も呼び出し元で参照できるようにする
+            db.refresh(run)
+            db.expunge(run)
+        logger.info(f"Job {name} {status} in {elapsed * 1000:.0f}ms ({trigger}): {result or error or ''}")
+        return run
+    finally:
+        db.close()
+
+
+def _prepare_schedule() -> None:
+    # 行を作成し、未設定の次回実行時刻を設定（定期実行しないジョブは解除）
+    jobs = get_jobs()
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        crud_job.ensure_jobs(db, jobs)
+        for job in jobs.values():
+            if job.interval_seconds > 0:
+                crud_job.set_next_run(db, job.name, next_run_at(job, now), only_if_unset=True)
+            else:
+                crud_job.set_next_run(db, job.name, None)
+    finally:
+        db.close()
+
+
+def _due_jobs() -> List[str]:
+    db = SessionLocal()
+    try:
+        due = crud_job.get_due_job_names(db, datetime.utcnow())
+    finally:
+        db.close()
+    return [name for name in due if name in _jobs]
+
+
+async def _run(poll_seconds: float) -> None:
+    prepared = False
+    while True:
+        # 全ワーカーが同時に確認しないよう、確認間隔もずらす
+        await asyncio.sleep(poll_seconds * random.uniform(0.5, 1.5))
+        try:
+            if not prepared:
+                await run_in_threadpool(_prepare_schedule)
+                prepared = True
+            for name in await run_in_threadpool(_due_jobs):
+                await run_in_threadpool(run_job, name, "schedule", False, True)
+        except Exception as e:
+            logger.error(f"スケジューラの実行中にエラーが発生しました: {str(e)}")
+
+
+async def start_scheduler() -> None:
+    """設定が有効な場合にスケジューラを開始"""
+    global _task
+    if not settings.SCHEDULER_ENABLED or _task is not None:
+        return
+    _task = asyncio.create_task(_run(settings.SCHEDULER_POLL_SECONDS))
+
+
+async def stop_scheduler() -> None:
+    """
+    スケジューラを停止
+    実行中のジョブはスレッドで最後まで実行され、履歴の記録とロックの解放も行われる
+    """
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -0,0 +1,146 @@
+"""
+リクエスト単位のSQL計測
+SQLAlchemyのイベントで発行された文の数と実行時間を集計し、
+同じ形の文が繰り返されている場合はN+1クエリの疑いとして検出する
+"""
+import contextvars
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+
+# リテラル値やINリストの要素数の違いを無視して文の形を比較する
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))*\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """文を正規化した形（リテラル・パラメータ数の違いを同一視）"""
+    shape = _LITERAL_RE.sub("?", statement)
+    shape = _IN_LIST_RE.sub("(?)", shape)
+    return _WHITESPACE_RE.sub(" ", shape).strip()
+
+
+@dataclass
+class QueryStats:
+    """1リクエスト（または計測範囲）で発行されたSQLの集計"""
+    count: int = 0
+    total_seconds: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_seconds += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    @property
+    def total_ms(self) -> float:
+        return self.total_seconds * 1000
+
+    def repeated_shapes(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """threshold回以上繰り返された文の形（N+1の疑い）"""
+        threshold = threshold or settings.SQL_N_PLUS_ONE_THRESHOLD
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_current_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar(
+    "sql_query_stats", default=None
+)
+
+
+def current_stats() -> Optional[QueryStats]:
+    """実行中のリクエストの集計（計測範囲外ではNone）"""
+    return _current_stats.get()
+
+
+def begin_stats() -> Tuple[QueryStats, contextvars.Token]:
+    """計測を開始（スレッドプールに渡されたコンテキストからも同じ集計に記録される）"""
+    stats = QueryStats()
+    return stats, _current_stats.set(stats)
+
+
+def end_stats(token: contextvars.Token) -> None:
+    """計測を終了"""
+    _current_stats.reset(token)
+
+
+# テスト用の計測範囲（スレッドをまたいで全ての文を記録する）
+_captures: List[QueryStats] = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current_stats.get() is not None or _captures:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current_stats.get()
+    if stats is None and not _captures:
+        return
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for capture in list(_captures):
+        capture.record(statement, elapsed)
+
+
+_installed = False
+
+
+def install_sql_stats() -> None:
+    """全エンジン（非同期エンジンの内部エンジンを含む）にイベントを登録"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+
+class QueryBudgetExceeded(AssertionError):
+    """計測範囲内のSQLが上限を超えたことを示す例外"""
+
+
+def check_budget(
+    stats: QueryStats,
+    max_queries: Optional[int] = None,
+    n_plus_one_threshold: Optional[int] = None,
+) -> None:
+    """発行数の上限とN+1の有無を検査し、違反があればQueryBudgetExceededを送出"""
+    problems = []
+    if max_queries is not None and stats.count > max_queries:
+        problems.append(f"{stats.count} queries (max {max_queries})")
+    for shape, n in stats.repeated_shapes(n_plus_one_threshold):
+        problems.append(f"probable N+1 ({n}x): {shape[:200]}")
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
+
+
+@contextmanager
+def assert_queries(
+    max_queries: Optional[int] = None, n_plus_one_threshold: Optional[int] = None
+) -> Iterator[QueryStats]:
+    """
+    テスト用: 範囲内で発行されたSQLを集計し、上限超過やN+1があれば失敗させる
+    TestClientのようにアプリが別スレッドで動く場合も含め、プロセス内の全ての文を記録する
+    例: with assert_queries(max_queries=5): client.get("/api/v1/activities/")
+    """
+    install_sql_stats()
+    stats = QueryStats()
+    _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        _captures.remove(stats)
+    check_budget(stats, max_queries, n_plus_one_threshold)
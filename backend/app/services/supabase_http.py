@@ -0,0 +1,245 @@
+"""
+Supabase（GoTrue / PostgREST）の非同期HTTPクライアント
+同期版のsupabaseクライアントはイベントループを止めてしまうため、
+認証系の呼び出しはキープアライブ付きの共有コネクションプールから非同期に行う
+"""
+import asyncio
+import logging
+import secrets
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+import httpx
+from jose import jwt
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SupabaseRequestError(Exception):
+    """Supabaseがエラー応答を返したことを示す例外"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _session(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """GoTrueのトークン応答からセッション部分を取り出す"""
+    if not payload.get("access_token"):
+        return None
+    return {
+        "access_token": payload["access_token"],
+        "refresh_token": payload.get("refresh_token"),
+    }
+
+
+class SupabaseHTTPClient:
+    """
+    共有のhttpx.AsyncClientを使うSupabaseクライアント
+    コネクションは初回利用時に作成し、close()で解放する
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        timeout: float = 5.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+    ):
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self._timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """共有のHTTPクライアント（コネクションプール）"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                timeout=self._timeout,
+                limits=self._limits,
+                headers={"apikey": self.api_key},
+            )
+        return self._client
+
+    async def _request(self, method: str, path: str, token: Optional[str] = None, **kwargs) -> Any:
+        headers = kwargs.pop("headers", {})
+        headers["Authorization"] = f"Bearer {token or self.api_key}"
+        response = await self.http.request(method, path, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            try:
+                body = response.json()
+                message = body.get("msg") or body.get("message") or body.get("error_description") or response.text
+            except ValueError:
+                message = response.text
+            raise SupabaseRequestError(response.status_code, message)
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    async def sign_up(self, email: str, password: str) -> Dict[str, Any]:
+        """ユーザー登録（メール確認が必要な設定ではsessionはNone）"""
+        payload = await self._request("POST", "/auth/v1/signup", json={"email": email, "password": password})
+        user = payload.get("user") or payload
+        return {"user": user, "session": _session(payload)}
+
+    async def sign_in_with_password(self, email: str, password: str) -> Dict[str, Any]:
+        """メールアドレスとパスワードでログイン"""
+        payload = await self._request(
+            "POST", "/auth/v1/token", params={"grant_type": "password"},
+            json={"email": email, "password": password},
+        )
+        return {"user": payload.get("user"), "session": _session(payload)}
+
+    async def get_user(self, token: str) -> Optional[Dict[str, Any]]:
+        """アクセストークンに対応するユーザーを取得"""
+        return await self._request("GET", "/auth/v1/user", token=token)
+
+    async def sign_out(self, token: str) -> None:
+        """セッションを無効化"""
+        await self._request("POST", "/auth/v1/logout", token=token)
+
+    async def insert(self, table: str, row: Dict[str, Any]) -> None:
+        """PostgRESTでテーブルに1行挿入"""
+        await self._request(
+            "POST", f"/rest/v1/{table}", json=row, headers={"Prefer": "return=minimal"}
+        )
+
+    async def get_json(self, path: str) -> Any:
+        """認証不要のエンドポイント（JWKSなど）を取得"""
+        return await self._request("GET", path)
+
+    async def close(self) -> None:
+        """コネクションプールを解放"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class StubSupabaseClient:
+    """
+    ローカル開発・テスト用のインメモリ実装
+    発行するトークンはSUPABASE_JWT_SECRET（未設定時はSECRET_KEY）でHS256署名する
+    """
+
+    def __init__(self, jwt_secret: Optional[str] = None, latency: float = 0.0):
+        self.jwt_secret = jwt_secret or settings.SUPABASE_JWT_SECRET or settings.SECRET_KEY
+        self.latency = latency
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.tables: Dict[str, list] = {}
+        self.revoked: set = set()
+        self._lock = threading.Lock()
+
+    async def _wait(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _issue(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        access_token = jwt.encode(
+            {
+                "sub": user["id"],
+                "email": user["email"],
+                "aud": settings.SUPABASE_JWT_AUDIENCE,
+                "exp": int(time.time()) + 3600,
+                "session_id": uuid.uuid4().hex,
+            },
+            self.jwt_secret,
+        )
+        return {"access_token": access_token, "refresh_token": secrets.token_urlsafe(24)}
+
+    async def sign_up(self, email: str, password: str) -> Dict[str, Any]:
+        await self._wait()
+        with self._lock:
+            if email in self.users:
+                raise SupabaseRequestError(422, "User already registered")
+            user = {"id": str(uuid.uuid4()), "email": email, "password": password}
+            self.users[email] = user
+        public = {"id": user["id"], "email": email}
+        return {"user": public, "session": self._issue(user)}
+
+    async def sign_in_with_password(self, email: str, password: str) -> Dict[str, Any]:
+        await self._wait()
+        user = self.users.get(email)
+        if user is None or user["password"] != password:
+            raise SupabaseRequestError(400, "Invalid login credentials")
+        return {"user": {"id": user["id"], "email": email}, "session": self._issue(user)}
+
+    async def get_user(self, token: str) -> Optional[Dict[str, Any]]:
+        await self._wait()
+        if token in self.revoked:
+            raise SupabaseRequestError(401, "invalid JWT")
+        try:
+            claims = jwt.decode(token, self.jwt_secret, audience=settings.SUPABASE_JWT_AUDIENCE)
+        except Exception:
+            raise SupabaseRequestError(401, "invalid JWT")
+        return {"id": claims["sub"], "email": claims.get("email")}
+
+    async def sign_out(self, token: str) -> None:
+        await self._wait()
+        self.revoked.add(token)
+
+    async def insert(self, table: str, row: Dict[str, Any]) -> None:
+        await self._wait()
+        with self._lock:
+            self.tables.setdefault(table, []).append(dict(row))
+
+    async def get_json(self, path: str) -> Any:
+        # スタブはHS256のみを使うため公開鍵は持たない
+        return {"keys": []}
+
+    async def close(self) -> None:
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase_client():
+    """
+    共有のSupabaseクライアントを取得
+    SUPABASE_CLIENT="stub" の場合のみインメモリのスタブを使う
+    （スタブは既定のSECRET_KEYで署名したトークンも受け付けるため、設定漏れで切り替わらないようにする）
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if settings.SUPABASE_CLIENT == "stub":
+                    logger.warning("Using in-memory Supabase stub client (local development only)")
+                    _client = StubSupabaseClient()
+                elif not settings.SUPABASE_URL:
+                    raise RuntimeError("SUPABASE_URL is not set (use SUPABASE_CLIENT=stub for local development)")
+                else:
+                    _client = SupabaseHTTPClient(
+                        settings.SUPABASE_URL,
+                        settings.SUPABASE_KEY or "",
+                        timeout=settings.SUPABASE_HTTP_TIMEOUT_SECONDS,
+                        max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.SUPABASE_HTTP_MAX_KEEPALIVE,
+                    )
+    return _client
+
+
+def set_supabase_client(client) -> None:
+    """共有クライアントを差し替える（テストでスタブを注入する場合など）"""
+    global _client
+    _client = client
+
+
+async def close_supabase_client() -> None:
+    """共有クライアントのコネクションを解放"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,90 @@
+"""
+プロセス内で使用する容量制限付きTTLキャッシュ
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+# メトリクス（ヒット率）の集計対象
+_registry: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+def registered_caches() -> List:
+    """生成済みのキャッシュ一覧"""
+    return list(_registry)
+
+
+def register_cache(cache) -> None:
+    """
+    メトリクスの集計対象に登録（name, hits, missesを持つオブジェクト）
+    """
+    _registry.add(cache)
+
+
+class TTLCache:
+    """
+    スレッドセーフなLRU + TTLキャッシュ
+    容量を超えた場合は最も古く使われたエントリから削除する
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        register_cache(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """値を取得（期限切れ・未登録の場合はdefault）"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """値を登録"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """値を削除"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """全エントリを削除"""
+        with self._lock:
+            self._data.clear()
+
+    def purge_expired(self) -> int:
+        """期限切れのエントリを削除し、削除件数を返す"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """期限内のエントリがあるか（ヒット率・LRUの順序には影響しない）"""
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,178 @@
+"""
+起動時のウォームアップと準備状態（/ready）
+トラフィックを受け付ける前に、DB接続の確立・カタログの読み込み・キャッシュの作成などを済ませ、
+デプロイ直後のリクエストが初回コストを負担しないようにする
+コンポーネントごとの状態を保持し、必須のコンポーネントがすべて準備できるまで/readyは503を返す
+（/healthは生存確認のみで、ウォームアップの状態には依存しない）
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..database import (
+    ReadSessionLocal, async_engine, async_replica_engine, engine, replica_engine
+)
+from . import ai_service, catalog_cache, catalog_snapshot, ranker
+from .password_hasher import password_hasher
+
+logger = logging.getLogger(__name__)
+
+# 状態: "pending", "warming", "ready", "failed", "skipped"
+_components: Dict[str, Dict[str, Any]] = {}
+_task: Optional[asyncio.Task] = None
+_finished_at: Optional[float] = None
+
+
+def _warm_sync_engine(db_engine, connections: int) -> None:
+    # 同時に借りることで、プールに指定数の接続を確立させる
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = db_engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+async def _warm_async_engine(db_engine, connections: int) -> None:
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = await db_engine.connect()
+            opened.append(conn)
+            await conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            await conn.close()
+
+
+async def warm_database() -> None:
+    """プライマリ・レプリカの同期・非同期プールに最小限の接続を確立"""
+    connections = settings.WARMUP_DB_CONNECTIONS
+    sync_engines = {id(e): e for e in (engine, replica_engine)}.values()
+    async_engines = {id(e): e for e in (async_engine, async_replica_engine)}.values()
+    for db_engine in sync_engines:
+        await run_in_threadpool(_warm_sync_engine, db_engine, connections)
+    for db_engine in async_engines:
+        await _warm_async_engine(db_engine, connections)
+
+
+def _warm_catalog_sync() -> None:
+    catalog_snapshot.get_snapshot()
+    # 既定の一覧ページを、未圧縮と各圧縮形式で作成しておく
+    with ReadSessionLocal() as db:
+        for accept_encoding in (None, "gzip", "br"):
+            catalog_cache.get_catalog_response(db, 0, settings.CATALOG_PAGE_SIZE, accept_encoding)
+
+
+async def warm_catalog() -> None:
+    """カタログのスナップショットのmmapと、一覧ページのキャッシュを作成"""
+    await run_in_threadpool(_warm_catalog_sync)
+
+
+async def warm_caches() -> None:
+    """バンディット事後分布の読み込みとパスワードハッシュのワーカー起動"""
+    if settings.RECOMMENDATION_ORDERING in ranker.BANDIT_METHODS:
+        await run_in_threadpool(ranker.get_ranker)
+    await password_hasher.warm()
+
+
+async def warm_ai() -> None:
+    """モデルのハンドルを作成し、設定されていれば1トークンだけ生成させる"""
+    ai_service.get_model()
+    if settings.WARMUP_LLM_CANARY:
+        await asyncio.wait_for(
+            run_in_threadpool(ai_service.canary), timeout=settings.WARMUP_LLM_CANARY_TIMEOUT_SECONDS
+        )
+
+
+# (名前, 必須か, 処理)  AIはフォールバックがあるため準備状態の判定には含めない
+STEPS: List[Tuple[str, bool, Callable[[], Awaitable[None]]]] = [
+    ("database", True, warm_database),
+    ("catalog", True, warm_catalog),
+    ("caches", True, warm_caches),
+    ("ai", False, warm_ai),
+]
+
+
+async def _run_step(name: str, func: Callable[[], Awaitable[None]]) -> None:
+    state = _components[name]
+    state.update(status="warming", error=None)
+    started = time.perf_counter()
+    try:
+        await func()
+        state["status"] = "ready"
+    except Exception as e:
+        state.update(status="failed", error=str(e) or type(e).__name__)
+        logger.warning(f"ウォームアップに失敗しました ({name}): {state['error']}")
+    state["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _run(steps) -> None:
+    global _finished_at
+    started = time.perf_counter()
+    for name, _, func in steps:
+        await _run_step(name, func)
+    _finished_at = time.monotonic()
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+async def start_warmup() -> None:
+    """
+    ウォームアップを開始し、WARMUP_TIMEOUT_SECONDS まで完了を待つ
+    （起動処理が終わるまでサーバーは接続を受け付けないため、待つ間のリクエストは発生しない）
+    時間内に終わらない場合は残りをバックグラウンドで続け、/readyで状態を返す
+    """
+    global _task
+    for name, required, _ in STEPS:
+        _components[name] = {"status": "pending" if settings.WARMUP_ENABLED else "skipped", "required": required}
+    if not settings.WARMUP_ENABLED or _task is not None:
+        return
+    _task = asyncio.create_task(_run(STEPS))
+    done, _ = await asyncio.wait({_task}, timeout=settings.WARMUP_TIMEOUT_SECONDS)
+    if not done:
+        logger.warning(
+            f"Warm-up did not finish within {settings.WARMUP_TIMEOUT_SECONDS}s; continuing in the background"
+        )
+
+
+async def stop_warmup() -> None:
+    """実行中のウォームアップを停止"""
+    global _task
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+
+
+def _retry_failed() -> None:
+    # 失敗した必須コンポーネントのみ、WARMUP_RETRY_SECONDS ごとにやり直す
+    global _task
+    if _task is None or not _task.done() or _finished_at is None:
+        return
+    if time.monotonic() - _finished_at < settings.WARMUP_RETRY_SECONDS:
+        return
+    failed = [step for step in STEPS if step[1] and _components[step[0]]["status"] == "failed"]
+    if failed:
+        _task = asyncio.create_task(_run(failed))
+
+
+def readiness() -> Tuple[bool, Dict[str, Dict[str, Any]]]:
+    """(準備できているか, コンポーネントごとの状態)"""
+    ready = all(
+        state["status"] in ("ready", "skipped")
+        for state in _components.values() if state["required"]
+    ) and bool(_components)
+    if not ready:
+        _retry_failed()
+    return ready, _components
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+フィードバックのクロス集計・分布をコマンドラインで出力するスクリプト
+例: python -m scripts.analytics_report --dims fatigue_level,location,category
+"""
+import argparse
+import json
+import sys
+import logging
+from pathlib import Path
+
+# backendディレクトリをPythonのパスに追加
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_dir))
+
+from app.database import engine
+from app.services import analytics
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+logger = logging.getLogger(__name__)
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="フィードバック分析レポート")
+    parser.add_argument(
+        "--dims", default="fatigue_level,location,category",
+        help=f"カンマ区切りの集計次元 ({', '.join(analytics.CROSSTAB_DIMENSIONS)})"
+    )
+    parser.add_argument("--min-count", type=int, default=1, help="出力するセルの最小件数")
+    parser.add_argument(
+        "--histogram", choices=analytics.HISTOGRAM_FIELDS,
+        help="クロス集計の代わりに指定フィールドの分布を出力"
+    )
+    parser.add_argument("--snapshot", help="列スナップショットのパス（省略時は設定値）")
+    parser.add_argument("--refresh", action="store_true", help="スナップショットを使わずDBから再読み込み")
+    parser.add_argument("--json", action="store_true", help="JSON形式で出力")
+    return parser.parse_args()
+
+def print_table(cells, dimensions) -> None:
+    """クロス集計結果を表形式で出力"""
+    headers = list(dimensions) + ["count", "completion_rate", "average_rating"]
+    rows = [[str(cell[h]) for h in headers] for cell in cells]
+    widths = [max([len(h)] + [len(row[i]) for row in rows]) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(w) for value, w in zip(row, widths)))
+
+def main():
+    """メイン実行関数"""
+    args = parse_args()
+    columns = analytics.get_feedback_columns(engine, snapshot_path=args.snapshot, refresh=args.refresh)
+    logger.info(f"{len(columns)}件のフィードバックを集計します")
+
+    if args.histogram:
+        result = analytics.histogram(columns, args.histogram)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+        else:
+            for value, count in result.items():
+                print(f"{value}\t{count}")
+        return
+
+    dimensions = [dim.strip() for dim in args.dims.split(",") if dim.strip()]
+    cells = analytics.crosstab(columns, dimensions, min_count=args.min_count)
+    if args.json:
+        print(json.dumps(cells, ensure_ascii=False))
+    else:
+        print_table(cells, dimensions)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+エンドツーエンドのベンチマーク
+合成データを投入した一時データベースに対し、アプリをプロセス内（ASGI）で呼び出して
+エンドポイントごとのスループットとレイテンシ（p50/p95/p99）を計測する
+LLM呼び出しは固定の遅延を持つスタブに置き換える
+
+例: python -m scripts.benchmark --users 200 --feedbacks-per-user 50 --output bench.json
+    python -m scripts.benchmark --baseline bench.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# backendディレクトリをPythonのパスに追加
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_dir))
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+logger = logging.getLogger("benchmark")
+
+API = "/api/v1"
+SCENARIOS = (
+    "recommended_anon",
+    "recommended_personalized",
+    "feedback_summary",
+    "feedback_create",
+    "auth_login",
+)
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="APIのベンチマーク")
+    parser.add_argument("--activities", type=int, default=200, help="合成する活動の件数")
+    parser.add_argument("--users", type=int, default=100, help="合成するユーザー数")
+    parser.add_argument("--feedbacks-per-user", type=int, default=20, help="ユーザーあたりのフィードバック件数")
+    parser.add_argument("--seed", type=int, default=42, help="乱数シード")
+    parser.add_argument("--requests", type=int, default=300, help="シナリオあたりのリクエスト数")
+    parser.add_argument("--login-requests", type=int, default=50, help="ログインのリクエスト数（bcryptのため少なめ）")
+    parser.add_argument("--warmup", type=int, default=20, help="計測前に捨てるリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=10, help="同時実行数")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="スタブLLMの応答遅延")
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS),
+        help=f"カンマ区切りの実行シナリオ ({', '.join(SCENARIOS)})"
+    )
+    parser.add_argument("--workdir", help="データベースを作成するディレクトリ（省略時は一時ディレクトリ）")
+    parser.add_argument("--output", default="benchmark_results.json", help="結果のJSONの出力先")
+    parser.add_argument("--baseline", help="比較するベースラインの結果JSON")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="許容する劣化の割合（p95の増加またはスループットの低下）"
+    )
+    return parser.parse_args()
+
+def prepare_environment(args: argparse.Namespace) -> Path:
+    """
+    アプリをimportする前に実行環境を整える
+    データベースは作業ディレクトリの相対パスに作成されるため、空のディレクトリに移動する
+    """
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="timeboost-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    for name in ("timeboost.db", "timeboost.db-wal", "timeboost.db-shm"):
+        (workdir / name).unlink(missing_ok=True)
+    os.chdir(workdir)
+    # 計測を歪める制限は外す（明示的に指定された場合はそちらを優先）
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("RECOMMENDATION_ORDERING", "llm")
+    return workdir
+
+def install_stub_llm(latency: float) -> None:
+    """ai_serviceの呼び出しを固定遅延のスタブに置き換える"""
+    from app.services import ai_service
+    from scripts.synthetic_data import CATEGORIES
+
+    async def generate_textual_profile(preferences: Dict) -> str:
+        await asyncio.sleep(latency)
+        return "ベンチマーク用のプロファイル"
+
+    async def get_recommended_categories(textual_profile: str, fatigue_level: int, location: str) -> List[str]:
+        await asyncio.sleep(latency)
+        return CATEGORIES[:3]
+
+    async def personalize_activities(user_profile: str, fatigue_level: int, previous_feedbacks: List[Dict]) -> List[str]:
+        await asyncio.sleep(latency)
+        offset = fatigue_level % len(CATEGORIES)
+        return (CATEGORIES[offset:] + CATEGORIES[:offset])[:3]
+
+    ai_service.init_vertex_ai = lambda: None
+    ai_service.generate_textual_profile = generate_textual_profile
+    ai_service.get_recommended_categories = get_recommended_categories
+    ai_service.personalize_activities = personalize_activities
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """ソート済みの値のパーセンタイル（最近傍順位法）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+RequestFactory = Callable[[random.Random], Tuple[str, str, Dict[str, Any]]]
+
+def build_scenarios(spec, tokens: List[str]) -> Dict[str, RequestFactory]:
+    """シナリオ名 → (メソッド, パス, httpxの引数) を返す関数"""
+    from scripts.synthetic_data import DURATIONS, LOCATIONS, SYNTHETIC_PASSWORD, synthetic_email
+
+    def recommended_params(rng: random.Random) -> Dict[str, Any]:
+        return {
+            "fatigue_level": rng.randint(1, 10),
+            "location": rng.choice(LOCATIONS),
+            "duration": rng.choice(DURATIONS),
+        }
+
+    def auth(rng: random.Random) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {rng.choice(tokens)}"}
+
+    return {
+        "recommended_anon": lambda rng: (
+            "GET", f"{API}/activities/recommended", {"params": recommended_params(rng)}
+        ),
+        "recommended_personalized": lambda rng: (
+            "GET", f"{API}/activities/recommended",
+            {"params": recommended_params(rng), "headers": auth(rng)}
+        ),
+        "feedback_summary": lambda rng: (
+            "GET", f"{API}/feedback/summary", {"headers": auth(rng)}
+        ),
+        "feedback_create": lambda rng: (
+            "POST", f"{API}/feedback/",
+            {
+                "headers": auth(rng),
+                "json": {
+                    "activity_id": rng.randint(1, spec.activities),
+                    "rating": rng.randint(1, 10),
+                    "fatigue_level": rng.randint(1, 10),
+                    "location": rng.choice(LOCATIONS),
+                    "duration": rng.choice(DURATIONS),
+                    "completion_status": "completed",
+                },
+            },
+        ),
+        "auth_login": lambda rng: (
+            "POST", f"{API}/auth/login",
+            {"data": {"username": synthetic_email(rng.randint(1, spec.users)), "password": SYNTHETIC_PASSWORD}},
+        ),
+    }
+
+async def run_scenario(
+    client, factory: RequestFactory, requests: int, warmup: int, concurrency: int, seed: int
+) -> Dict[str, Any]:
+    """同時実行数を固定してリクエストを送り、レイテンシを集計する"""
+    rng = random.Random(seed)
+    plan = [factory(rng) for _ in range(warmup + requests)]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def worker(items) -> None:
+        for i, (method, url, kwargs) in items:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    indexed = list(enumerate(plan))
+    # ウォームアップは計測対象外として先に流す
+    await asyncio.gather(*(worker(indexed[w:warmup:concurrency]) for w in range(concurrency)))
+    started = time.perf_counter()
+    measured = indexed[warmup:]
+    await asyncio.gather(*(worker(measured[w::concurrency]) for w in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+def compare_with_baseline(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """ベースラインからの劣化を検出（p95の増加とスループットの低下）"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {base['throughput_rps']}rps -> {current['throughput_rps']}rps"
+            )
+    return regressions
+
+def print_table(results: Dict) -> None:
+    """結果を表形式で出力"""
+    headers = ["scenario", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"]
+    rows = [
+        [name, str(r["requests"]), str(r["errors"]), str(r["throughput_rps"]),
+         str(r["p50_ms"]), str(r["p95_ms"]), str(r["p99_ms"])]
+        for name, r in results["scenarios"].items()
+    ]
+    widths = [max([len(h)] + [len(row[i]) for row in rows]) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(w) for value, w in zip(row, widths)))
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+    from app.database import engine
+    from app.api.routes.auth import create_access_token
+    from scripts.synthetic_data import DatasetSpec, load_dataset
+
+    spec = DatasetSpec(
+        activities=args.activities, users=args.users,
+        feedbacks_per_user=args.feedbacks_per_user, seed=args.seed,
+    )
+    started = time.perf_counter()
+    load_dataset(engine, spec)
+    logger.warning(f"Dataset loaded in {time.perf_counter() - started:.1f}s")
+
+    install_stub_llm(args.llm_latency_ms / 1000)
+    tokens = [create_access_token({"sub": str(user_id)}) for user_id in range(1, spec.users + 1)]
+    factories = build_scenarios(spec, tokens)
+
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in factories]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": vars(spec),
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "scenarios": {},
+    }
+
+    # ASGITransportはlifespanを送らないため、起動・終了処理は明示的に呼び出す
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for i, name in enumerate(selected):
+                requests = args.login_requests if name == "auth_login" else args.requests
+                logger.warning(f"Running {name} ({requests} requests)")
+                results["scenarios"][name] = await run_scenario(
+                    client, factories[name], requests, args.warmup, args.concurrency, args.seed + i
+                )
+    finally:
+        await app.router.shutdown()
+    return results
+
+def main():
+    """メイン実行関数"""
+    args = parse_args()
+    baseline: Optional[Dict] = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    output = Path(args.output).resolve()
+
+    workdir = prepare_environment(args)
+    logger.warning(f"Using database in {workdir}")
+    results = asyncio.run(run(args))
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print_table(results)
+    print(f"\nResults written to {output}")
+
+    failed = [name for name, r in results["scenarios"].items() if r["errors"]]
+    if failed:
+        logger.error(f"Scenarios with error responses: {', '.join(failed)}")
+    if baseline is not None:
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for line in regressions:
+            logger.error(f"Regression: {line}")
+        if regressions:
+            sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+共有キャッシュ用のRedis互換スタンドインサーバー（ローカル開発・テスト用）
+共有キャッシュが使うコマンド（GET/SET/DEL/SADD/SMEMBERS/SREM/PEXPIREなど）のみを実装する
+Luaは実行できないため、EVALは1行目のコメントで識別できるスクリプト（レート制限のトークンバケット）のみを
+同じ処理のPython実装で実行する
+永続化・レプリケーションは行わない
+例: python -m scripts.cache_server --port 6380
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://localhost:6380/0 uvicorn app.main:app --workers 4
+    RATE_LIMIT_BACKEND=redis RATE_LIMIT_REDIS_URL=redis://localhost:6380/0 uvicorn app.main:app --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import math
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CommandError(Exception):
+    """クライアントにエラー応答として返す例外"""
+
+
+def _encode(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, CommandError):
+        return b"-ERR %s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, (list, set)):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value)}")
+
+
+class StandInStore:
+    """キーごとに(値, 期限)を保持する。期限切れは参照時に削除する"""
+
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[Any, Optional[float]]] = {}
+
+    def _get(self, key: bytes) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _set_expiry(self, key: bytes, milliseconds: int) -> int:
+        value = self._get(key)
+        if value is None:
+            return 0
+        self._data[key] = (value, time.monotonic() + milliseconds / 1000)
+        return 1
+
+    def execute(self, args: List[bytes]) -> Any:
+        if not args:
+            raise CommandError("empty command")
+        name = args[0].decode().upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise CommandError(f"unknown command '{name}'")
+        return handler(*args[1:])
+
+    def cmd_ping(self, *args) -> Any:
+        return args[0] if args else "PONG"
+
+    def cmd_select(self, db) -> str:
+        return "OK"
+
+    def cmd_auth(self, *args) -> str:
+        return "OK"
+
+    def cmd_get(self, key) -> Any:
+        value = self._get(key)
+        if value is not None and not isinstance(value, bytes):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_mget(self, *keys) -> List[Any]:
+        return [value if isinstance(value, bytes) else None for value in (self._get(k) for k in keys)]
+
+    def cmd_set(self, key, value, *options) -> Any:
+        expires_at = None
+        i = 0
+        nx = xx = False
+        while i < len(options):
+            option = options[i].upper()
+            if option in (b"EX", b"PX"):
+                amount = int(options[i + 1])
+                expires_at = time.monotonic() + (amount if option == b"EX" else amount / 1000)
+                i += 2
+            elif option == b"NX":
+                nx, i = True, i + 1
+            elif option == b"XX":
+                xx, i = True, i + 1
+            else:
+                raise CommandError("syntax error")
+        exists = self._get(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self._data[key] = (value, expires_at)
+        return "OK"
+
+    def cmd_del(self, *keys) -> int:
+        deleted = 0
+        for key in keys:
+            if self._get(key) is not None:
+                del self._data[key]
+                deleted += 1
+        return deleted
+
+    def cmd_exists(self, *keys) -> int:
+        return sum(1 for key in keys if self._get(key) is not None)
+
+    def cmd_incr(self, key) -> int:
+        value = int(self._get(key) or 0) + 1
+        _, expires_at = self._data.get(key, (None, None))
+        self._data[key] = (str(value).encode(), expires_at)
+        return value
+
+    def cmd_expire(self, key, seconds) -> int:
+        return self._set_expiry(key, int(seconds) * 1000)
+
+    def cmd_pexpire(self, key, milliseconds) -> int:
+        return self._set_expiry(key, int(milliseconds))
+
+    def cmd_pttl(self, key) -> int:
+        if self._get(key) is None:
+            return -2
+        expires_at = self._data[key][1]
+        return -1 if expires_at is None else int((expires_at - time.monotonic()) * 1000)
+
+    def cmd_ttl(self, key) -> int:
+        pttl = self.cmd_pttl(key)
+        return pttl if pttl < 0 else (pttl + 999) // 1000
+
+    def _set_of(self, key) -> set:
+        value = self._get(key)
+        if value is None:
+            value = set()
+            self._data[key] = (value, None)
+        elif not isinstance(value, set):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_sadd(self, key, *members) -> int:
+        members_set = self._set_of(key)
+        added = len(set(members) - members_set)
+        members_set.update(members)
+        return added
+
+    def cmd_srem(self, key, *members) -> int:
+        members_set = self._set_of(key)
+        removed = len(members_set & set(members))
+        members_set.difference_update(members)
+        if not members_set:
+            self._data.pop(key, None)
+        return removed
+
+    def cmd_smembers(self, key) -> List[bytes]:
+        value = self._get(key)
+        return sorted(value) if isinstance(value, set) else []
+
+    def _token_bucket(self, keys: List[bytes], args: List[bytes]) -> int:
+        """app.services.rate_limiter.TOKEN_BUCKET_SCRIPTと同じ処理（戻り値は再試行までのミリ秒）"""
+        capacity, rate, cost = (float(arg) for arg in args[:3])
+        now = time.time()
+        bucket = self._get(keys[0])
+        if bucket is not None and not isinstance(bucket, dict):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        tokens = float(bucket["tokens"]) if bucket else capacity
+        ts = float(bucket["ts"]) if bucket else now
+        tokens = min(capacity, tokens + (now - ts) * rate)
+        wait = 0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = math.ceil((cost - tokens) / rate * 1000)
+        self._data[keys[0]] = ({"tokens": tokens, "ts": now}, None)
+        self._set_expiry(keys[0], (math.ceil(capacity / rate) + 1) * 1000)
+        return wait
+
+    # EVALで実行できるスクリプト（1行目のコメント: 実装）
+    SCRIPTS = {b"-- token_bucket": "_token_bucket"}
+
+    def cmd_eval(self, script, numkeys, *rest) -> Any:
+        handler = self.SCRIPTS.get(script.lstrip().split(b"\n", 1)[0].strip())
+        if handler is None:
+            raise CommandError("scripting is not supported by the stand-in except for known scripts")
+        numkeys = int(numkeys)
+        return getattr(self, handler)(list(rest[:numkeys]), list(rest[numkeys:]))
+
+    def cmd_dbsize(self) -> int:
+        return sum(1 for key in list(self._data) if self._get(key) is not None)
+
+    def cmd_flushdb(self, *args) -> str:
+        self._data.clear()
+        return "OK"
+
+    cmd_flushall = cmd_flushdb
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # インラインコマンド（redis-cliやtelnetからの手入力）
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        data = await reader.readexactly(length + 2)
+        args.append(data[:-2])
+    return args
+
+
+class StandInServer:
+    """asyncioで動作するスタンドインサーバー（テストではstart/stopを直接呼び出す）"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6380):
+        self.host = host
+        self.port = port
+        self.store = StandInStore()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                if args and args[0].upper() == b"QUIT":
+                    writer.write(_encode("OK"))
+                    break
+                try:
+                    reply = self.store.execute(args)
+                except CommandError as e:
+                    reply = e
+                except (ValueError, IndexError, TypeError):
+                    reply = CommandError("wrong number or type of arguments")
+                writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Cache stand-in listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+
+def main():
+    """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="共有キャッシュ用のRedis互換スタンドインサーバー")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=6380, help="待ち受けるポート（0で空きポート）")
+    args = parser.parse_args()
+    try:
+        asyncio.run(StandInServer(args.host, args.port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+活動カタログの共有メモリスナップショットを作成する書き込みプロセス
+ホストごとに1つ起動し、カタログの版が変わるたびに CATALOG_SNAPSHOT_PATH を置き換える
+（各ワーカーは置き換えを検知して新しい版をmmapする）
+例: python -m scripts.catalog_snapshot_writer --path /dev/shm/timeboost_catalog.bin
+    python -m scripts.catalog_snapshot_writer --once
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# backendディレクトリをPythonのパスに追加
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_dir))
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.crud import activity as crud_activity
+from app.database import engine as default_engine
+from app.db_engine import create_db_engine
+from app.services.catalog_snapshot import read_snapshot_version, version_key, write_snapshot
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="活動カタログのスナップショットの作成")
+    parser.add_argument("--path", default=settings.CATALOG_SNAPSHOT_PATH, help="スナップショットの出力先")
+    parser.add_argument("--database-url", help="読み込み元のデータベース（省略時はアプリの設定）")
+    parser.add_argument(
+        "--interval", type=float, default=settings.CATALOG_SNAPSHOT_WRITER_INTERVAL_SECONDS,
+        help="カタログの版を確認する間隔（秒）"
+    )
+    parser.add_argument("--once", action="store_true", help="一度だけ作成して終了する")
+    return parser.parse_args()
+
+def refresh_snapshot(engine, path: str, force: bool = False) -> bool:
+    """カタログの版がスナップショットと異なる場合のみ作成し直す"""
+    with Session(bind=engine) as db:
+        current = version_key(crud_activity.get_catalog_version(db))
+        if not force and read_snapshot_version(path) == current:
+            return False
+        started = time.perf_counter()
+        version, rows = write_snapshot(db, path)
+    logger.info(
+        f"スナップショットを作成しました: {path} ({rows}件, 版 {version}, "
+        f"{(time.perf_counter() - started) * 1000:.1f}ms)"
+    )
+    return True
+
+def main():
+    """メイン実行関数"""
+    args = parse_args()
+    if not args.path:
+        logger.error("--path または CATALOG_SNAPSHOT_PATH を指定してください")
+        sys.exit(1)
+    engine = create_db_engine(args.database_url, name="snapshot") if args.database_url else default_engine
+
+    if args.once:
+        refresh_snapshot(engine, args.path, force=True)
+        return
+
+    logger.info(f"カタログの版を{args.interval}秒ごとに確認します: {args.path}")
+    while True:
+        try:
+            refresh_snapshot(engine, args.path)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            logger.error(f"スナップショットの作成中にエラーが発生しました: {str(e)}")
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
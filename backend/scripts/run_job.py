@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+定期ジョブの一覧・手動実行・実行履歴の表示
+手動実行もスケジューラと同じロックを取得するため、ワーカーが実行中のジョブとは重複しない
+例: python -m scripts.run_job list
+    python -m scripts.run_job run rollup_compaction --full
+    python -m scripts.run_job history --job textual_profiles --limit 5
+"""
+import argparse
+import sys
+import logging
+from pathlib import Path
+
+# backendディレクトリをPythonのパスに追加
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(backend_dir))
+
+from app import models
+from app.crud import job as crud_job
+from app.database import SessionLocal, engine
+from app.services.scheduler import get_jobs, run_job
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+logger = logging.getLogger(__name__)
+
+def parse_args() -> argparse.Namespace:
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="定期ジョブの管理")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="ジョブと次回実行時刻の一覧")
+    run = commands.add_parser("run", help="ジョブを今すぐ実行")
+    run.add_argument("job", choices=sorted(get_jobs()), help="ジョブ名")
+    run.add_argument("--full", action="store_true", help="全件を対象に作り直す")
+    history = commands.add_parser("history", help="実行履歴")
+    history.add_argument("--job", choices=sorted(get_jobs()), help="ジョブ名で絞り込む")
+    history.add_argument("--limit", type=int, default=20, help="表示件数")
+    return parser.parse_args()
+
+def _format_time(value) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else "-"
+
+def list_jobs() -> None:
+    """ジョブと次回実行時刻（UTC）の一覧を出力"""
+    db = SessionLocal()
+    try:
+        crud_job.ensure_jobs(db, get_jobs())
+        scheduled = {row.name: row for row in crud_job.get_scheduled_jobs(db)}
+    finally:
+        db.close()
+    for name, job in sorted(get_jobs().items()):
+        row = scheduled.get(name)
+        interval = f"{job.interval_seconds}s" if job.interval_seconds > 0 else "manual"
+        locked = f"  locked by {row.locked_by} until {_format_time(row.locked_until)}" if row and row.locked_by else ""
+        print(f"{name:<20} every {interval:<8} next {_format_time(row.next_run_at if row else None)}{locked}")
+        print(f"    {job.description}")
+
+def show_history(job_name, limit: int) -> None:
+    """実行履歴を新しい順に出力"""
+    db = SessionLocal()
+    try:
+        runs = crud_job.get_job_runs(db, job_name, limit)
+    finally:
+        db.close()
+    for run in runs:
+        duration = f"{run.duration_ms:.0f}ms" if run.duration_ms is not None else "-"
+        print(
+            f"{_format_time(run.started_at)}  {run.job_name:<20} {run.status:<10} {run.trigger:<9} "
+            f"{duration:>9}  {run.worker}  {run.result or run.error or ''}"
+        )
+
+def main():
+    """メイン実行関数"""
+    args = parse_args()
+    models.Base.metadata.create_all(bind=engine)
+
+    if args.command == "list":
+        list_jobs()
+    elif args.command == "history":
+        show_history(args.job, args.limit)
+    else:
+        run = run_job(args.job, trigger="manual", full=args.full)
+        if run is None:
+            logger.error(f"{args.job} は他のワーカーで実行中です")
+            sys.exit(1)
+        if run.status != "succeeded":
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
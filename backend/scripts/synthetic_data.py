@@ -0,0 +1,360 @@
+"""
+合成データの生成と一括投入（シード・ベンチマーク・負荷検証用）
+活動・ユーザー（プロファイル付き）・フィードバックを乱数シードから再現可能に生成する
+- 活動の人気とユーザーの投稿数は順位に対するべき乗分布（skew=0で一様）
+- 評価は疲労度が活動の想定範囲に合うかで変わり、完了状況は評価と相関する
+- 投稿時刻は直近days日に分布し、時間帯は日中に偏る
+投入はSQLAlchemy Coreのexecutemany（PostgreSQLではCOPY）で行い、
+セカンダリインデックスは投入後に作成する
+"""
+import csv
+import io
+import itertools
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import insert, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import Activity, Feedback, User, UserProfile
+from app.services.password_hasher import hash_password_sync
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ["relaxation", "light_exercise", "desk_work", "short_focus", "location_specific"]
+LOCATIONS = ["home", "office", "cafe", "commuting", "other"]
+DURATIONS = [15, 30, 45, 60]
+COMPLETION_STATUSES = ["completed", "partial", "abandoned"]
+
+# 合成ユーザーの共通パスワード（ログインのベンチマークで使用）
+SYNTHETIC_PASSWORD = "password123"
+
+# カテゴリごとの活動テンプレート: (タイトル, 場所, 疲労度の範囲, 所要時間の候補)
+ACTIVITY_TEMPLATES = {
+    "relaxation": [
+        ("呼吸法", ["home", "office", "cafe", "commuting"], (5, 10), [15]),
+        ("座って瞑想", ["home", "office"], (4, 10), [15, 30]),
+        ("音楽鑑賞", ["home", "cafe", "commuting"], (3, 9), [15, 30, 45]),
+        ("パワー仮眠", ["home", "office"], (7, 10), [15, 30]),
+    ],
+    "light_exercise": [
+        ("ストレッチ", ["home", "office"], (3, 8), [15, 30]),
+        ("近所の散歩", ["home", "office", "other"], (2, 7), [15, 30, 45]),
+        ("ゆったりヨガ", ["home"], (2, 7), [30, 45, 60]),
+        ("階段昇降", ["office", "other"], (1, 5), [15]),
+    ],
+    "desk_work": [
+        ("目のエクササイズ", ["office", "home", "cafe"], (4, 9), [15]),
+        ("姿勢リセット", ["office", "home"], (3, 8), [15]),
+        ("デスク整理", ["office", "home"], (2, 6), [15, 30]),
+    ],
+    "short_focus": [
+        ("ポモドーロ読書", ["home", "cafe", "commuting"], (1, 5), [30, 45, 60]),
+        ("語学学習", ["home", "cafe", "commuting"], (1, 6), [15, 30, 45]),
+        ("アイデア整理", ["office", "cafe"], (1, 5), [15, 30]),
+    ],
+    "location_specific": [
+        ("カフェでスケッチ", ["cafe"], (2, 7), [30, 45]),
+        ("車窓観察", ["commuting"], (3, 9), [15, 30]),
+        ("公園ベンチ休憩", ["other"], (4, 9), [15, 30]),
+    ],
+}
+VARIANTS = ["", "（初級）", "（短縮版）", "（じっくり版）", "（ペア）", "（朝向け）", "（夕方向け）"]
+INTERESTS = ["読書", "運動", "学習", "音楽", "料理", "アート", "自然", "ゲーム"]
+WORK_STYLES = ["デスクワーク中心", "外回り中心", "リモートワーク", "シフト勤務"]
+REST_PREFERENCES = ["静かに過ごす", "軽い運動", "人と話す", "外の空気を吸う"]
+COMMENTS = ["すっきりした", "時間が足りなかった", "また試したい", "少し難しかった", "集中できた"]
+# 時間帯ごとの投稿の重み（0時〜23時）
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 6, 8, 9, 10, 10, 9, 8, 9, 10, 10, 9, 8, 7, 6, 4, 3, 2]
+
+
+@dataclass
+class DatasetSpec:
+    """生成するデータの規模と分布"""
+    activities: int = 200
+    users: int = 100
+    feedbacks_per_user: int = 20  # 平均（実際の件数はuser_skewに従ってばらつく）
+    seed: int = 42
+    batch_size: int = 5000
+    activity_skew: float = 1.0  # 活動の人気の偏り
+    user_skew: float = 0.8  # ユーザーごとの投稿数の偏り
+    days: int = 90  # フィードバックの投稿期間
+
+
+def synthetic_email(index: int) -> str:
+    return f"user{index}@example.com"
+
+
+def power_law_weights(n: int, skew: float) -> List[float]:
+    """順位に対するべき乗の重み（skew=0で一様）"""
+    return [1.0 / (rank ** skew) for rank in range(1, n + 1)]
+
+
+def _timestamps(now: Optional[datetime]) -> Dict[str, datetime]:
+    """
+    作成・更新日時の列
+    Coreの一括投入ではモデルのdefaultが使われない場合があるため（COPYなど）、明示的に値を入れる
+    """
+    now = now or datetime.utcnow()
+    return {"created_at": now, "updated_at": now}
+
+
+def generate_activities(
+    spec: DatasetSpec, rng: random.Random, curated: Sequence[Dict] = (), now: Optional[datetime] = None
+) -> List[Dict]:
+    """
+    活動カタログを生成（curatedの活動を先頭に含める）
+    """
+    timestamps = _timestamps(now)
+    rows = []
+    for data in curated:
+        rows.append({
+            "title": data["title"],
+            "description": data["description"],
+            "category": data["category"],
+            "duration": data["duration"],
+            "locations": json.dumps(data["locations"]),
+            "fatigue_min": data["fatigue_min"],
+            "fatigue_max": data["fatigue_max"],
+            "steps": json.dumps(data["steps"], ensure_ascii=False) if "steps" in data else None,
+            "benefits": json.dumps(data["benefits"], ensure_ascii=False) if "benefits" in data else None,
+            "scientific_basis": data.get("scientific_basis"),
+            **timestamps,
+        })
+
+    templates = [(category, t) for category in CATEGORIES for t in ACTIVITY_TEMPLATES[category]]
+    for i in range(max(0, spec.activities - len(rows))):
+        category, (title, locations, (fatigue_min, fatigue_max), durations) = templates[i % len(templates)]
+        variant = VARIANTS[(i // len(templates)) % len(VARIANTS)]
+        serial = i // (len(templates) * len(VARIANTS))
+        low = max(1, min(10, fatigue_min + rng.randint(-1, 1)))
+        rows.append({
+            "title": f"{title}{variant}" + (f" {serial + 1}" if serial else ""),
+            "description": f"{title}で気分を切り替える{rng.choice(durations)}分程度の活動です。",
+            "category": category,
+            "duration": rng.choice(durations),
+            "locations": json.dumps(rng.sample(locations, rng.randint(1, len(locations)))),
+            "fatigue_min": low,
+            "fatigue_max": max(low, min(10, fatigue_max + rng.randint(-1, 1))),
+            "steps": json.dumps(["準備する", f"{title}を行う", "振り返る"], ensure_ascii=False),
+            "benefits": json.dumps(["気分転換", "集中力の回復"], ensure_ascii=False),
+            "scientific_basis": None,
+            **timestamps,
+        })
+
+    for activity_id, row in enumerate(rows, start=1):
+        row["id"] = activity_id
+    return rows
+
+
+def generate_users(spec: DatasetSpec, now: Optional[datetime] = None) -> List[Dict]:
+    # bcryptは遅いため全ユーザーで同じハッシュを共有する
+    password_hash = hash_password_sync(SYNTHETIC_PASSWORD)
+    timestamps = _timestamps(now)
+    return [
+        {
+            "id": i + 1,
+            "email": synthetic_email(i + 1),
+            "password_hash": password_hash,
+            "name": f"ユーザー{i + 1}",
+            **timestamps,
+        }
+        for i in range(spec.users)
+    ]
+
+
+def generate_profiles(spec: DatasetSpec, rng: random.Random, now: Optional[datetime] = None) -> List[Dict]:
+    timestamps = _timestamps(now)
+    rows = []
+    for i in range(spec.users):
+        interests = rng.sample(INTERESTS, rng.randint(1, 3))
+        work_style = rng.choice(WORK_STYLES)
+        rest = rng.sample(REST_PREFERENCES, rng.randint(1, 2))
+        rows.append({
+            "user_id": i + 1,
+            "interests": json.dumps(interests, ensure_ascii=False),
+            "work_style": work_style,
+            "rest_preferences": json.dumps(rest, ensure_ascii=False),
+            "textual_profile": (
+                f"{work_style}のユーザーで、{'・'.join(interests)}に関心があります。"
+                f"休憩時は{'・'.join(rest)}ことを好みます。"
+            ),
+            **timestamps,
+        })
+    return rows
+
+
+def _feedback_counts(spec: DatasetSpec, rng: random.Random) -> List[int]:
+    """総件数をユーザーに割り振る（投稿数の多いユーザーはランダムに選ぶ）"""
+    total = spec.users * spec.feedbacks_per_user
+    if total == 0:
+        return [0] * spec.users
+    weights = power_law_weights(spec.users, spec.user_skew)
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    # 端数は重みに従って配分する
+    for index in rng.choices(range(spec.users), weights=weights, k=total - sum(counts)):
+        counts[index] += 1
+    return counts
+
+
+def generate_feedbacks(
+    spec: DatasetSpec, rng: random.Random, activities: Sequence[Dict]
+) -> Iterator[Dict]:
+    """フィードバックを逐次生成（全件をメモリに載せない）"""
+    weights = power_law_weights(len(activities), spec.activity_skew)
+    popularity = list(activities)
+    rng.shuffle(popularity)
+    cum_weights = list(itertools.accumulate(weights))
+    hour_cum = list(itertools.accumulate(HOUR_WEIGHTS))
+    locations = {a["id"]: json.loads(a["locations"]) for a in activities}
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=spec.days)
+
+    for user_id, count in enumerate(_feedback_counts(spec, rng), start=1):
+        for activity in rng.choices(popularity, cum_weights=cum_weights, k=count):
+            fatigue = int(round(rng.triangular(1, 10, 6)))
+            fits = activity["fatigue_min"] <= fatigue <= activity["fatigue_max"]
+            rating = int(round(rng.gauss(7.5, 1.5) if fits else rng.gauss(5.0, 2.0)))
+            rating = max(1, min(10, rating))
+            if rating >= 7:
+                status = rng.choices(COMPLETION_STATUSES, weights=(80, 15, 5))[0]
+            else:
+                status = rng.choices(COMPLETION_STATUSES, weights=(40, 35, 25))[0]
+            activity_locations = locations[activity["id"]]
+            hour = rng.choices(range(24), cum_weights=hour_cum)[0]
+            yield {
+                "user_id": user_id,
+                "activity_id": activity["id"],
+                "rating": rating,
+                "fatigue_level": fatigue,
+                "location": rng.choice(activity_locations) if rng.random() < 0.9 else rng.choice(LOCATIONS),
+                "duration": activity["duration"],
+                "completion_status": status,
+                "comments": rng.choice(COMMENTS) if rng.random() < 0.1 else None,
+                "client_key": None,
+                "created_at": start + timedelta(
+                    days=rng.randrange(spec.days), hours=hour, minutes=rng.randrange(60)
+                ),
+            }
+
+
+def _batches(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _copy_batch(conn: Connection, table, batch: List[Dict]) -> None:
+    """PostgreSQLのCOPYで投入（psycopg2）"""
+    columns = list(batch[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in (row[c] for c in columns)
+        ])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def bulk_insert(conn: Connection, table, rows: Iterable[Dict], batch_size: int = 5000) -> int:
+    """
+    行をまとめて投入（PostgreSQL + psycopg2ではCOPY、それ以外はexecutemany）
+    """
+    use_copy = conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+    count = 0
+    started = time.perf_counter()
+    for batch in _batches(rows, batch_size):
+        if use_copy:
+            _copy_batch(conn, table, batch)
+        else:
+            conn.execute(insert(table), batch)
+        count += len(batch)
+        if count % (batch_size * 20) == 0:
+            logger.info(f"{table.name}: {count}件 ({count / (time.perf_counter() - started):.0f}件/秒)")
+    return count
+
+
+def drop_secondary_indexes(conn: Connection, tables) -> List:
+    """投入前にセカンダリインデックスを削除（投入後にcreate_indexesで作り直す）"""
+    indexes = [index for table in tables for index in table.indexes]
+    for index in indexes:
+        index.drop(bind=conn, checkfirst=True)
+    return indexes
+
+
+def create_indexes(conn: Connection, indexes) -> None:
+    for index in indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def _reset_sequences(conn: Connection, tables) -> None:
+    """明示的にIDを指定して投入した後、PostgreSQLのシーケンスを進める"""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+        ))
+
+
+def load_dataset(engine: Engine, spec: DatasetSpec, curated: Sequence[Dict] = ()) -> Dict[str, int]:
+    """
+    空のテーブルに合成データを投入し、件数を返す
+    """
+    rng = random.Random(spec.seed)
+    now = datetime.utcnow()
+    tables = [Activity.__table__, User.__table__, UserProfile.__table__, Feedback.__table__]
+    counts: Dict[str, int] = {}
+    started = time.perf_counter()
+
+    with engine.connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # 投入中のみ同期書き込みを省略する（この接続に限る。トランザクション外で設定する）
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            conn.commit()
+
+        with conn.begin():
+            indexes = drop_secondary_indexes(conn, tables)
+
+            activities = generate_activities(spec, rng, curated, now)
+            counts["activities"] = bulk_insert(conn, Activity.__table__, activities, spec.batch_size)
+            counts["users"] = bulk_insert(conn, User.__table__, generate_users(spec, now), spec.batch_size)
+            counts["user_profiles"] = bulk_insert(
+                conn, UserProfile.__table__, generate_profiles(spec, rng, now), spec.batch_size
+            )
+            counts["feedbacks"] = bulk_insert(
+                conn, Feedback.__table__, generate_feedbacks(spec, rng, activities), spec.batch_size
+            )
+            loaded = time.perf_counter()
+
+            create_indexes(conn, indexes)
+            _reset_sequences(conn, tables)
+
+        if sqlite:
+            conn.exec_driver_sql("PRAGMA synchronous=NORMAL")
+            conn.commit()
+
+    logger.info(
+        f"合成データを投入しました: {counts} "
+        f"(投入 {loaded - started:.1f}秒, インデックス作成 {time.perf_counter() - loaded:.1f}秒)"
+    )
+    return counts